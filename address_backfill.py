@@ -0,0 +1,98 @@
+"""Điền 1 lần các cột Temp_* địa chỉ từ chuỗi địa chỉ cũ (nhập tự do trên sheet).
+
+Form Bước 3 chỉ đọc cột Temp_XaPhuong_* để chọn sẵn Xã/Phường; dòng nào còn trống thì
+mỗi lần hiển thị lại phải tách chuỗi cũ. Công cụ này tách cả danh sách 1 lần:
+- Thường trú: "Số 1, Thôn A, Phường B" -> Temp_XaPhuong_ThuongTru = Phường B,
+  Temp_ThonTo_ThuongTru = "Số 1, Thôn A". Xét các phần từ phải sang trái (bỏ qua
+  phần là Huyện / Tỉnh cũ), phần đầu tiên khớp 1 xã của tỉnh đã chọn là Xã/Phường.
+- Khai sinh: Temp_XaPhuong_KhaiSinh lấy từ cột địa chỉ chi tiết Khai sinh.
+So khớp theo danh sách xã của tỉnh trong vietnam_data.json (LocationIndex.match_commune:
+không dấu, bỏ "Phường"/"Xã", gần đúng). Mỗi cặp (tỉnh, chuỗi) khác nhau chỉ xử lý 1 lần.
+
+Chỉ điền ô Temp đang trống, không sửa cột chính.
+"""
+import pandas as pd
+
+from columns import COL_ID, COL_NAME
+
+# (tên khối, cột Quốc gia, cột Tỉnh, cột chuỗi cũ, cột Temp Xã, cột Temp Thôn hoặc None)
+BACKFILL_BLOCKS = [
+    ('Thường trú', 'Thường trú (theo mô hình 2 cấp) - Quốc gia *', 'Thường trú (theo mô hình 2 cấp) - Tỉnh *',
+     'Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *', 'Temp_XaPhuong_ThuongTru', 'Temp_ThonTo_ThuongTru'),
+    ('Khai sinh', 'Nơi đăng ký khai sinh - Quốc gia *', 'Nơi đăng ký khai sinh - Tỉnh *',
+     'Nơi đăng ký khai sinh - Địa chỉ chi tiết *', 'Temp_XaPhuong_KhaiSinh', None),
+]
+
+UNMATCHED_COLUMNS = ['ID', 'Họ và tên', 'Khối', 'Tỉnh', 'Địa chỉ cũ', 'Lý do']
+
+_VIETNAM = {'việt nam', 'viet nam', ''}
+_EMPTY = {'', 'nan', 'none', 'không'}
+
+
+def split_address(locations, province, text, fuzzy_cache=None):
+    """(Xã/Phường chuẩn, phần chi tiết phía trước) hoặc (None, None) nếu không phần nào khớp.
+    Thử khớp chính xác mọi phần trước, chỉ khi không có mới so khớp gần đúng (chậm hơn nhiều).
+    fuzzy_cache: dict dùng chung giữa các lần gọi để không so khớp gần đúng lại cùng 1 phần."""
+    parts = [part.strip() for part in str(text).split(',')]
+    for i in range(len(parts) - 1, -1, -1):
+        commune = locations.resolve_commune(province, parts[i])
+        if commune is not None:
+            return commune, ", ".join(part for part in parts[:i] if part)
+    fuzzy_cache = {} if fuzzy_cache is None else fuzzy_cache
+    for i in range(len(parts) - 1, -1, -1):
+        key = (province, parts[i])
+        if key not in fuzzy_cache:
+            fuzzy_cache[key] = locations.match_commune(province, parts[i])
+        if fuzzy_cache[key] is not None:
+            return fuzzy_cache[key], ", ".join(part for part in parts[:i] if part)
+    return None, None
+
+
+def _column(df, col):
+    if col not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[col].astype(str).str.strip().astype(object)
+
+
+def plan_backfill(df, locations):
+    """Tính các ô Temp cần điền cho cả danh sách.
+    Trả về (dict ID -> {cột Temp: giá trị}, DataFrame các dòng không khớp theo UNMATCHED_COLUMNS)."""
+    ids = df[COL_ID].astype(str)
+    unique = ~ids.duplicated(keep=False)  # ID trùng trên sheet: không xác định được dòng để ghi
+    names = _column(df, COL_NAME)
+    fuzzy_cache = {}
+    changes = {}
+    unmatched = []
+    for block, col_country, col_province, col_text, col_xa, col_thon in BACKFILL_BLOCKS:
+        text = _column(df, col_text)
+        todo = (unique & _column(df, col_xa).str.casefold().isin(_EMPTY)
+                & _column(df, col_country).str.casefold().isin(_VIETNAM)
+                & ~text.str.casefold().isin(_EMPTY))
+        if not todo.any():
+            continue
+        thon_empty = (_column(df, col_thon).str.casefold().isin(_EMPTY) if col_thon is not None
+                      else pd.Series(False, index=df.index))
+        pairs = pd.DataFrame({'province': _column(df, col_province), 'text': text,
+                              'id': ids, 'name': names, 'thon_empty': thon_empty})[todo]
+
+        # Mỗi cặp (tỉnh, chuỗi) khác nhau chỉ tách / so khớp 1 lần
+        parsed = {}
+        for province_raw, raw in pairs[['province', 'text']].drop_duplicates().itertuples(index=False):
+            province = locations.resolve_province(province_raw)
+            if province is None:
+                parsed[(province_raw, raw)] = (None, None, "Tỉnh không có trong danh mục")
+                continue
+            commune, detail = split_address(locations, province, raw, fuzzy_cache)
+            reason = None if commune is not None else "Không tìm thấy Xã/Phường thuộc tỉnh"
+            parsed[(province_raw, raw)] = (commune, detail, reason)
+
+        for province_raw, raw, record_id, name, fill_thon in pairs.itertuples(index=False):
+            commune, detail, reason = parsed[(province_raw, raw)]
+            if commune is None:
+                unmatched.append((record_id, name, block, province_raw, raw, reason))
+                continue
+            values = changes.setdefault(record_id, {})
+            values[col_xa] = commune
+            if detail and fill_thon:
+                values[col_thon] = detail
+    return changes, pd.DataFrame(unmatched, columns=UNMATCHED_COLUMNS)
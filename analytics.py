@@ -0,0 +1,59 @@
+"""Thống kê tiến độ cho Admin Dashboard (tính bằng pandas vector hóa, không lặp từng dòng).
+
+app.py cache kết quả theo phiên bản dữ liệu.
+"""
+import pandas as pd
+
+from columns import COL_ID, COL_ORG
+
+
+def parse_backup_times(values):
+    """Chuỗi thời gian trong Backup -> datetime (sai định dạng -> NaT).
+    Thường là "YYYY-mm-dd HH:MM:SS"; Google Sheet có thể hiển thị lại theo dạng dd/mm/yyyy."""
+    raw = pd.Series(values, dtype=object)
+    times = pd.to_datetime(raw, errors='coerce', format='%Y-%m-%d %H:%M:%S')
+    others = times.isna() & raw.notna()
+    if others.any():
+        times[others] = pd.to_datetime(raw[others], errors='coerce', format='mixed', dayfirst=True)
+    return times
+
+
+def org_progress(df, updated_ids, last_saved):
+    """Tiến độ theo Tổ chức Đảng: tổng số, đã cập nhật, tỉ lệ %, lần lưu gần nhất.
+
+    updated_ids: tập ID đã cập nhật; last_saved: dict ID -> thời điểm lưu gần nhất (chuỗi).
+    """
+    ids = df[COL_ID].astype(str)
+    last_times = parse_backup_times(list(last_saved.values()))
+    last_times.index = list(last_saved.keys())
+    frame = pd.DataFrame({
+        'org': df[COL_ORG].astype(str).str.strip().replace('', '(Chưa có)'),
+        'updated': ids.isin(updated_ids),
+        'last': last_times.reindex(ids.to_numpy()).to_numpy(),  # map() lỗi khi Backup chưa có dòng nào
+    })
+    rollup = frame.groupby('org', sort=True).agg(
+        total=('updated', 'size'),
+        updated=('updated', 'sum'),
+        last=('last', 'max'),
+    )
+    rollup['percent'] = (rollup['updated'] / rollup['total'] * 100).round(1)
+    rollup = rollup.sort_values(['percent', 'total'], ascending=[True, False]).reset_index()
+    return rollup.rename(columns={
+        'org': 'Tổ chức Đảng', 'total': 'Tổng số', 'updated': 'Đã cập nhật',
+        'percent': 'Tỉ lệ (%)', 'last': 'Lần lưu gần nhất',
+    })[['Tổ chức Đảng', 'Tổng số', 'Đã cập nhật', 'Tỉ lệ (%)', 'Lần lưu gần nhất']]
+
+
+def save_histogram(save_times, weights, freq='D'):
+    """Số lần lưu theo giờ ('h') hoặc theo ngày ('D').
+    save_times: list chuỗi thời gian; weights: số lần lưu mà mỗi mốc đại diện
+    (dòng checkpoint sau khi thu gọn được tính hết vào thời điểm cuối của nó)."""
+    times = parse_backup_times(save_times)
+    counts = pd.Series(list(weights), index=times.values, dtype='int64')
+    counts = counts[counts.index.notna()]
+    if counts.empty:
+        return pd.Series(dtype='int64', name='Số lần lưu')
+    buckets = counts.groupby(counts.index.floor(freq)).sum()
+    # Điền đủ các mốc trống để biểu đồ thể hiện đúng khoảng lặng
+    full_range = pd.date_range(buckets.index.min(), buckets.index.max(), freq=freq)
+    return buckets.reindex(full_range, fill_value=0).rename('Số lần lưu')
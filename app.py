@@ -3,67 +3,45 @@ import pandas as pd
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timedelta
+import csv
+import functools
 import io
+import os
 import time
-from functools import wraps
+
+from address_backfill import plan_backfill
+from analytics import org_progress, save_histogram
+from bulk_import import plan_import, plan_note_broadcast, read_import_file
+from exports import (ExportCache, FORMATS as EXPORT_FORMATS, available_formats, export_bytes,
+                     mask_month_date)
+from backup_log import (BackupTail, make_delta_row, compact as compact_backup_values,
+                        history as backup_history, cell_count as backup_cell_count)
+from columns import ALL_COLUMNS, TEMP_COLS, READ_ONLY_COLS, COLS_FORCE_TEXT, COL_NOTE, COL_ORG
+from data_store import SharedDataStore, diff_row_values
+from locations import load_location_index
+from quota import QuotaScheduler, QuotaExceeded, PRIORITY_BACKGROUND
+from storage import (GoogleSheetsBackend, SQLiteBackend, MissingWorksheet,
+                     get_memory_backend, is_rate_limited)
+from timings import TimingStats
+from validation import summarize_issues, validate_roster
+from write_queue import SaveJournal, WriteBehindFlusher
+
+SCRIPT_STARTED = time.perf_counter()  # Mốc bắt đầu lần chạy lại cả script này
+# Số lần chạy cả script trong phiên (khối st.fragment tự chạy lại thì không chạy tới dòng này)
+st.session_state.script_runs = st.session_state.get('script_runs', 0) + 1
 
 # --- CẤU HÌNH ---
 ADMIN_PASSWORD = st.secrets["admin_password"]
 CACHE_TTL = 30  
+REFRESH_IN_BACKGROUND = True  # Hết TTL: vẫn phục vụ dữ liệu cũ, tải lại ở luồng nền
+FULL_RELOAD_MAX_AGE = 600  # File không đổi vẫn tải lại toàn bộ sau số giây này (phòng hờ)
+DATA_CACHE_DIR = st.secrets.get("data_cache_dir", "data_cache")  # Thư mục file cục bộ (nhật ký, snapshot...)
+JOURNAL_PATH = os.path.join(DATA_CACHE_DIR, "save_journal.sqlite3")  # Nhật ký lưu chờ đẩy lên Google Sheet
+FLUSH_INTERVAL = 3  # Số giây giữa 2 lần gom & đẩy nhật ký
+SNAPSHOT_PATH = os.path.join(DATA_CACHE_DIR, "member_snapshot.pkl")  # Bản sao dữ liệu trên đĩa để khởi động nhanh
+SQLITE_PATH = os.path.join(DATA_CACHE_DIR, "members.sqlite3")  # Dùng khi storage_backend = "sqlite"
 
 
-# --- CẤU HÌNH ---
-# Danh sách cột CHÍNH XÁC (33 cột)
-ALL_COLUMNS = [
-    'STT', 
-    'ID', 
-    'Họ và tên *', 
-    'Tên gọi khác', 
-    'Giới tính *', 
-    'Sinh ngày * (dd/mm/yyyy)',
-    'Dân tộc *', 
-    'Tôn giáo *', 
-    'Số định danh cá nhân *', 
-    'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)',
-    'Nơi cấp thẻ Đảng', 
-    'Ngày cấp thẻ Đảng (dd/mm/yyyy)', 
-    'Số thẻ theo Đảng quyết định 85',
-    'Tổ chức Đảng đang sinh hoạt * (không sửa)', 
-    'Nơi đăng ký khai sinh - Quốc gia *',
-    'Nơi đăng ký khai sinh - Tỉnh *', 
-    'Nơi đăng ký khai sinh - Địa chỉ chi tiết *',
-    'Quê quán (theo mô hình 2 cấp) - Quốc gia *', 
-    'Quê quán (theo mô hình 2 cấp) - Tỉnh *',
-    'Quê quán (theo mô hình 2 cấp) - Địa chỉ chi tiết *', 
-    'Thường trú (theo mô hình 2 cấp) - Quốc gia *',
-    'Thường trú (theo mô hình 2 cấp) - Tỉnh *', 
-    'Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *',
-    'Ngày vào Đảng* (dd/mm/yyyy)', 
-    'Ngày vào Đảng chính thức* (dd/mm/yyyy)', 
-    'Số CMND cũ (nếu có)',
-    'Trạng thái hoạt động', 
-    'Ngày rời khỏi/ Ngày mất/ Ngày miễn sinh hoạt Đảng (dd/mm/yyyy)',
-    
-    # --- CỘT NÀY QUAN TRỌNG: Cần giữ lại để giữ chỗ, dù không dùng ---
-    'Đề nghị xóa (do đang viên không thuộc chi bộ)/ (Nếu muốn xóa chọn "có", còn không bỏ qua)',
-    
-    # --- 4 CỘT PHỤ MỚI THÊM ---
-    'Temp_XaPhuong_KhaiSinh', 
-    'Temp_ThonTo_KhaiSinh', 
-    'Temp_XaPhuong_ThuongTru', 
-    'Temp_ThonTo_ThuongTru',
-    'Ghi chú'
-]
-
-# Danh sách cột phụ
-TEMP_COLS = ['Temp_XaPhuong_KhaiSinh', 'Temp_ThonTo_KhaiSinh', 'Temp_XaPhuong_ThuongTru', 'Temp_ThonTo_ThuongTru', 'Ghi chú', 'Đề nghị xóa (do đang viên không thuộc chi bộ)/ (Nếu muốn xóa chọn "có", còn không bỏ qua)']
-
-# Cột này chỉ đọc, không cho sửa
-READ_ONLY_COLS = [
-    'STT', 'ID', 'Họ và tên *', 'Sinh ngày * (dd/mm/yyyy)', 
-    'Tổ chức Đảng đang sinh hoạt * (không sửa)'
-]
-
 SHEET_NAME_MAIN = "Sheet1"
 SHEET_NAME_BACKUP = "Backup"
 
@@ -83,193 +61,294 @@ def connect_to_workbook():
     return client.open_by_key(SPREADSHEET_ID)
 
 # ========================================
-# 🔥 GIẢI PHÁP AUTO-RETRY KHI GẶP LỖI 429
+# 🔥 ĐIỀU PHỐI QUOTA CHUNG (TRÁNH LỖI 429)
 # ========================================
 
-def retry_on_rate_limit(max_retries=5, initial_wait=2):
-    """Decorator tự động retry khi gặp lỗi 429 (Rate Limit)"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            wait_time = initial_wait
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except gspread.exceptions.APIError as e:
-                    if e.response.status_code == 429:
-                        if attempt < max_retries - 1:
-                            with st.spinner(f"⏳ Hệ thống đang bận, chờ {wait_time}s... (Lần {attempt + 1}/{max_retries})"):
-                                time.sleep(wait_time)
-                            wait_time *= 2
-                        else:
-                            st.error("❌ Hệ thống quá tải. Vui lòng thử lại sau 1 phút.")
-                            raise
-                    else:
-                        raise
-                except Exception as e:
-                    st.error(f"⚠️ Lỗi không xác định: {str(e)}")
-                    raise
-            return None
-        return wrapper
-    return decorator
-
-# --- CÁC HÀM WRAPPER AN TOÀN (CẬP NHẬT ĐẦY ĐỦ) ---
-
-@retry_on_rate_limit()
-def safe_get_all_records(sheet, expected_headers):
-    return sheet.get_all_records(expected_headers=expected_headers)
-
-@retry_on_rate_limit()
-def safe_update_sheet(sheet, cell_range, values):
-    return sheet.update(cell_range, values, value_input_option='USER_ENTERED')
-
-@retry_on_rate_limit()
-def safe_append_row(sheet, row_data):
-    return sheet.append_row(row_data, value_input_option='USER_ENTERED')
+@st.cache_resource
+def get_quota_scheduler():
+    """1 bộ điều phối quota cho cả tiến trình: mọi lời gọi API xếp hàng qua đây"""
+    return QuotaScheduler(
+        read_per_minute=int(st.secrets.get("sheets_read_per_minute", 60)),
+        write_per_minute=int(st.secrets.get("sheets_write_per_minute", 60)),
+        is_rate_limited=is_rate_limited,
+    )
 
-# --- ĐÂY LÀ HÀM BẠN ĐANG THIẾU ---
-@retry_on_rate_limit()
-def safe_get_all_values(sheet):
-    return sheet.get_all_values()
-# ---------------------------------
+# ========================================
+# 💾 LỚP LƯU TRỮ (GOOGLE SHEETS / SQLITE / BỘ NHỚ)
+# ========================================
 
-@retry_on_rate_limit()
-def safe_find_cell(sheet, value, in_column):
-    return sheet.find(value, in_column=in_column)
+@st.cache_resource
+def get_storage():
+    """Chọn nơi lưu trữ theo secrets (storage_backend):
+    - "gsheets" (mặc định): Google Sheet thật, qua bộ điều phối quota.
+    - "sqlite": file SQLite cục bộ (sqlite_path) - chạy offline / danh sách lớn.
+    - "memory": bản giả lập gspread trong bộ nhớ - chạy thử / đo tải."""
+    backend = st.secrets.get("storage_backend", "gsheets")
+    if backend == "sqlite":
+        return SQLiteBackend(st.secrets.get("sqlite_path", SQLITE_PATH))
+    if backend == "memory":
+        return get_memory_backend(st.secrets.get("memory_backend_key", "default"))
+    return GoogleSheetsBackend(connect_to_workbook(), get_quota_scheduler(), SHEET_NAME_MAIN, SHEET_NAME_BACKUP)
 
 # ========================================
-# ✅ CACHING & STATE MANAGEMENT (1 PHÚT)
+# ✅ CACHING & STATE MANAGEMENT (KHO DỮ LIỆU CHUNG)
 # ========================================
 
-@st.cache_data(ttl=CACHE_TTL)
-def load_data_main_cached(_sheet):
-    """Load data có cache 1 phút, xử lý số 0 ở đầu"""
-    data = safe_get_all_records(_sheet, ALL_COLUMNS)
-    df = pd.DataFrame(data)
-    
-    # Xử lý số 0 ở đầu (Logic cũ nhưng đưa vào cache)
-    cols_need_zero = ['Số định danh cá nhân *', 'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)']
-    for col in cols_need_zero:
-        if col in df.columns:
-            df[col] = df[col].astype(str).replace(r'\.0$', '', regex=True).replace(['nan', 'None', ''], '')
-            df[col] = df[col].apply(lambda x: x.zfill(12) if x.strip() != '' and x.isdigit() else x)
-            
-    df['ID'] = df['ID'].astype(str).replace(r'\.0$', '', regex=True)
-    return df
-
-def init_session_data():
-    """Khởi tạo session state nếu chưa có"""
-    if 'data_loaded' not in st.session_state:
-        with st.spinner("🔄 Đang tải dữ liệu..."):
-            workbook = connect_to_workbook()
-            sheet = workbook.worksheet(SHEET_NAME_MAIN)
-            df = load_data_main_cached(sheet)
-            
-            st.session_state.df_main = df
-            st.session_state.main_sheet = sheet
-            st.session_state.workbook = workbook
-            st.session_state.data_loaded = True
-            st.session_state.last_load_time = time.time()
+def load_main_records():
+    """Tải toàn bộ Sheet1 (dùng làm loader cho kho dữ liệu chung)"""
+    return get_storage().read_main_records(priority=PRIORITY_BACKGROUND)
+
+def fetch_change_token():
+    """Dấu hiệu thay đổi của dữ liệu (với Google Sheet: modifiedTime trên Drive).
+    Chỉ là 1 lời gọi Drive API rất nhẹ, không tính vào quota đọc của Sheets."""
+    return get_storage().change_token()
 
-def get_session_data():
-    """Hàm duy nhất để lấy dữ liệu trong app"""
-    init_session_data()
-    return st.session_state.df_main, st.session_state.main_sheet, st.session_state.workbook
+@st.cache_resource
+def get_data_store():
+    """Kho dữ liệu dùng chung cho mọi phiên: tải lại sau CACHE_TTL giây (ở luồng nền),
+    sau khi lưu chỉ vá dòng vừa lưu (không xóa cache)."""
+    return SharedDataStore(load_main_records, CACHE_TTL, overlay=get_write_queue().journal.pending_changes,
+                           background_refresh=REFRESH_IN_BACKGROUND,
+                           change_token=fetch_change_token, max_age=FULL_RELOAD_MAX_AGE,
+                           snapshot_path=SNAPSHOT_PATH)
+
+def get_snapshot():
+    """Lấy snapshot dữ liệu hiện tại (lần đầu sẽ tải từ nơi lưu trữ)"""
+    store = get_data_store()
+    try:
+        if 'data_loaded' not in st.session_state:
+            with st.spinner("🔄 Đang tải dữ liệu..."):
+                snapshot = store.get()
+            st.session_state.data_loaded = True
+            return snapshot
+        return store.get()
+    except QuotaExceeded:
+        st.error("❌ Hệ thống quá tải. Vui lòng thử lại sau 1 phút.")
+        st.stop()
+    except Exception as e:
+        st.error(f"⚠️ Lỗi tải dữ liệu: {str(e)}")
+        st.stop()
+
+def remember_rows(ids):
+    """Phiên chỉ giữ ID các dòng + phiên bản dữ liệu đang xem, không giữ DataFrame
+    (mọi phiên đọc chung 1 snapshot; bản cũ được giải phóng khi không còn ai giữ)."""
+    st.session_state.row_ids = [str(i) for i in ids]
+    st.session_state.data_version = get_snapshot().version
+
+def session_rows(ids=None):
+    """Các dòng mà phiên đang xem, đọc lại từ snapshot hiện tại (đã gồm các lần lưu mới nhất).
+    Phiên bản dữ liệu đổi từ lần xem trước (vd sheet được tải lại) thì kiểm tra các ID đã nhớ:
+    ID không còn trên sheet bị bỏ khỏi danh sách và báo cho người dùng."""
+    snapshot = get_snapshot()
+    remembered = st.session_state.get('row_ids', [])
+    rows = snapshot.rows_for_ids(remembered if ids is None else ids)
+    if st.session_state.get('data_version', snapshot.version) != snapshot.version:
+        live = [i for i in remembered if i in snapshot.indexes['id']]
+        if len(live) < len(remembered):
+            st.session_state.row_ids = live
+            st.warning(f"Dữ liệu vừa được cập nhật: {len(remembered) - len(live)} người trong kết quả tìm kiếm "
+                       "không còn trên danh sách.")
+    st.session_state.data_version = snapshot.version
+    return rows
+
+def find_rows(key_name, value):
+    """Tra cứu chính xác qua index (dict hit) thay vì quét cả cột.
+    key_name: tên index (vd 'cccd'). Trả về DataFrame các dòng khớp (có thể rỗng)."""
+    return get_snapshot().find_rows(key_name, value)
+
+def search_by_name_dob(name, dob):
+    """Tìm theo Họ tên + Ngày sinh qua index dựng sẵn.
+    Trả về (DataFrame kết quả theo thứ tự điểm giảm dần, có_khớp_chính_xác)"""
+    snapshot = get_snapshot()
+    ranked = snapshot.indexes['name'].search(name, dob)
+    labels = [label for label, _ in ranked]
+    is_exact = bool(ranked) and ranked[0][1] == 1.0
+    return snapshot.df.loc[labels], is_exact
 
 def force_refresh_data():
-    """Admin dùng để xóa cache và tải lại ngay lập tức"""
-    st.cache_data.clear()
-    for key in ['data_loaded', 'df_main', 'main_sheet', 'workbook', 'last_load_time']:
-        if key in st.session_state:
-            del st.session_state[key]
-    init_session_data()
+    """Admin dùng để tải lại toàn bộ dữ liệu ngay lập tức"""
+    store = get_data_store()
+    if REFRESH_IN_BACKGROUND:
+        store.refresh_async(force=True)
+    else:
+        store.refresh()
 
 # ---  ---
 
-def normalize_province_name(name):
-    """
-    Chuẩn hóa tên tỉnh/thành phố để so sánh linh hoạt.
-    Ví dụ: "Thành phố Hải Phòng" -> "hải phòng"
-             "Hải Phòng" -> "hải phòng"
-             "Tỉnh Hà Giang" -> "hà giang"
-    """
-    if not isinstance(name, str):
-        return ""
-        
-    name = name.lower() # 1. Chuyển về chữ thường
-    
-    # 2. Loại bỏ các tiền tố phổ biến
-    prefixes_to_remove = ["thành phố ", "tp. ", "tp ", "tỉnh "]
-    for prefix in prefixes_to_remove:
-        if name.startswith(prefix):
-            name = name.replace(prefix, "", 1) # Chỉ thay thế 1 lần ở đầu
-            break
-            
-    return name.strip()
-
-def find_province_index(province_from_sheet, all_provinces_list):
-    """
-    Tìm chỉ mục (index) của một tỉnh trong danh sách một cách linh hoạt.
-    Trả về chỉ mục nếu tìm thấy, ngược lại trả về 0 (giá trị mặc định).
-    """
-    normalized_target = normalize_province_name(province_from_sheet)
-    
-    if not normalized_target:
-        return 0
+@st.cache_resource
+def get_location_index():
+    """Danh mục Tỉnh -> Xã/Phường: đọc vietnam_data.json và dựng index 1 lần cho cả tiến trình."""
+    return load_location_index('vietnam_data.json')
+
+def resolve_sheet_rows(record_ids):
+    """Tìm số dòng trên Sheet của các ID trong 1 lô ghi: dict ID -> số dòng (None nếu không tìm thấy).
+    Số dòng lấy từ map dựng sẵn khi load, rồi kiểm tra bằng 1 lần đọc các ô ID trên sheet
+    (Admin có thể đã sắp xếp / chèn / xóa dòng sau lần tải). Chỉ gọi find() cho các dòng không khớp."""
+    storage = get_storage()
+    row_map = get_data_store().get().indexes['sheet_row']
+    guesses = {record_id: row_map.get(record_id) for record_id in record_ids}
+    live_ids = storage.read_ids([row for row in guesses.values() if row])
+    return {record_id: row if row and live_ids.get(row) == record_id else storage.find_row(record_id)
+            for record_id, row in guesses.items()}
+
+def to_sheet_value(col, val):
+    """Xử lý format Text cho Google Sheet (thêm dấu ' )"""
+    if col in COLS_FORCE_TEXT and val:
+        return "'" + str(val)
+    return val
+
+def append_backup_rows(rows):
+    """Ghi nhiều dòng vào Backup trong 1 lệnh API"""
+    get_storage().append_backup_rows(rows)
+
+def changed_cell_ranges(row_number, changes):
+    """Gom các cột thay đổi của 1 dòng thành các đoạn ô liền nhau.
+    Ví dụ thay đổi cột C, D, H -> [(dòng, 2, [C, D]), (dòng, 7, [H])]"""
+    positions = sorted(ALL_COLUMNS.index(col) for col in changes if col in ALL_COLUMNS)
+    ranges = []
+    for pos in positions:
+        value = to_sheet_value(ALL_COLUMNS[pos], changes[ALL_COLUMNS[pos]])
+        if ranges and ranges[-1][1] + len(ranges[-1][2]) == pos:
+            ranges[-1][2].append(value)
+        else:
+            ranges.append((row_number, pos, [value]))
+    return ranges
+
+def write_main_changes(changes_by_id):
+    """Ghi các ô thay đổi (đã gộp theo ID) lên Sheet1 bằng 1 lệnh batch_update nhiều vùng.
+    Trả về tập ID không tìm thấy trên sheet."""
+    updates = []
+    missing = set()
+    # Lưu mà không sửa gì: chỉ cần dòng xác nhận trong Backup
+    changes_by_id = {record_id: changes for record_id, changes in changes_by_id.items() if changes}
+    rows = resolve_sheet_rows(list(changes_by_id))
+    for record_id, changes in changes_by_id.items():
+        row_number = rows[record_id]
+        if not row_number:
+            missing.add(record_id)
+            continue
+        updates.extend(changed_cell_ranges(row_number, changes))
+    get_storage().update_cells(updates)
+    return missing
 
-    for index, province_from_json in enumerate(all_provinces_list):
-        normalized_json_province = normalize_province_name(province_from_json)
-        if normalized_target == normalized_json_province:
-            return index
-            
-    return 0 # Không tìm thấy, trả về index đầu tiên
-    
-def save_update_optimized(sheet, row_index, updated_values, workbook):
-    try:
-        # 1. Xử lý format Text cho Google Sheet (thêm dấu ' )
-        cols_force_text = [
-            'ID', 'Số định danh cá nhân *', 'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)',
-            'Số thẻ theo Đảng quyết định 85', 'Số CMND cũ (nếu có)', 'Sinh ngày * (dd/mm/yyyy)',
-            'Ngày cấp thẻ Đảng (dd/mm/yyyy)', 'Ngày vào Đảng* (dd/mm/yyyy)', 
-            'Ngày vào Đảng chính thức* (dd/mm/yyyy)',
-            'Ngày rời khỏi/ Ngày mất/ Ngày miễn sinh hoạt Đảng (dd/mm/yyyy)'
-        ]
-        row_vals = []
-        for col in ALL_COLUMNS:
-            val = updated_values.get(col, "")
-            if col in cols_force_text and val:
-                val = "'" + str(val)
-            row_vals.append(val)
-        
-        # 2. Backup (An toàn - Giờ VN)
+@st.cache_resource
+def get_backup_tail():
+    """Các dòng Backup đã đọc + tập ID đã cập nhật, dùng chung cho mọi phiên Admin.
+    Mỗi lần mở Dashboard chỉ tải thêm các dòng mới (không tải lại toàn bộ lịch sử)."""
+    return BackupTail(lambda start, end: get_storage().read_backup_range(start, end))
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def compute_org_progress(_df, _tail, _pending_ids, data_version, backup_key, pending_key):
+    """Tiến độ theo Tổ chức Đảng - chỉ tính lại khi dữ liệu / Backup / nhật ký thay đổi
+    (data_version, backup_key, pending_key là khóa cache; tham số có dấu _ không được băm)."""
+    return org_progress(_df, _tail.updated_ids | _pending_ids, _tail.last_saved)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def compute_save_histogram(_tail, backup_key, freq):
+    """Số lần lưu theo giờ / ngày - chỉ tính lại khi có dòng Backup mới"""
+    times, weights = _tail.save_events
+    return save_histogram(times, weights, freq)
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def compute_validation(_snapshot, data_version):
+    """Kiểm tra chất lượng cả danh sách - chỉ chạy lại khi phiên bản dữ liệu thay đổi.
+    Trả về (bảng lỗi, số giây đã chạy)."""
+    started = time.perf_counter()
+    issues = validate_roster(_snapshot.df, _snapshot.dates, get_location_index())
+    return issues, time.perf_counter() - started
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def compute_address_backfill(_snapshot, data_version):
+    """Tách chuỗi địa chỉ cũ -> các ô Temp_* còn trống (theo phiên bản dữ liệu).
+    Trả về (dict ID -> thay đổi, bảng dòng không khớp)."""
+    return plan_backfill(_snapshot.df, get_location_index())
+
+@st.cache_resource
+def get_export_cache():
+    """File xuất đã tạo, dùng chung cho mọi phiên Admin (theo phiên bản dữ liệu)"""
+    return ExportCache()
+
+def lazy_export(key, build):
+    """Hàm tạo file cho st.download_button: chỉ chạy khi Admin bấm tải,
+    lần bấm sau với cùng phiên bản dữ liệu dùng lại file đã tạo."""
+    cache = get_export_cache()
+    return lambda: cache.get_or_build(key, build)
+
+def archive_backup_values(values):
+    """Lưu bản sao sheet Backup ra file CSV trong DATA_CACHE_DIR (trước khi thu gọn)"""
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    stamp = (datetime.utcnow() + timedelta(hours=7)).strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(DATA_CACHE_DIR, f"backup_archive_{stamp}.csv")
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        csv.writer(f).writerows(values)
+    return path
+
+def compact_backup_log(cutoff):
+    """Thu gọn sheet Backup: các dòng cũ hơn cutoff gộp thành 1 checkpoint mỗi ID.
+    Chạy khi luồng nền không ghi (tránh mất dòng vừa append). Trả về (số dòng trước, sau)."""
+    storage = get_storage()
+
+    def run():
+        values = storage.read_backup_values()
+        compacted, n_folded = compact_backup_values(values, cutoff)
+        if not n_folded:
+            return len(values) - 1, len(values) - 1
+        archive_backup_values(values)
         try:
-            backup_sheet = workbook.worksheet(SHEET_NAME_BACKUP)
-            vn_time = (datetime.utcnow() + timedelta(hours=7)).strftime("%Y-%m-%d %H:%M:%S")
-            safe_append_row(backup_sheet, [vn_time] + row_vals)
-        except: pass
-        
-        # 3. GHI LÊN GOOGLE SHEET (Dùng tìm kiếm ID an toàn)
+            storage.rewrite_backup_values(compacted, width=max(len(row) for row in values))
+        finally:
+            get_backup_tail().reset()  # Số dòng đã thay đổi: lần sau đọc lại từ đầu
+        return len(values) - 1, len(compacted) - 1
+
+    return get_write_queue().run_exclusive(run)
+
+def main_sheet_ready():
+    """Chỉ ghi Sheet1 khi dữ liệu đã đối chiếu với sheet: snapshot khôi phục từ đĩa sau khi
+    khởi động lại có thể mang số dòng cũ. Chưa đối chiếu thì yêu cầu tải lại ở nền và chờ lượt sau."""
+    store = get_data_store()
+    if store.is_read_only():
+        store.refresh_async()
+        return False
+    return True
+
+@st.cache_resource
+def get_write_queue():
+    """Nhật ký lưu (SQLite) + luồng nền đẩy lên Google Sheet, dùng chung cả tiến trình"""
+    journal = SaveJournal(JOURNAL_PATH)
+    flusher = WriteBehindFlusher(journal, append_backup_rows, write_main_changes, interval=FLUSH_INTERVAL,
+                                 main_ready=main_sheet_ready)
+    return flusher.start()
+
+def save_update_optimized(updated_values):
+    """Nhận lần lưu: ghi vào nhật ký trên đĩa rồi xác nhận ngay.
+    Việc ghi Backup + Sheet1 do luồng nền thực hiện theo lô (xem write_queue.py)."""
+    try:
         target_id = str(updated_values.get('ID', '')).strip()
-        found_cell = safe_find_cell(sheet, target_id, in_column=2)
-        
-        if found_cell:
-            safe_update_sheet(sheet, f"A{found_cell.row}", [row_vals])
-        else:
+        snapshot = get_data_store().get()
+        current = snapshot.find_rows('id', target_id)
+        if current.empty:
             st.error(f"❌ Không tìm thấy ID {target_id} trong file gốc!")
             return False
-        
+
+        # 1. Chỉ ghi các ô thực sự thay đổi so với dữ liệu đang có
+        #    (không sửa gì thì không ghi Sheet1, vẫn ghi dòng xác nhận vào Backup)
+        full_row = {col: updated_values.get(col, "") for col in ALL_COLUMNS}
+        # Ô CCCD / số thẻ... đang lưu dạng số (mất số 0 đầu) thì ghi lại dạng Text dù giá trị không đổi
+        changes = diff_row_values(current.iloc[0], full_row, snapshot.text_repairs.get(target_id, ()))
+
+        # 2. Dòng Backup gọn (Giờ VN): thời gian + ID + JSON các trường thay đổi
+        vn_time = (datetime.utcnow() + timedelta(hours=7)).strftime("%Y-%m-%d %H:%M:%S")
+        backup_row = make_delta_row(vn_time, target_id, changes)
+
+        # 3. Ghi nhật ký (bền vững trên đĩa) - luồng nền sẽ đẩy lên Google Sheet
+        get_write_queue().journal.enqueue(target_id, changes, backup_row)
+
         # ====================================================================
-        # 🔥 4. XÓA SẠCH CACHE ĐỂ TẢI LẠI DỮ LIỆU MỚI NHẤT
-        # Đây là cách đảm bảo tính nhất quán tuyệt đối sau khi lưu.
+        # 🔥 4. VÁ DÒNG VỪA LƯU VÀO KHO DỮ LIỆU CHUNG (KHÔNG XÓA CACHE)
+        # Mọi phiên thấy ngay dữ liệu mới mà không phải tải lại cả Sheet1.
         # ====================================================================
-        
-        # Xóa Cache toàn cục ("Kho chung")
-        st.cache_data.clear()
-        
-        # Xóa Session của người dùng hiện tại ("Bàn làm việc riêng")
-        for key in ['data_loaded', 'df_main', 'main_sheet', 'workbook', 'last_load_time']:
-            if key in st.session_state:
-                del st.session_state[key]
+        if changes:
+            get_data_store().apply_update(target_id, changes)
 
         return True
 
@@ -277,6 +356,225 @@ def save_update_optimized(sheet, row_index, updated_values, workbook):
         st.error(f"❌ Lỗi lưu dữ liệu: {str(e)}")
         return False
 
+def save_bulk_changes(changes_by_id, with_backup=True):
+    """Lưu thay đổi hàng loạt: tất cả vào nhật ký trong 1 transaction, vá kho dữ liệu chung 1 lần;
+    luồng nền ghi Sheet1 theo lô (mỗi lô 1 batch_update, cùng quy tắc ép kiểu chữ).
+    with_backup: mỗi người 1 dòng Backup delta (False cho Ghi chú của Chi ủy - không tính là đã cập nhật)."""
+    vn_time = (datetime.utcnow() + timedelta(hours=7)).strftime("%Y-%m-%d %H:%M:%S")
+    items = [(record_id, changes, make_delta_row(vn_time, record_id, changes) if with_backup else None)
+             for record_id, changes in changes_by_id.items()]
+    write_queue = get_write_queue()
+    write_queue.journal.enqueue_many(items)
+    get_data_store().apply_updates(list(changes_by_id.items()))
+    write_queue.wake()
+    return len(items)
+
+# --- FORM BƯỚC 3: MỖI KHỐI LÀ 1 FRAGMENT ---
+# Đổi Quốc gia / Tỉnh chỉ chạy lại khối địa chỉ đó (không chạy lại cả app.py).
+# Mỗi khối trả về dict cột -> giá trị; nút Lưu chạy lại cả trang nên nhận đủ giá trị mới nhất.
+
+OPTIONAL_COLS = [
+    'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)', 'Ngày cấp thẻ Đảng (dd/mm/yyyy)',
+    'Số thẻ theo Đảng quyết định 85', 'Ngày vào Đảng chính thức* (dd/mm/yyyy)',
+    'Nơi cấp thẻ Đảng', 'Số CMND cũ (nếu có)', 'Tên gọi khác'
+]
+_FORM_COLS = [col for col in ALL_COLUMNS if col not in TEMP_COLS]
+_ADDRESS_START = _FORM_COLS.index('Nơi đăng ký khai sinh - Quốc gia *')
+_ADDRESS_END = _FORM_COLS.index('Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *') + 1
+FORM_COLS_BEFORE_ADDRESS = _FORM_COLS[:_ADDRESS_START]
+FORM_COLS_AFTER_ADDRESS = _FORM_COLS[_ADDRESS_END:]
+
+@st.cache_resource
+def get_render_stats():
+    """Thời gian xử lý mỗi lần tương tác ở Bước 3 (cả trang / từng khối), dùng chung cả tiến trình"""
+    return TimingStats()
+
+def is_fragment_rerun(name):
+    """True nếu khối `name` đang tự chạy lại: đã chạy 1 lần trong cùng lần chạy cả script."""
+    key = f"fragment_run_{name}"
+    if st.session_state.get(key) == st.session_state.script_runs:
+        return True
+    st.session_state[key] = st.session_state.script_runs
+    return False
+
+def timed_fragment(name):
+    """st.fragment + ghi thời gian mỗi lần khối tự chạy lại (lần chạy cùng cả trang đã tính vào cả trang)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            started = time.perf_counter()
+            rerun = is_fragment_rerun(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if rerun:
+                    get_render_stats().record(name, time.perf_counter() - started)
+        return st.fragment(run)
+    return decorate
+
+def render_plain_fields(current_data, columns):
+    values = {}
+    for col in columns:
+        val = current_data.get(col, "")
+        clean_label = col
+        if col in OPTIONAL_COLS: clean_label = clean_label.replace('*', '')
+
+        if col in READ_ONLY_COLS:
+            st.text_input(clean_label, value=val, disabled=True, key=col)
+            values[col] = str(val)
+        elif col == 'Trạng thái hoạt động':
+            opts = ["Đang sinh hoạt Đảng", "Đã chuyển sinh hoạt"]
+            idx = opts.index(val) if val in opts else 0
+            values[col] = st.selectbox(clean_label, opts, index=idx, key=col)
+        elif col == 'Giới tính *':
+            opts = ["Nam", "Nữ"]
+            idx = opts.index(val) if val in opts else 0
+            values[col] = st.selectbox(clean_label, opts, index=idx, key=col)
+        else:
+            ph = "Để trống nếu chưa có thông tin" if col in OPTIONAL_COLS else ""
+            values[col] = st.text_input(clean_label, value=str(val), placeholder=ph, key=col)
+
+            # --- THÊM HỘP THÔNG BÁO TẠI ĐÂY ---
+            if col == 'Số định danh cá nhân *':
+                help_text_party_card = """
+                <div style="
+                    background-color: #FFFBE6; 
+                    border-left: 5px solid #FFC107; 
+                    padding: 10px; 
+                    border-radius: 5px; 
+                    margin-top: 10px;
+                    margin-bottom: 10px;
+                    color: #333333;
+                ">
+                    ❗ <strong>CHÚ Ý:</strong> NẾU ĐÃ CÓ THẺ ĐẢNG THÌ ĐIỀN ĐẦY ĐỦ CÁC MỤC THẺ ĐẢNG !!
+                </div>
+                """
+                st.markdown(help_text_party_card, unsafe_allow_html=True)
+    return values
+
+# Mỗi chỗ gọi là 1 khối riêng: dùng chung tên thì lần gọi thứ 2 trong cùng lần chạy
+# cả trang bị tính nhầm là khối tự chạy lại
+@timed_fragment("Khối thông tin chung (trước địa chỉ)")
+def render_fields_before_address(current_data):
+    return render_plain_fields(current_data, FORM_COLS_BEFORE_ADDRESS)
+
+@timed_fragment("Khối thông tin chung (sau địa chỉ)")
+def render_fields_after_address(current_data):
+    return render_plain_fields(current_data, FORM_COLS_AFTER_ADDRESS)
+
+@timed_fragment("Khối Khai sinh")
+def render_birth_place(current_data):
+    locations = get_location_index()
+    list_tinh = locations.provinces
+    values = {}
+    col_qg = 'Nơi đăng ký khai sinh - Quốc gia *'
+    col_tinh = 'Nơi đăng ký khai sinh - Tỉnh *'
+    col_xa = 'Nơi đăng ký khai sinh - Địa chỉ chi tiết *'
+
+    st.markdown("---"); st.subheader("🏠 THÔNG TIN KHAI SINH")
+    is_russia = str(current_data.get(col_qg, "")).strip().upper() in ["LIÊN BANG NGA", "NGA", "RUSSIA"]
+    ks_quocgia = st.radio("Quốc gia *", ["Việt Nam", "Liên Bang Nga"], index=1 if is_russia else 0, horizontal=True, key="ks_qg")
+    values[col_qg] = ks_quocgia
+
+    if ks_quocgia == "Liên Bang Nga":
+        st.text_input("Tỉnh *", value="KHÔNG", disabled=True, key="ks_tinh_nga")
+        values[col_tinh] = "KHÔNG"
+        st.text_input("Xã/Phường/ Đặc khu *", value="KHÔNG", disabled=True, key="ks_xa_nga")
+        values['Temp_XaPhuong_KhaiSinh'] = "KHÔNG"
+        values['Temp_ThonTo_KhaiSinh'] = "" # Luôn set rỗng
+        values[col_xa] = "KHÔNG"
+        return values
+
+    idx = locations.province_index(str(current_data.get(col_tinh, "")), default=0)
+    ks_tinh = st.selectbox("Tỉnh *", list_tinh, index=idx, key="ks_tinh_vn")
+    values[col_tinh] = ks_tinh
+
+    list_xa = locations.communes.get(ks_tinh, [])
+    # Ưu tiên lấy từ cột Temp, nếu không có thì lấy trực tiếp từ cột chính
+    val_xa = str(current_data.get('Temp_XaPhuong_KhaiSinh', '')).strip()
+    if not val_xa:
+        val_xa = str(current_data.get(col_xa, '')).strip()
+    idx = locations.commune_index(ks_tinh, val_xa, default=0)
+    input_xa = st.selectbox("Xã/Phường/ Đặc khu *", list_xa, index=idx, key="ks_xa_vn")
+
+    # Cột chính chỉ lưu tên xã; cột Temp Xã lưu lại lựa chọn
+    values[col_xa] = input_xa
+    values['Temp_XaPhuong_KhaiSinh'] = input_xa
+    # Cột Temp Thôn không còn dùng, set giá trị rỗng để xóa dữ liệu cũ (nếu có)
+    values['Temp_ThonTo_KhaiSinh'] = ""
+    return values
+
+@timed_fragment("Khối Quê quán")
+def render_home_town(current_data):
+    locations = get_location_index()
+    list_tinh = locations.provinces
+    values = {}
+    col_tinh = 'Quê quán (theo mô hình 2 cấp) - Tỉnh *'
+    col_xa = 'Quê quán (theo mô hình 2 cấp) - Địa chỉ chi tiết *'
+
+    st.markdown("---"); st.subheader("🏠 THÔNG TIN QUÊ QUÁN")
+    st.text_input("Quốc gia *", value="Việt Nam", disabled=True, key="qq_qg")
+    values['Quê quán (theo mô hình 2 cấp) - Quốc gia *'] = "Việt Nam"
+
+    idx = locations.province_index(str(current_data.get(col_tinh, "")), default=0)
+    qq_tinh = st.selectbox("Tỉnh *", list_tinh, index=idx, key="qq_tinh")
+    values[col_tinh] = qq_tinh
+
+    list_xa = locations.communes.get(qq_tinh, [])
+    idx = locations.commune_index(qq_tinh, str(current_data.get(col_xa, "")), default=0)
+    values[col_xa] = st.selectbox("Xã/Phường/ Đặc khu *", list_xa, index=idx, key="qq_xa")
+    return values
+
+@timed_fragment("Khối Thường trú")
+def render_residence(current_data):
+    locations = get_location_index()
+    list_tinh = locations.provinces
+    values = {}
+    col_tinh = 'Thường trú (theo mô hình 2 cấp) - Tỉnh *'
+    col_detail = 'Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *'
+
+    st.markdown("---"); st.subheader("🏠 THÔNG TIN THƯỜNG TRÚ")
+    st.text_input("Quốc gia *", value="Việt Nam", disabled=True, key="tt_qg")
+    values['Thường trú (theo mô hình 2 cấp) - Quốc gia *'] = "Việt Nam"
+
+    idx = locations.province_index(str(current_data.get(col_tinh, "")), default=0)
+    tt_tinh = st.selectbox("Tỉnh *", list_tinh, index=idx, key="tt_tinh")
+    values[col_tinh] = tt_tinh
+
+    list_xa = locations.communes.get(tt_tinh, [])
+    val = current_data.get(col_detail, "")
+    val_xa = current_data.get('Temp_XaPhuong_ThuongTru', '')
+    val_thon = current_data.get('Temp_ThonTo_ThuongTru', '')
+    if not val_xa and str(val):
+        parts = str(val).split(',')
+        if len(parts) >= 2: val_xa = parts[-1].strip(); val_thon = ",".join(parts[:-1]).strip()
+
+    c1, c2 = st.columns(2)
+    with c1:
+        idx = locations.commune_index(tt_tinh, val_xa, default=0)
+        tt_xa = st.selectbox("Xã/Phường/ Đặc khu *", list_xa, index=idx, key="tt_xa")
+    with c2:
+        tt_thon = st.text_input("Địa chỉ chi tiết dưới Xã/Phường/ Đặc khu *", value=str(val_thon), key="tt_thon")
+        help_text = """
+        <div style="
+            background-color: #FFFBE6; 
+            border-left: 5px solid #FFC107; 
+            padding: 10px; 
+            border-radius: 5px; 
+            margin-top: 5px;
+            color: #333333; /* <-- THÊM DÒNG NÀY */
+        ">
+            💡 <strong>KHÔNG PHẢI ĐỊA CHỈ TẠM TRÚ Ở HÀ NỘI. XEM THƯỜNG TRÚ TRÊN VNEID. KHÔNG GHI XÃ/ PHƯỜNG VÀO DÂY!!!</strong><br>
+            <em>Cách ghi:</em> ghi chi tiết nhất có thể, bao gồm: số nhà, đường phố/thôn/xóm/tổ... (ví dụ Thôn Hòa Bình Hạ/ Tổ dân số 5/ Số 60 Ngách 6/12 Đội Nhân)
+        </div>
+        """
+        st.markdown(help_text, unsafe_allow_html=True)
+
+    values['Temp_XaPhuong_ThuongTru'] = tt_xa
+    values['Temp_ThonTo_ThuongTru'] = tt_thon
+    values[col_detail] = f"{tt_thon}, {tt_xa}".strip(", ")
+    return values
+
 # --- GIAO DIỆN CHÍNH ---
 st.set_page_config(page_title="Cập nhật thông tin Đảng viên CBSV II -NEU", layout="wide")
 st.markdown("""
@@ -335,8 +633,8 @@ if app_mode == "👤 Cập nhật thông tin":
     # Khởi tạo state nếu chưa có
     if 'step' not in st.session_state:
         st.session_state.step = 1
-    if 'selected_row_index' not in st.session_state:
-        st.session_state.selected_row_index = None
+    if 'selected_id' not in st.session_state:
+        st.session_state.selected_id = None
 
 # --- STEP 1: SEARCH ---
     if st.session_state.step == 1:
@@ -358,19 +656,14 @@ if app_mode == "👤 Cập nhật thông tin":
                         st.warning("Vui lòng nhập Số định danh cá nhân.")
                     else:
                         with st.spinner("Đang tìm kiếm theo số định danh..."):
-                            df, _, _ = get_session_data()
-                            
-                            # Normalize input and data for comparison (remove spaces, ensure string)
                             clean_input_id = search_id.strip()
                             
-                            # Ensure the column is treated as string for comparison
-                            # Note: 'Số định danh cá nhân *' is the exact column name
-                            mask = df['Số định danh cá nhân *'].astype(str).str.strip() == clean_input_id
-                            results = df[mask]
+                            # Tra cứu qua index CCCD đã dựng sẵn khi load (O(1))
+                            results = find_rows('cccd', clean_input_id)
 
                             if not results.empty:
                                 st.success(f"✅ Tìm thấy thông tin của: {results.iloc[0]['Họ và tên *']}")
-                                st.session_state.search_results = results
+                                remember_rows(results['ID'])
                                 st.session_state.step = 2
                                 st.rerun()
                             else:
@@ -396,7 +689,7 @@ if app_mode == "👤 Cập nhật thông tin":
                 st.markdown("#### 👤 Tra cứu bằng Họ Tên và Ngày Sinh")
                 col_s1, col_s2 = st.columns(2)
                 with col_s1:
-                    search_name = st.text_input("Họ và tên (đầy đủ có dấu):")
+                    search_name = st.text_input("Họ và tên (có dấu hoặc không dấu):")
                 with col_s2:
                     search_dob = st.text_input("Ngày sinh (dd/mm/yyyy):", placeholder="Ví dụ: 05/01/2005")
                 
@@ -407,21 +700,18 @@ if app_mode == "👤 Cập nhật thông tin":
                         st.warning("Vui lòng nhập đầy đủ Họ tên và Ngày sinh.")
                     else:
                         with st.spinner("Đang tìm kiếm..."):
-                            df, _, _ = get_session_data()
-                            # Case-insensitive search
-                            mask = (
-                                df['Họ và tên *'].str.strip().str.lower() == search_name.strip().lower()
-                            ) & (
-                                df['Sinh ngày * (dd/mm/yyyy)'] == search_dob.strip()
-                            )
-                            results = df[mask]
+                            # Không phân biệt dấu/hoa thường/định dạng ngày, có tìm gần đúng
+                            results, is_exact = search_by_name_dob(search_name, search_dob)
 
                             if results.empty:
                                 st.error("❌ Không tìm thấy thông tin.")
-                                st.info("Lưu ý: Kiểm tra kỹ chính tả tiếng Việt và định dạng ngày (dd/mm/yyyy).")
+                                st.info("Lưu ý: Kiểm tra lại Họ tên và Ngày sinh (dd/mm/yyyy).")
                             else:
-                                st.success(f"Tìm thấy {len(results)} kết quả.")
-                                st.session_state.search_results = results
+                                if is_exact:
+                                    st.success(f"Tìm thấy {len(results)} kết quả.")
+                                else:
+                                    st.success(f"Tìm thấy {len(results)} kết quả gần đúng.")
+                                remember_rows(results['ID'])
                                 st.session_state.step = 2
                                 st.rerun()
             
@@ -434,11 +724,11 @@ if app_mode == "👤 Cập nhật thông tin":
     # --- BƯỚC 2: CHỌN NGƯỜI ---
     elif st.session_state.step == 2:
         st.subheader("Bước 2: Xác nhận danh tính")
-        results = st.session_state.search_results
+        results = session_rows()
         
         st.info("Vui lòng chọn đúng tên của bạn trong danh sách dưới đây:")
         
-        for index, row in results.iterrows():
+        for _, row in results.iterrows():
             with st.container(border=True):
                 c1, c2 = st.columns([4, 1])
                 with c1:
@@ -446,9 +736,9 @@ if app_mode == "👤 Cập nhật thông tin":
                     st.text(f"Đơn vị: {row['Tổ chức Đảng đang sinh hoạt * (không sửa)']}")
                     st.text(f"Ngày vào Đảng: {row['Ngày vào Đảng* (dd/mm/yyyy)']}")
                 with c2:
-                    # Lưu index thực của dòng trong DataFrame gốc
-                    if st.button("CẬP NHẬT", key=f"btn_{index}", type="primary"):
-                        st.session_state.selected_row_index = index
+                    # Lưu ID (khóa ổn định qua các lần tải lại), không lưu vị trí dòng
+                    if st.button("CẬP NHẬT", key=f"btn_{row['ID']}", type="primary"):
+                        st.session_state.selected_id = row['ID']
                         st.session_state.step = 3
                         st.rerun()
         
@@ -461,26 +751,11 @@ if app_mode == "👤 Cập nhật thông tin":
     elif st.session_state.step == 3:
 
         
-        # 1. Load Data Địa chính
-        import json
-        @st.cache_data
-        def load_location_data():
-            try:
-                with open('vietnam_data.json', 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except FileNotFoundError: return {}
-
-        vn_locations = load_location_data()
-        list_tinh = list(vn_locations.keys())
-        
-        # 2. Load Data User
-        df, main_sheet, workbook = get_session_data()
-        idx = st.session_state.selected_row_index
-        
-        try:
-            current_data = df.loc[idx]
-        except KeyError:
+        # Load Data User (các khối địa chỉ tự lấy danh mục địa chính dùng chung)
+        selected = session_rows([st.session_state.selected_id])
+        if selected.empty:
             st.error("Phiên làm việc hết hạn."); st.stop()
+        current_data = selected.iloc[0]
 
         note_content = str(current_data.get('Ghi chú', '')).strip()
         if note_content:
@@ -492,193 +767,22 @@ if app_mode == "👤 Cập nhật thông tin":
         st.write("Kiểm tra và chỉnh sửa các thông tin dưới đây:")
         
         updated_values = {}
-
-        # Danh sách Optional
-        OPTIONAL_COLS = [
-            'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)', 'Ngày cấp thẻ Đảng (dd/mm/yyyy)',
-            'Số thẻ theo Đảng quyết định 85', 'Ngày vào Đảng chính thức* (dd/mm/yyyy)',
-            'Nơi cấp thẻ Đảng', 'Số CMND cũ (nếu có)', 'Tên gọi khác'
-        ]
-
-        # --- BẮT ĐẦU VÒNG LẶP HIỂN THỊ FORM ---
-        for col in ALL_COLUMNS:
-            if col in TEMP_COLS: continue
-            
-            val = current_data.get(col, "")
-
-            # ========================================================
-            # 1. KHAI SINH
-            # ========================================================
-            if col == 'Nơi đăng ký khai sinh - Quốc gia *':
-                st.markdown("---"); st.subheader("🏠 THÔNG TIN KHAI SINH")
-                is_russia = str(val).strip().upper() in ["LIÊN BANG NGA", "NGA", "RUSSIA"]
-                ks_quocgia = st.radio("Quốc gia *", ["Việt Nam", "Liên Bang Nga"], index=1 if is_russia else 0, horizontal=True, key="ks_qg")
-                updated_values[col] = ks_quocgia
-
-            elif col == 'Nơi đăng ký khai sinh - Tỉnh *':
-                cur_qg = st.session_state.get("ks_qg", "Việt Nam")
-                if cur_qg == "Liên Bang Nga":
-                    st.text_input("Tỉnh *", value="KHÔNG", disabled=True, key="ks_tinh_nga")
-                    updated_values[col] = "KHÔNG"
-                else:
-                    # SỬA Ở ĐÂY: Dùng hàm tìm kiếm linh hoạt
-                    idx = find_province_index(str(val), list_tinh)
-                    ks_tinh = st.selectbox("Tỉnh *", list_tinh, index=idx, key="ks_tinh_vn")
-                    updated_values[col] = ks_tinh
-
-            # --- ĐOẠN CODE MỚI ---
-            elif col == 'Nơi đăng ký khai sinh - Địa chỉ chi tiết *':
-                cur_qg = st.session_state.get("ks_qg", "Việt Nam")
-                if cur_qg == "Liên Bang Nga":
-                    # Phần này giữ nguyên, không cần sửa
-                    st.text_input("Xã/Phường/ Đặc khu *", value="KHÔNG", disabled=True, key="ks_xa_nga")
-                    updated_values['Temp_XaPhuong_KhaiSinh'] = "KHÔNG"
-                    updated_values['Temp_ThonTo_KhaiSinh'] = "" # Luôn set rỗng
-                    updated_values[col] = "KHÔNG"
-                else:
-                    cur_tinh = st.session_state.get("ks_tinh_vn", list_tinh[0] if list_tinh else "")
-                    list_xa = vn_locations.get(cur_tinh, [])
-
-                    # *** LOGIC MỚI ĐỂ LẤY DỮ LIỆU XÃ/PHƯỜNG ***
-                    # Ưu tiên lấy từ cột Temp, nếu không có thì lấy trực tiếp từ cột chính (biến 'val')
-                    val_xa = current_data.get('Temp_XaPhuong_KhaiSinh', '').strip()
-                    if not val_xa:
-                        val_xa = str(val).strip()
-
-                    # *** GIAO DIỆN MỚI: BỎ CỘT THÔN/TỔ ***
-                    try: 
-                        idx = list_xa.index(val_xa)
-                    except ValueError: 
-                        idx = 0
-                    input_xa = st.selectbox("Xã/Phường/ Đặc khu *", list_xa, index=idx, key="ks_xa_vn")
-                    
-                    # *** LOGIC LƯU MỚI ***
-                    # Cột chính giờ chỉ lưu tên xã
-                    updated_values[col] = input_xa 
-                    # Cột Temp Xã để lưu lại lựa chọn
-                    updated_values['Temp_XaPhuong_KhaiSinh'] = input_xa
-                    # Cột Temp Thôn không còn dùng, set giá trị rỗng để xóa dữ liệu cũ (nếu có)
-                    updated_values['Temp_ThonTo_KhaiSinh'] = ""
-
-            # ========================================================
-            # 2. QUÊ QUÁN
-            # ========================================================
-            elif col == 'Quê quán (theo mô hình 2 cấp) - Quốc gia *':
-                st.markdown("---"); st.subheader("🏠 THÔNG TIN QUÊ QUÁN")
-                st.text_input("Quốc gia *", value="Việt Nam", disabled=True, key="qq_qg")
-                updated_values[col] = "Việt Nam"
-
-            elif col == 'Quê quán (theo mô hình 2 cấp) - Tỉnh *':
-                # SỬA Ở ĐÂY
-                idx = find_province_index(str(val), list_tinh)
-                qq_tinh = st.selectbox("Tỉnh *", list_tinh, index=idx, key="qq_tinh")
-                updated_values[col] = qq_tinh
-
-            elif col == 'Quê quán (theo mô hình 2 cấp) - Địa chỉ chi tiết *':
-                cur_tinh = st.session_state.get("qq_tinh", "")
-                list_xa = vn_locations.get(cur_tinh, [])
-                try: idx = list_xa.index(str(val))
-                except: idx = 0
-                qq_xa = st.selectbox("Xã/Phường/ Đặc khu *", list_xa, index=idx, key="qq_xa")
-                updated_values[col] = qq_xa
-
-            # ========================================================
-            # 3. THƯỜNG TRÚ
-            # ========================================================
-            elif col == 'Thường trú (theo mô hình 2 cấp) - Quốc gia *':
-                st.markdown("---"); st.subheader("🏠 THÔNG TIN THƯỜNG TRÚ")
-                st.text_input("Quốc gia *", value="Việt Nam", disabled=True, key="tt_qg")
-                updated_values[col] = "Việt Nam"
-
-            elif col == 'Thường trú (theo mô hình 2 cấp) - Tỉnh *':
-                # SỬA Ở ĐÂY
-                idx = find_province_index(str(val), list_tinh)
-                tt_tinh = st.selectbox("Tỉnh *", list_tinh, index=idx, key="tt_tinh")
-                updated_values[col] = tt_tinh
-
-            elif col == 'Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *':
-                cur_tinh = st.session_state.get("tt_tinh", "")
-                list_xa = vn_locations.get(cur_tinh, [])
-                
-                val_xa = current_data.get('Temp_XaPhuong_ThuongTru', '')
-                val_thon = current_data.get('Temp_ThonTo_ThuongTru', '')
-                if not val_xa and str(val):
-                    parts = str(val).split(',')
-                    if len(parts) >= 2: val_xa = parts[-1].strip(); val_thon = ",".join(parts[:-1]).strip()
-
-                c1, c2 = st.columns(2)
-                with c1:
-                    try: idx = list_xa.index(val_xa)
-                    except: idx = 0
-                    tt_xa = st.selectbox("Xã/Phường/ Đặc khu *", list_xa, index=idx, key="tt_xa")
-                with c2:
-                    tt_thon = st.text_input("Địa chỉ chi tiết dưới Xã/Phường/ Đặc khu *", value=str(val_thon), key="tt_thon")
-                    help_text = """
-                    <div style="
-                        background-color: #FFFBE6; 
-                        border-left: 5px solid #FFC107; 
-                        padding: 10px; 
-                        border-radius: 5px; 
-                        margin-top: 5px;
-                        color: #333333; /* <-- THÊM DÒNG NÀY */
-                    ">
-                        💡 <strong>KHÔNG PHẢI ĐỊA CHỈ TẠM TRÚ Ở HÀ NỘI. XEM THƯỜNG TRÚ TRÊN VNEID. KHÔNG GHI XÃ/ PHƯỜNG VÀO DÂY!!!</strong><br>
-                        <em>Cách ghi:</em> ghi chi tiết nhất có thể, bao gồm: số nhà, đường phố/thôn/xóm/tổ... (ví dụ Thôn Hòa Bình Hạ/ Tổ dân số 5/ Số 60 Ngách 6/12 Đội Nhân)
-                    </div>
-                    """
-                    st.markdown(help_text, unsafe_allow_html=True)
-
-                updated_values['Temp_XaPhuong_ThuongTru'] = tt_xa
-                updated_values['Temp_ThonTo_ThuongTru'] = tt_thon
-                updated_values[col] = f"{tt_thon}, {tt_xa}".strip(", ")
-
-            # ========================================================
-            # CÁC TRƯỜNG KHÁC
-            # ========================================================
-            else:
-                clean_label = col
-                for p in ["Nơi đăng ký khai sinh - ", "Quê quán (theo mô hình 2 cấp) - ", "Thường trú (theo mô hình 2 cấp) - "]:
-                    clean_label = clean_label.replace(p, "")
-                
-                if col in OPTIONAL_COLS: clean_label = clean_label.replace('*', '')
-
-                if col in READ_ONLY_COLS:
-                    st.text_input(clean_label, value=val, disabled=True, key=col)
-                    updated_values[col] = str(val)
-                elif col == 'Trạng thái hoạt động':
-                    opts = ["Đang sinh hoạt Đảng", "Đã chuyển sinh hoạt"]
-                    idx = opts.index(val) if val in opts else 0
-                    updated_values[col] = st.selectbox(clean_label, opts, index=idx, key=col)
-                elif col == 'Giới tính *':
-                    opts = ["Nam", "Nữ"]
-                    idx = opts.index(val) if val in opts else 0
-                    updated_values[col] = st.selectbox(clean_label, opts, index=idx, key=col)
-                # --- ĐOẠN CODE MỚI ---
-                else:
-                    ph = "Để trống nếu chưa có thông tin" if col in OPTIONAL_COLS else ""
-                    updated_values[col] = st.text_input(clean_label, value=str(val), placeholder=ph, key=col)
-
-                    # --- THÊM HỘP THÔNG BÁO TẠI ĐÂY ---
-                    if col == 'Số định danh cá nhân *':
-                        help_text_party_card = """
-                        <div style="
-                            background-color: #FFFBE6; 
-                            border-left: 5px solid #FFC107; 
-                            padding: 10px; 
-                            border-radius: 5px; 
-                            margin-top: 10px;
-                            margin-bottom: 10px;
-                            color: #333333;
-                        ">
-                            ❗ <strong>CHÚ Ý:</strong> NẾU ĐÃ CÓ THẺ ĐẢNG THÌ ĐIỀN ĐẦY ĐỦ CÁC MỤC THẺ ĐẢNG !!
-                        </div>
-                        """
-                        st.markdown(help_text_party_card, unsafe_allow_html=True)
+        updated_values.update(render_fields_before_address(current_data))
+        updated_values.update(render_birth_place(current_data))
+        updated_values.update(render_home_town(current_data))
+        updated_values.update(render_residence(current_data))
+        updated_values.update(render_fields_after_address(current_data))
+        # Lần chạy lại cả trang (so sánh với thời gian chạy lại từng khối ở Admin Dashboard)
+        get_render_stats().record("Bước 3 - chạy lại cả trang", time.perf_counter() - SCRIPT_STARTED)
 
         st.write("---")
         
         # --- NÚT LƯU VÀ VALIDATION (NÂNG CẤP CHECK RIÊNG LẺ) ---
-        if st.button("💾 LƯU THÔNG TIN", type="primary", use_container_width=True):
+        # Chưa kết nối được Google Sheet (đang dùng dữ liệu trên đĩa): chỉ cho xem, không cho lưu
+        read_only = get_data_store().is_read_only()
+        if read_only:
+            st.warning("⚠️ Hệ thống đang tạm mất kết nối tới Google Sheet. Bạn có thể xem thông tin nhưng chưa thể lưu, vui lòng thử lại sau ít phút.")
+        if st.button("💾 LƯU THÔNG TIN", type="primary", use_container_width=True, disabled=read_only):
             
             updated_values['Ghi chú'] = current_data.get('Ghi chú', '')
             col_xoa = 'Đề nghị xóa (do đang viên không thuộc chi bộ)/ (Nếu muốn xóa chọn "có", còn không bỏ qua)'
@@ -729,7 +833,7 @@ if app_mode == "👤 Cập nhật thông tin":
                 for f in missing_fields: st.markdown(f"- **{f}**")
             else:
                 with st.spinner("💾 Đang lưu dữ liệu..."):
-                    success = save_update_optimized(main_sheet, idx, updated_values, workbook)
+                    success = save_update_optimized(updated_values)
                     
                     if success:
                         st.session_state.step = 4
@@ -748,7 +852,7 @@ if app_mode == "👤 Cập nhật thông tin":
         st.markdown("""
         <div style="padding: 20px; border: 1px solid #4CAF50; border-radius: 10px; background-color: #E8F5E9; color: #2E7D32;">
             <h3 style="margin:0">Dữ liệu đã được lưu an toàn.</h3>
-            <p>Cảm ơn đồng chí đã cập nhật thông tin. CHÚ Ý: dữ liệu sẽ cập nhật thông tin vừa lưu sau 2 phút!</p>
+            <p>Cảm ơn đồng chí đã cập nhật thông tin. Thông tin vừa lưu đã được cập nhật vào hệ thống.</p>
         </div>
         """, unsafe_allow_html=True)
         
@@ -758,8 +862,8 @@ if app_mode == "👤 Cập nhật thông tin":
         if st.button("⬅️ Quay về trang tìm kiếm để cập nhật người khác", type="primary", use_container_width=True):
             # Reset toàn bộ session để về trạng thái ban đầu
             st.session_state.step = 1
-            st.session_state.selected_row_index = None
-            st.session_state.search_results = None
+            st.session_state.selected_id = None
+            st.session_state.row_ids = []
             st.rerun()
 
 # =========================================================
@@ -778,34 +882,71 @@ elif app_mode == "📊 Admin Dashboard":
         st.sidebar.divider()
         st.sidebar.markdown("### 📊 Trạng thái dữ liệu")
         
-        # Logic hiển thị trạng thái cache
-        if 'last_load_time' in st.session_state:
-            elapsed = int(time.time() - st.session_state.last_load_time)
-            mins, secs = divmod(elapsed, 60)
-            st.sidebar.caption(f"⏱️ Cache: {mins}p {secs}s trước (Tự làm mới sau 1p)")
-            
-            # Nút làm mới (Chỉ Admin mới bấm được)
-            if st.sidebar.button("🔄 Làm mới ngay"):
-                force_refresh_data()
-                st.rerun()
-        else:
-            st.sidebar.info("Dữ liệu đang được tải...")
+        # Logic hiển thị trạng thái cache (kho dữ liệu chung)
+        store = get_data_store()
+        snapshot = get_snapshot()
+        elapsed = int(time.time() - snapshot.loaded_at)
+        mins, secs = divmod(elapsed, 60)
+        st.sidebar.caption(f"⏱️ Tải toàn bộ: {mins}p {secs}s trước")
+        st.sidebar.caption(
+            f"🔍 Kiểm tra thay đổi: {int(snapshot.age())}s trước (mỗi {CACHE_TTL}s), "
+            f"bỏ qua {store.skipped_reloads} lần tải lại vì sheet không đổi"
+        )
+        st.sidebar.caption(f"🔢 Phiên bản dữ liệu: {snapshot.version}")
+        live_versions = store.live_versions
+        st.sidebar.caption(f"🧠 Số phiên bản đang giữ trong bộ nhớ: {len(live_versions)}")
+        if snapshot.source == 'disk':
+            st.sidebar.warning("💾 Đang dùng dữ liệu lưu trên máy chủ (chưa đối chiếu được với Google Sheet)")
+        if store.last_refresh_duration is not None:
+            st.sidebar.caption(f"⏳ Thời gian tải lần gần nhất: {store.last_refresh_duration:.1f}s")
+        if store.is_refreshing():
+            st.sidebar.caption("🔄 Đang tải lại ở nền...")
+        if store.last_refresh_error:
+            st.sidebar.warning(f"Tải lại lỗi, đang dùng dữ liệu cũ: {store.last_refresh_error}")
+        write_queue = get_write_queue()
+        queue_stats = write_queue.journal.stats()
+        st.sidebar.caption(f"📝 Đang chờ ghi lên Sheet: {queue_stats['pending']} lần lưu")
+        if write_queue.last_flush_at is not None:
+            st.sidebar.caption(f"📤 Lần đẩy lên Sheet gần nhất: {time.time() - write_queue.last_flush_at:.0f}s trước")
+        if queue_stats['failed']:
+            st.sidebar.warning(f"Có {queue_stats['failed']} lần lưu không tìm thấy ID trên Sheet1")
+        if write_queue.last_error:
+            st.sidebar.warning(f"Lỗi ghi gần nhất: {write_queue.last_error}")
+        quota_stats = get_quota_scheduler().stats
+        st.sidebar.caption(
+            f"📡 API: {quota_stats['calls']} lời gọi, {quota_stats['rate_limited']} lần 429, "
+            f"chờ quota tổng {quota_stats['waited_seconds']:.0f}s"
+        )
+        
+        # Nút làm mới (Chỉ Admin mới bấm được)
+        if st.sidebar.button("🔄 Làm mới ngay"):
+            force_refresh_data()
+            get_backup_tail().refresh(force=True)
+            st.rerun()
         # ------------------------------------------------------
 
         with st.spinner("Đang tải dữ liệu thống kê..."):
             # Load dữ liệu mới nhất từ Sheet1
-            df_main, _, workbook = get_session_data()
+            snapshot = get_snapshot()
+            df_main = snapshot.df
             
+            backup_rows = None
+            backup_tail = None
             try:
-                backup_sheet = workbook.worksheet(SHEET_NAME_BACKUP)
-                backup_rows = safe_get_all_values(backup_sheet)
-                if len(backup_rows) > 1:
-                    updated_ids = set([str(row[2]).replace('.0', '') for row in backup_rows[1:] if len(row) > 2])
-                else:
-                    updated_ids = set()
-            except gspread.exceptions.WorksheetNotFound:
+                # Chỉ tải các dòng Backup mới kể từ lần đọc trước
+                tail = get_backup_tail()
+                tail.refresh()
+                backup_tail, backup_rows = tail, tail.values
+                updated_ids = tail.updated_ids
+            except MissingWorksheet:
                 st.error("Chưa có sheet Backup!")
                 updated_ids = set()
+            except Exception as e:
+                st.error(f"⚠️ Không đọc được Backup: {str(e)}")
+                updated_ids = set()
+            # Các lần lưu còn trong nhật ký (chưa kịp ghi vào Backup) cũng tính là đã cập nhật
+            pending_ids = write_queue.journal.pending_backup_ids()
+            updated_ids |= pending_ids
 
             total_users = len(df_main)
             updated_count = df_main['ID'].isin(updated_ids).sum()
@@ -820,6 +961,35 @@ elif app_mode == "📊 Admin Dashboard":
             st.progress(updated_count / total_users if total_users > 0 else 0)
             st.divider()
 
+            # --- TIẾN ĐỘ THEO TỔ CHỨC ĐẢNG & TỐC ĐỘ CẬP NHẬT ---
+            # Tính 1 lần cho mỗi phiên bản dữ liệu, các lần rerun sau lấy từ cache
+            backup_key = (backup_tail.generation, backup_tail.row_count) if backup_tail is not None else None
+            pending_key = tuple(sorted(pending_ids))
+            if backup_tail is not None:
+                st.subheader("🏢 Tiến độ theo Tổ chức Đảng")
+                progress_df = compute_org_progress(df_main, backup_tail, pending_ids,
+                                                   snapshot.version, backup_key, pending_key)
+                st.dataframe(
+                    progress_df,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        'Tỉ lệ (%)': st.column_config.ProgressColumn(
+                            'Tỉ lệ (%)', min_value=0, max_value=100, format="%.1f%%"),
+                        'Lần lưu gần nhất': st.column_config.DatetimeColumn(
+                            'Lần lưu gần nhất', format="DD/MM/YYYY HH:mm"),
+                    },
+                )
+
+                st.subheader("⏱️ Tốc độ cập nhật")
+                freq_label = st.radio("Số lần lưu theo:", ["Ngày", "Giờ"], horizontal=True, key="velocity_freq")
+                histogram = compute_save_histogram(backup_tail, backup_key, 'D' if freq_label == "Ngày" else 'h')
+                if histogram.empty:
+                    st.info("Chưa có lần lưu nào.")
+                else:
+                    st.bar_chart(histogram)
+                st.divider()
+
             # --- PHẦN 1: DANH SÁCH CHƯA CẬP NHẬT ---
             st.subheader(f"📋 Danh sách {not_updated_count} người CHƯA cập nhật")
             
@@ -834,45 +1004,26 @@ elif app_mode == "📊 Admin Dashboard":
                 hide_index=True
             )
 
-            # --- XỬ LÝ XUẤT FILE EXCEL ĐẦY ĐỦ (CẬP NHẬT: MASK THÁNG SINH & ÍT CỘT) ---
-            # Tạo bộ nhớ đệm cho file Excel
-            buffer_missing = io.BytesIO()
-            
-            # 1. Chọn các cột cần xuất
-            export_cols = ['ID', 'Họ và tên *', 'Sinh ngày * (dd/mm/yyyy)']
-            # Tạo bản sao để không ảnh hưởng dữ liệu gốc
-            export_df = not_updated_df[export_cols].copy()
-
-            # 2. Hàm xử lý che tháng sinh (dd/mm/yyyy -> dd/**/yyyy)
-            def mask_month_date(val):
-                val = str(val).strip()
-                parts = val.split('/')
-                if len(parts) == 3:
-                    # parts[0]=ngày, parts[1]=tháng, parts[2]=năm
-                    return f"{parts[0]}/**/{parts[2]}"
-                return val
-
-            # 3. Áp dụng che tháng cho cột ngày sinh
-            export_df['Sinh ngày * (dd/mm/yyyy)'] = export_df['Sinh ngày * (dd/mm/yyyy)'].apply(mask_month_date)
-
-            # 4. Ghi ra Excel
-            with pd.ExcelWriter(buffer_missing, engine='openpyxl') as writer:
-                export_df.to_excel(writer, index=False, sheet_name='ChuaCapNhat')
-            
-            # Đưa con trỏ về đầu file
-            buffer_missing.seek(0)
-            
-            # Tên file kèm thời gian
+            # --- XUẤT FILE (CHỈ TẠO KHI BẤM TẢI, CACHE THEO PHIÊN BẢN DỮ LIỆU) ---
             vn_filename_time = (datetime.utcnow() + timedelta(hours=7)).strftime('%Y%m%d_%H%M')
-            file_name_missing = f"DS_ChuaCapNhat_RUTGON_{vn_filename_time}.xlsx"
+            export_formats = available_formats()
+
+            def missing_export_df(frame=not_updated_df):
+                # Chỉ các cột cần thiết, che tháng sinh (dd/mm/yyyy -> dd/**/yyyy)
+                export_df = frame[['ID', 'Họ và tên *', 'Sinh ngày * (dd/mm/yyyy)']].copy()
+                export_df['Sinh ngày * (dd/mm/yyyy)'] = export_df['Sinh ngày * (dd/mm/yyyy)'].map(mask_month_date)
+                return export_df
 
             col_dl1, col_dl2 = st.columns([1, 2])
             with col_dl1:
+                fmt_missing = st.selectbox("Định dạng:", export_formats, key="fmt_missing",
+                                           format_func=lambda f: EXPORT_FORMATS[f][0])
                 st.download_button(
-                    label="📥 Tải danh sách rút gọn (.xlsx)",
-                    data=buffer_missing,
-                    file_name=file_name_missing,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    label="📥 Tải danh sách rút gọn",
+                    data=lazy_export(('missing', fmt_missing, snapshot.version, backup_key, pending_key),
+                                     lambda: export_bytes(missing_export_df(), fmt_missing, 'ChuaCapNhat')),
+                    file_name=f"DS_ChuaCapNhat_RUTGON_{vn_filename_time}.{fmt_missing}",
+                    mime=EXPORT_FORMATS[fmt_missing][1],
                     type="primary"
                 )
 
@@ -880,23 +1031,233 @@ elif app_mode == "📊 Admin Dashboard":
 
             # --- PHẦN 2: TẢI FILE TỔNG HỢP ---
             st.subheader("🗄️ Xuất dữ liệu tổng hợp đầy đủ")
-            st.write("Tải về file Excel chứa toàn bộ dữ liệu mới nhất từ hệ thống.")
-
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                df_main.to_excel(writer, index=False, sheet_name='DanhSachTongHop')
-            buffer.seek(0)
-
-            vn_filename_time = (datetime.utcnow() + timedelta(hours=7)).strftime('%Y%m%d_%H%M')
-            file_name_excel = f"TongHop_DangVien_{vn_filename_time}.xlsx"
+            st.write("Tải về file chứa toàn bộ dữ liệu mới nhất từ hệ thống (CSV / Parquet tạo nhanh hơn Excel nhiều với danh sách lớn).")
 
+            fmt_full = st.selectbox("Định dạng:", export_formats, key="fmt_full",
+                                    format_func=lambda f: EXPORT_FORMATS[f][0])
             st.download_button(
-                label="📥 Tải trọn bộ dữ liệu (Excel .xlsx)",
-                data=buffer,
-                file_name=file_name_excel,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                label="📥 Tải trọn bộ dữ liệu",
+                data=lazy_export(('full', fmt_full, snapshot.version),
+                                 lambda: export_bytes(df_main, fmt_full, 'DanhSachTongHop')),
+                file_name=f"TongHop_DangVien_{vn_filename_time}.{fmt_full}",
+                mime=EXPORT_FORMATS[fmt_full][1]
             )
-            
+
+            # --- PHẦN 3: KIỂM TRA CHẤT LƯỢNG DỮ LIỆU ---
+            st.divider()
+            st.subheader("🩺 Kiểm tra chất lượng dữ liệu")
+            issues, validation_seconds = compute_validation(snapshot, snapshot.version)
+            st.caption(f"Đã kiểm tra {len(df_main)} người trong {validation_seconds * 1000:.0f} ms "
+                       "(CCCD / số thẻ Đảng 12 số, ngày tháng, Tỉnh - Xã/Phường, trùng số). "
+                       "Chỉ kiểm tra lại khi dữ liệu thay đổi.")
+            if issues.empty:
+                st.success("✅ Không phát hiện lỗi dữ liệu.")
+            else:
+                col_v1, col_v2 = st.columns(2)
+                col_v1.metric("Số lỗi", len(issues))
+                col_v2.metric("Số người có lỗi", issues['ID'].nunique())
+                issue_summary = summarize_issues(issues)
+                st.dataframe(issue_summary, use_container_width=True, hide_index=True)
+
+                issue_types = st.multiselect("Lọc theo loại lỗi:", issue_summary['Lỗi'].tolist(),
+                                             key="validation_filter")
+                shown_issues = issues[issues['Lỗi'].isin(issue_types)] if issue_types else issues
+                st.dataframe(shown_issues, use_container_width=True, hide_index=True)
+
+                fmt_issues = st.selectbox("Định dạng:", export_formats, key="fmt_issues",
+                                          format_func=lambda f: EXPORT_FORMATS[f][0])
+                st.download_button(
+                    label="📥 Tải báo cáo lỗi dữ liệu",
+                    data=lazy_export(('validation', fmt_issues, snapshot.version),
+                                     lambda: export_bytes(issues, fmt_issues, 'LoiDuLieu')),
+                    file_name=f"BaoCao_LoiDuLieu_{vn_filename_time}.{fmt_issues}",
+                    mime=EXPORT_FORMATS[fmt_issues][1]
+                )
+
+            # --- PHẦN 4: NHẬP FILE SỬA HÀNG LOẠT ---
+            st.divider()
+            st.subheader("📤 Nhập file sửa dữ liệu hàng loạt")
+            st.caption("File Excel / CSV có cột 'ID' và các cột cần sửa (tên cột giống file tổng hợp). "
+                       "Chỉ các ô khác với dữ liệu hiện tại mới được ghi.")
+            upload_file = st.file_uploader("Chọn file (.xlsx / .csv):", type=['xlsx', 'csv'], key="bulk_import_file")
+            clear_blank = st.checkbox("Ô trống trong file sẽ xóa giá trị hiện tại", key="bulk_import_clear_blank")
+            if upload_file is not None:
+                try:
+                    plan = plan_import(df_main, read_import_file(upload_file.getvalue(), upload_file.name),
+                                       clear_blank=clear_blank)
+                except Exception as e:
+                    st.error(f"❌ Không đọc được file: {str(e)}")
+                    plan = None
+                if plan is not None:
+                    col_i1, col_i2, col_i3 = st.columns(3)
+                    col_i1.metric("Dòng trong file", plan.n_rows)
+                    col_i2.metric("Số người thay đổi", len(plan.changes))
+                    col_i3.metric("Số ô thay đổi", plan.cell_count)
+                    if plan.unknown_ids:
+                        st.warning(f"⚠️ {len(plan.unknown_ids)} ID không có trong dữ liệu (bỏ qua): "
+                                   + ", ".join(plan.unknown_ids[:20]) + (" ..." if len(plan.unknown_ids) > 20 else ""))
+                    if plan.duplicate_ids:
+                        st.warning(f"⚠️ {len(plan.duplicate_ids)} ID xuất hiện nhiều lần, lấy dòng cuối cùng: "
+                                   + ", ".join(plan.duplicate_ids[:20]))
+                    if plan.ignored_columns:
+                        st.info("Các cột không được nhập (không có trong dữ liệu hoặc không được sửa): "
+                                + ", ".join(plan.ignored_columns))
+                    if plan.changes:
+                        st.dataframe(plan.preview, use_container_width=True, hide_index=True)
+                        read_only = get_data_store().is_read_only()
+                        if read_only:
+                            st.warning("⏳ Đang đồng bộ dữ liệu với Google Sheet, vui lòng thử lại sau ít giây.")
+                        if st.button(f"✅ Áp dụng {plan.cell_count} thay đổi cho {len(plan.changes)} người",
+                                     type="primary", disabled=read_only):
+                            try:
+                                saved = save_bulk_changes(plan.changes)
+                                st.success(f"✅ Đã lưu thay đổi của {saved} người. "
+                                           "Google Sheet sẽ được cập nhật trong ít giây.")
+                            except Exception as e:
+                                st.error(f"❌ Lỗi lưu dữ liệu: {str(e)}")
+                    else:
+                        st.success("✅ File không có thay đổi nào so với dữ liệu hiện tại.")
+
+            # --- PHẦN 5: GỬI GHI CHÚ HÀNG LOẠT ---
+            st.divider()
+            st.subheader("📢 Gửi Ghi chú cho nhiều Đảng viên")
+            st.caption("Ghi chú hiện ở đầu Bước 3 khi Đảng viên mở thông tin của mình. "
+                       "Để trống nội dung để xóa ghi chú của những người đã lọc.")
+            note_filter = st.selectbox("Gửi cho:", ["Người chưa cập nhật", "Theo Tổ chức Đảng",
+                                                    "Người có lỗi dữ liệu", "Tất cả"], key="note_filter")
+            if note_filter == "Người chưa cập nhật":
+                note_targets = df_main.loc[~df_main['ID'].isin(updated_ids), 'ID']
+            elif note_filter == "Theo Tổ chức Đảng":
+                note_orgs = st.multiselect("Tổ chức Đảng:", sorted(df_main[COL_ORG].astype(str).unique()),
+                                           key="note_orgs")
+                note_targets = df_main.loc[df_main[COL_ORG].astype(str).isin(note_orgs), 'ID']
+            elif note_filter == "Người có lỗi dữ liệu":
+                note_error_types = st.multiselect("Chỉ các loại lỗi (để trống = mọi lỗi):",
+                                                  sorted(issues['Lỗi'].unique()), key="note_error_types")
+                chosen_issues = issues[issues['Lỗi'].isin(note_error_types)] if note_error_types else issues
+                note_targets = chosen_issues['ID'].drop_duplicates()
+            else:
+                note_targets = df_main['ID']
+            note_text = st.text_area("Nội dung ghi chú:", key="note_text", max_chars=500)
+            note_changes = plan_note_broadcast(df_main, note_targets.astype(str).tolist(), note_text)
+            st.write(f"Khớp bộ lọc: **{len(note_targets)}** người — cần ghi: **{len(note_changes)}** người "
+                     "(bỏ qua người đã có đúng ghi chú này).")
+            if note_changes:
+                with st.expander("Xem danh sách sẽ nhận ghi chú"):
+                    st.dataframe(df_main.loc[df_main['ID'].astype(str).isin(note_changes),
+                                             ['ID', 'Họ và tên *', COL_ORG, COL_NOTE]],
+                                 use_container_width=True, hide_index=True)
+            read_only = get_data_store().is_read_only()
+            action = "Xóa ghi chú" if not note_text.strip() else "Gửi ghi chú"
+            if st.button(f"📢 {action} cho {len(note_changes)} người", disabled=not note_changes or read_only):
+                try:
+                    saved = save_bulk_changes(note_changes, with_backup=False)
+                    st.success(f"✅ Đã lưu ghi chú cho {saved} người. Google Sheet sẽ được cập nhật trong ít giây.")
+                except Exception as e:
+                    st.error(f"❌ Lỗi lưu dữ liệu: {str(e)}")
+
+            # --- PHẦN 6: ĐIỀN CỘT TEMP ĐỊA CHỈ TỪ DỮ LIỆU CŨ ---
+            st.divider()
+            st.subheader("🧭 Điền sẵn Xã/Phường từ địa chỉ cũ")
+            st.caption("Tách địa chỉ Thường trú / Khai sinh nhập tự do thành Xã/Phường (theo danh mục của tỉnh) "
+                       "và phần chi tiết, ghi vào các cột Temp_* còn trống để form Bước 3 chọn sẵn. "
+                       "Không sửa cột địa chỉ chính, không ghi Backup.")
+            # Phải duyệt cả danh sách: chỉ tính khi Admin mở công cụ
+            if st.toggle("🧭 Mở công cụ điền địa chỉ", key="backfill_open"):
+                with st.spinner("Đang phân tích địa chỉ..."):
+                    backfill_changes, backfill_unmatched = compute_address_backfill(snapshot, snapshot.version)
+                col_b1, col_b2, col_b3 = st.columns(3)
+                col_b1.metric("Số người sẽ được điền", len(backfill_changes))
+                col_b2.metric("Số ô sẽ ghi", sum(len(v) for v in backfill_changes.values()))
+                col_b3.metric("Không khớp", len(backfill_unmatched))
+                if backfill_changes:
+                    with st.expander("Xem trước kết quả tách địa chỉ"):
+                        st.dataframe(pd.DataFrame([{'ID': rid, **values} for rid, values in backfill_changes.items()]),
+                                     use_container_width=True, hide_index=True)
+                if not backfill_unmatched.empty:
+                    st.write("Các dòng không tìm được Xã/Phường (cần sửa tay hoặc để Đảng viên tự chọn):")
+                    st.dataframe(backfill_unmatched, use_container_width=True, hide_index=True)
+                    fmt_unmatched = st.selectbox("Định dạng:", export_formats, key="fmt_unmatched",
+                                                 format_func=lambda f: EXPORT_FORMATS[f][0])
+                    st.download_button(
+                        label="📥 Tải danh sách không khớp",
+                        data=lazy_export(('backfill_unmatched', fmt_unmatched, snapshot.version),
+                                         lambda: export_bytes(backfill_unmatched, fmt_unmatched, 'KhongKhop')),
+                        file_name=f"DiaChi_KhongKhop_{vn_filename_time}.{fmt_unmatched}",
+                        mime=EXPORT_FORMATS[fmt_unmatched][1]
+                    )
+                read_only = get_data_store().is_read_only()
+                if st.button(f"🧭 Điền {len(backfill_changes)} người", disabled=not backfill_changes or read_only):
+                    try:
+                        saved = save_bulk_changes(backfill_changes, with_backup=False)
+                        st.success(f"✅ Đã điền địa chỉ cho {saved} người. Google Sheet sẽ được cập nhật theo lô trong ít giây.")
+                    except Exception as e:
+                        st.error(f"❌ Lỗi lưu dữ liệu: {str(e)}")
+
+            # --- PHẦN 7: NHẬT KÝ BACKUP (LỊCH SỬ & THU GỌN) ---
+            if backup_rows:
+                st.divider()
+                st.subheader("🗂️ Nhật ký Backup")
+                st.caption(f"Hiện có {len(backup_rows) - 1} dòng / {backup_cell_count(backup_rows)} ô "
+                           "(giới hạn của Google Sheet: 10 triệu ô cho cả file).")
+
+                with st.expander("🔎 Xem lịch sử cập nhật theo ID"):
+                    history_id = st.text_input("ID Đảng viên:", key="backup_history_id")
+                    if history_id:
+                        items = backup_history(backup_rows, history_id)
+                        if not items:
+                            st.info("ID này chưa có lần lưu nào trong Backup.")
+                        else:
+                            st.dataframe(pd.DataFrame([{
+                                'Thời gian': item['time'],
+                                'Loại': item['kind'],
+                                'Số lần lưu': item['saves'],
+                                'Trường thay đổi': "; ".join(f"{k}: {v}" for k, v in item['changes'].items()) or "(không đổi)",
+                            } for item in items]), use_container_width=True, hide_index=True)
+                            st.write("Trạng thái sau lần lưu gần nhất:")
+                            st.json(items[-1]['state'])
+
+                # Xem trước / bản lưu trữ phải duyệt toàn bộ lịch sử: chỉ tính khi Admin mở công cụ
+                if st.toggle("🗜️ Công cụ thu gọn Backup"):
+                    st.write("Gộp các lần lưu cũ thành 1 dòng trạng thái cuối cùng cho mỗi Đảng viên. "
+                             "Các lần lưu gần đây vẫn giữ chi tiết từng lần.")
+                    keep_days = st.number_input("Giữ chi tiết các lần lưu trong số ngày gần nhất:",
+                                                min_value=0, value=7, step=1)
+                    vn_now = datetime.utcnow() + timedelta(hours=7)
+                    cutoff = (vn_now - timedelta(days=int(keep_days))).strftime("%Y-%m-%d %H:%M:%S")
+                    preview, n_folded = compact_backup_values(backup_rows, cutoff)
+                    st.write(f"Sẽ gộp **{n_folded}** dòng → còn **{len(preview) - 1}** dòng "
+                             f"({backup_cell_count(preview)} ô).")
+
+                    archive = io.StringIO()
+                    csv.writer(archive).writerows(backup_rows)
+                    st.download_button(
+                        label="📥 Tải bản lưu trữ Backup hiện tại (.csv) trước khi thu gọn",
+                        data=archive.getvalue().encode('utf-8-sig'),
+                        file_name=f"Backup_LuuTru_{vn_now.strftime('%Y%m%d_%H%M')}.csv",
+                        mime="text/csv",
+                    )
+                    if st.button("🗜️ Thu gọn ngay", disabled=n_folded == 0):
+                        with st.spinner("Đang thu gọn Backup..."):
+                            try:
+                                before, after = compact_backup_log(cutoff)
+                                st.success(f"✅ Đã thu gọn Backup: {before} → {after} dòng "
+                                           f"(bản gốc được lưu trong {DATA_CACHE_DIR}).")
+                            except Exception as e:
+                                st.error(f"❌ Thu gọn thất bại (dữ liệu cũ vẫn giữ nguyên): {str(e)}")
+
+            # --- PHẦN 8: THỜI GIAN XỬ LÝ FORM BƯỚC 3 ---
+            render_stats = get_render_stats().summary()
+            if render_stats:
+                st.divider()
+                st.subheader("⚡ Thời gian xử lý mỗi lần tương tác ở Bước 3")
+                st.caption("Đổi Quốc gia / Tỉnh / Xã chỉ chạy lại khối địa chỉ đó; "
+                           "các khối chỉ được tính khi tự chạy lại riêng (không kèm cả trang).")
+                st.dataframe(pd.DataFrame(render_stats).rename(columns={
+                    'name': 'Phần chạy lại', 'count': 'Số lần', 'mean_ms': 'Trung bình (ms)',
+                    'p50_ms': 'Trung vị (ms)', 'p95_ms': 'p95 (ms)',
+                }), use_container_width=True, hide_index=True)
+
     elif password:
         st.error("Sai mật khẩu!")
     else:
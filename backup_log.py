@@ -0,0 +1,244 @@
+"""Định dạng nhật ký Backup gọn (chỉ lưu các trường thay đổi) và công cụ thu gọn / đọc lịch sử.
+
+Các kiểu dòng trên sheet Backup (dòng 1 là tiêu đề):
+- Dòng cũ (đầy đủ):  [thời gian, STT, ID, ...toàn bộ ALL_COLUMNS]
+- Dòng delta:        [thời gian, 'delta', ID, JSON {cột: giá trị mới}]
+- Dòng checkpoint:   [thời gian, 'checkpoint', ID, JSON {"state": {...}, "saves": n, "first": thời gian}]
+  (do thu gọn tạo ra: gộp mọi dòng cũ hơn mốc thu gọn của 1 ID thành trạng thái cuối cùng)
+
+Cột C luôn là ID nên việc đếm "đã cập nhật" đọc được cả 3 kiểu dòng.
+Thời gian ghi dạng "YYYY-mm-dd HH:MM:SS" (có dấu ' để giữ dạng Text). Dòng cũ có thể đã bị
+Google Sheet đổi thành ngày và hiển thị lại theo dạng dd/mm/yyyy, nên trước khi so sánh
+thời gian luôn đưa về dạng chuẩn bằng normalize_times.
+"""
+import json
+import threading
+import time
+
+from analytics import parse_backup_times
+from columns import ALL_COLUMNS
+
+KIND_FULL = 'full'
+KIND_DELTA = 'delta'
+KIND_CHECKPOINT = 'checkpoint'
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class BackupEntry:
+    def __init__(self, timestamp, record_id, kind, fields, saves=1, first=None):
+        self.timestamp = timestamp
+        self.record_id = record_id
+        self.kind = kind
+        self.fields = fields  # delta: các cột thay đổi; full / checkpoint: toàn bộ trạng thái đã biết
+        self.saves = saves    # Số lần lưu mà dòng này đại diện
+        self.first = first or timestamp
+
+
+def clean_id(value):
+    text = str(value).strip()
+    return text[:-2] if text.endswith('.0') else text
+
+
+def normalize_times(values):
+    """Chuỗi thời gian trong Backup -> dạng "YYYY-mm-dd HH:MM:SS" (so sánh chuỗi đúng thứ tự
+    thời gian), kể cả khi sheet đã hiển thị lại theo dạng dd/mm/yyyy. Không đọc được -> None."""
+    if not values:
+        return []
+    formatted = parse_backup_times([str(v) for v in values]).dt.strftime(TIME_FORMAT)
+    return [text if isinstance(text, str) else None for text in formatted]
+
+
+def make_delta_row(timestamp, record_id, changes):
+    """Dòng Backup gọn cho 1 lần lưu (ghi kiểu USER_ENTERED nên thời gian và ID có dấu ' để
+    giữ dạng Text). changes rỗng = lưu xác nhận, không sửa gì."""
+    return ["'" + str(timestamp), KIND_DELTA, "'" + str(record_id), json.dumps(changes, ensure_ascii=False)]
+
+
+def make_checkpoint_row(entry):
+    """Dòng checkpoint (ghi lại cả sheet kiểu RAW nên không cần dấu ')."""
+    payload = {'state': entry.fields, 'saves': entry.saves, 'first': entry.first}
+    return [entry.timestamp, KIND_CHECKPOINT, str(entry.record_id), json.dumps(payload, ensure_ascii=False)]
+
+
+def parse_row(row):
+    """1 dòng Backup (list chuỗi) -> BackupEntry. Dòng hỏng / trống -> None."""
+    if len(row) < 3 or not str(row[2]).strip():
+        return None
+    timestamp, kind, record_id = str(row[0]), str(row[1]).strip(), clean_id(row[2])
+    try:
+        if kind == KIND_DELTA:
+            return BackupEntry(timestamp, record_id, KIND_DELTA, json.loads(row[3] or '{}'))
+        if kind == KIND_CHECKPOINT:
+            payload = json.loads(row[3])
+            return BackupEntry(timestamp, record_id, KIND_CHECKPOINT, payload.get('state', {}),
+                               saves=payload.get('saves', 1), first=payload.get('first'))
+    except (IndexError, ValueError):
+        return None
+    fields = {col: (row[i + 1] if i + 1 < len(row) else '') for i, col in enumerate(ALL_COLUMNS)}
+    return BackupEntry(timestamp, record_id, KIND_FULL, fields)
+
+
+def parse_rows(values):
+    """Toàn bộ giá trị sheet Backup (kể cả tiêu đề) -> list BackupEntry theo thứ tự ghi."""
+    entries = (parse_row(row) for row in values[1:])
+    return [e for e in entries if e is not None]
+
+
+def history(values, record_id):
+    """Lịch sử lưu của 1 ID: list dict {time, kind, changes, state} theo thứ tự thời gian.
+    state là trạng thái cộng dồn của các trường đã biết sau lần lưu đó."""
+    record_id = clean_id(record_id)
+    state = {}
+    result = []
+    for entry in parse_rows(values):
+        if entry.record_id != record_id:
+            continue
+        if entry.kind == KIND_DELTA:
+            changes = entry.fields
+            state = {**state, **changes}
+        else:
+            changes = {col: val for col, val in entry.fields.items() if state.get(col) != val}
+            state = dict(entry.fields)
+        result.append({'time': entry.timestamp, 'kind': entry.kind, 'saves': entry.saves,
+                       'changes': changes, 'state': state})
+    return result
+
+
+def compact(values, cutoff=None):
+    """Gộp các dòng có thời gian <= cutoff ("YYYY-mm-dd HH:MM:SS", None = tất cả) thành
+    1 checkpoint mỗi ID; giữ nguyên các dòng mới hơn. Trả về (giá trị mới kể cả tiêu đề,
+    số dòng đã gộp). Checkpoint ghi thời gian ở dạng chuẩn."""
+    header = values[0] if values else []
+    parsed = [(row, parse_row(row)) for row in values[1:]]
+    entries = [entry for _, entry in parsed if entry is not None]
+    times = normalize_times([e.timestamp for e in entries] + [e.first for e in entries])
+    for entry, timestamp, first in zip(entries, times, times[len(entries):]):
+        entry.timestamp = timestamp
+        entry.first = first or timestamp
+    folded = {}
+    kept = []
+    n_folded = 0
+    for row, entry in parsed:
+        if entry is None or entry.timestamp is None:
+            if any(str(cell).strip() for cell in row):
+                kept.append(row)  # Dòng không đọc được: giữ nguyên, không làm mất dữ liệu
+            continue
+        if cutoff is not None and entry.timestamp > cutoff:
+            kept.append(row)
+            continue
+        n_folded += 1
+        current = folded.get(entry.record_id)
+        if current is None:
+            current = BackupEntry(entry.timestamp, entry.record_id, KIND_CHECKPOINT, {}, saves=0, first=entry.first)
+            folded[entry.record_id] = current
+        if entry.kind == KIND_DELTA:
+            current.fields.update(entry.fields)
+        else:
+            current.fields = dict(entry.fields)
+        current.saves += entry.saves
+        current.timestamp = max(current.timestamp, entry.timestamp)
+        current.first = min(current.first, entry.first)
+    checkpoints = sorted(folded.values(), key=lambda e: e.timestamp)
+    return [header] + [make_checkpoint_row(e) for e in checkpoints] + kept, n_folded
+
+
+def cell_count(values):
+    return sum(len(row) for row in values)
+
+
+class BackupTail:
+    """Đọc dần sheet Backup: giữ các dòng đã đọc + tập ID đã cập nhật, mỗi lần làm mới
+    chỉ tải các dòng sau vị trí đã đọc (đọc theo vùng giới hạn, không tải lại cả sheet).
+
+    read_range(dòng đầu, dòng cuối): list các dòng trong vùng (dòng 1 là tiêu đề).
+    min_interval: trong số giây này sau lần làm mới trước thì không gọi API nữa.
+    resync_every: đọc lại từ đầu sau số giây này (phòng khi sheet bị sửa / xóa dòng bằng tay).
+    """
+
+    def __init__(self, read_range, chunk_size=5000, min_interval=10, resync_every=1800, clock=time.time):
+        self._read_range = read_range
+        self.chunk_size = chunk_size
+        self.min_interval = min_interval
+        self.resync_every = resync_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.generation = 0  # Tăng mỗi lần đọc lại từ đầu (để phân biệt với cache cũ)
+        self._clear()
+
+    def _clear(self):
+        self.generation += 1
+        self._values = []
+        self._updated_ids = set()
+        self._last_saved = {}   # ID -> thời điểm lưu gần nhất (dạng chuẩn, xem normalize_times)
+        self._save_times = []   # Thời điểm từng dòng (để vẽ tốc độ cập nhật)
+        self._save_weights = []  # Số lần lưu mỗi dòng đại diện (checkpoint > 1)
+        self._synced_at = None
+        self._refreshed_at = None
+
+    def reset(self):
+        """Bỏ toàn bộ dữ liệu đã đọc (vd sau khi thu gọn Backup); lần làm mới sau đọc lại từ đầu."""
+        with self._lock:
+            self._clear()
+
+    def refresh(self, force=False):
+        """Tải các dòng mới. Trả về số dòng vừa đọc thêm."""
+        with self._lock:
+            now = self._clock()
+            if self._synced_at is not None and now - self._synced_at > self.resync_every:
+                self._clear()
+            if not force and self._refreshed_at is not None and now - self._refreshed_at < self.min_interval:
+                return 0
+            added = 0
+            while True:
+                start = len(self._values) + 1
+                rows = self._read_range(start, start + self.chunk_size - 1)
+                times = normalize_times([row[0] if row else '' for row in rows])
+                for row, timestamp in zip(rows, times):
+                    if self._values and len(row) > 2 and str(row[2]).strip():
+                        self._track(row, timestamp or str(row[0]))
+                    self._values.append(list(row))
+                added += len(rows)
+                if len(rows) < self.chunk_size:
+                    break
+            if self._synced_at is None:
+                self._synced_at = now
+            self._refreshed_at = now
+            return added
+
+    def _track(self, row, timestamp):
+        record_id = clean_id(row[2])
+        self._updated_ids.add(record_id)
+        if timestamp >= self._last_saved.get(record_id, ''):
+            self._last_saved[record_id] = timestamp
+        saves = 1
+        if str(row[1]).strip() == KIND_CHECKPOINT:
+            entry = parse_row(row)
+            saves = entry.saves if entry else 1
+        self._save_times.append(timestamp)
+        self._save_weights.append(saves)
+
+    @property
+    def values(self):
+        """Các dòng đã đọc (kể cả tiêu đề) - chỉ đọc, không sửa."""
+        return self._values
+
+    @property
+    def updated_ids(self):
+        with self._lock:
+            return set(self._updated_ids)
+
+    @property
+    def last_saved(self):
+        with self._lock:
+            return dict(self._last_saved)
+
+    @property
+    def save_events(self):
+        """(list thời điểm, list số lần lưu tương ứng)"""
+        with self._lock:
+            return list(self._save_times), list(self._save_weights)
+
+    @property
+    def row_count(self):
+        return max(len(self._values) - 1, 0)
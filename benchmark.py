@@ -0,0 +1,361 @@
+"""Đo tải: giả lập N Đảng viên dùng app cùng lúc trên Google Sheet giả (trong bộ nhớ).
+
+Chạy đúng app.py (không sửa) bằng streamlit.testing AppTest, với storage_backend = "memory"
+(secrets của từng phiên đặt qua AppTest.secrets; app.py tự lấy backend giả qua get_storage):
+    1. search: mở app, tra cứu theo Số định danh (tìm qua index CCCD của snapshot dùng chung)
+    2. save:   chọn người, sửa 1 trường, bấm Lưu (save_update_optimized), chờ luồng nền đẩy xong
+    3. admin:  một số người dùng mở Admin Dashboard
+
+Kết quả (JSON) gồm: thông lượng, độ trễ p50/p95/p99 từng thao tác, số lời gọi API
+trên mỗi thao tác, số ô được ghi, số lần bị 429, tỉ lệ dùng lại dữ liệu đã tải (cache hit).
+
+Ví dụ:
+    python benchmark.py --users 20 --members 3000 --latency 0.3 --read-quota 60 --out before.json
+    python benchmark.py --users 20 --members 3000 --latency 0.3 --read-quota 60 --out after.json
+
+Đo riêng bước chuẩn hóa dữ liệu khi tải (cách cũ lặp từng dòng so với cách vector hóa):
+    python benchmark.py --normalize --members 20000
+
+AppTest không chạy song song được trong 1 tiến trình, nên các phiên được chạy xen kẽ
+nhau từ 1 luồng (mỗi pha: lần lượt từng người); các luồng nền của app (tải lại dữ liệu,
+đẩy nhật ký ghi) vẫn chạy song song như trên server thật. st.cache_data gắn với Runtime
+giả mà AppTest tạo mới mỗi lần chạy, nên không được dùng chung giữa các lần chạy.
+
+Các cache của Streamlit (st.cache_resource) sống theo tiến trình, nên mỗi cấu hình
+chạy 1 tiến trình riêng (vd để tìm ngưỡng bắt đầu 429: chạy lần lượt --users 5, 10, 20...).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from columns import ALL_COLUMNS, COL_ID
+from data_store import COLS_NEED_ZERO, normalize_records, parse_date_columns
+from quota import QuotaScheduler
+from storage import build_memory_workbook, is_rate_limited, register_memory_backend
+from write_queue import SaveJournal
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "app.py")
+BACKEND_KEY = "benchmark"
+ADMIN_PASSWORD = "benchmark"
+
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương']
+DEM = ['Văn', 'Thị', 'Hữu', 'Đức', 'Minh', 'Thu', 'Ngọc', 'Quang', 'Thanh', 'Hoài', 'Gia', 'Bảo']
+TEN = ['An', 'Bình', 'Chi', 'Dũng', 'Giang', 'Hà', 'Hải', 'Hạnh', 'Hùng', 'Hương', 'Khánh', 'Lan', 'Linh',
+       'Long', 'Mai', 'Nam', 'Ngân', 'Phương', 'Quân', 'Sơn', 'Tâm', 'Thảo', 'Trang', 'Tuấn', 'Vy', 'Yến']
+CHI_BO = [f"Chi bộ sinh viên {i}" for i in range(1, 13)]
+
+
+def make_roster(n, seed=0):
+    """Danh sách n Đảng viên giả (dict theo ALL_COLUMNS), địa chỉ lấy từ vietnam_data.json."""
+    rng = random.Random(seed)
+    with open(os.path.join(APP_DIR, 'vietnam_data.json'), encoding='utf-8') as f:
+        locations = json.load(f)
+    provinces = list(locations)
+    cccds = rng.sample(range(10 ** 10, 10 ** 11), n)
+    records = []
+    for i in range(n):
+        ks_tinh, qq_tinh, tt_tinh = (rng.choice(provinces) for _ in range(3))
+        ks_xa, qq_xa, tt_xa = (rng.choice(locations[p]) for p in (ks_tinh, qq_tinh, tt_tinh))
+        thon = f"Số {rng.randint(1, 200)} ngõ {rng.randint(1, 50)}"
+        record = {c: '' for c in ALL_COLUMNS}
+        record.update({
+            'STT': i + 1,
+            'ID': str(100000 + i),
+            'Họ và tên *': f"{rng.choice(HO)} {rng.choice(DEM)} {rng.choice(TEN)}",
+            'Giới tính *': rng.choice(['Nam', 'Nữ']),
+            'Sinh ngày * (dd/mm/yyyy)': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1998, 2006)}",
+            'Dân tộc *': 'Kinh',
+            'Tôn giáo *': 'Không',
+            'Số định danh cá nhân *': f"0{cccds[i]}",
+            'Tổ chức Đảng đang sinh hoạt * (không sửa)': rng.choice(CHI_BO),
+            'Nơi đăng ký khai sinh - Quốc gia *': 'Việt Nam',
+            'Nơi đăng ký khai sinh - Tỉnh *': ks_tinh,
+            'Nơi đăng ký khai sinh - Địa chỉ chi tiết *': ks_xa,
+            'Quê quán (theo mô hình 2 cấp) - Quốc gia *': 'Việt Nam',
+            'Quê quán (theo mô hình 2 cấp) - Tỉnh *': qq_tinh,
+            'Quê quán (theo mô hình 2 cấp) - Địa chỉ chi tiết *': qq_xa,
+            'Thường trú (theo mô hình 2 cấp) - Quốc gia *': 'Việt Nam',
+            'Thường trú (theo mô hình 2 cấp) - Tỉnh *': tt_tinh,
+            'Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *': f"{thon}, {tt_xa}",
+            'Ngày vào Đảng* (dd/mm/yyyy)': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2020, 2025)}",
+            'Trạng thái hoạt động': 'Đang sinh hoạt Đảng',
+            'Temp_XaPhuong_KhaiSinh': ks_xa,
+            'Temp_XaPhuong_ThuongTru': tt_xa,
+            'Temp_ThonTo_ThuongTru': thon,
+        })
+        records.append(record)
+    return records
+
+
+class Recorder:
+    """Ghi độ trễ từng thao tác (thread-safe)."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def timed(self, op, fn):
+        started = time.perf_counter()
+        try:
+            ok = fn()
+        except Exception as e:
+            ok = False
+            print(f"[{op}] {type(e).__name__}: {e}", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if ok:
+                self.latencies[op].append(elapsed)
+            else:
+                self.errors[op] += 1
+        return ok
+
+    def summary(self):
+        result = {}
+        for op in sorted(set(self.latencies) | set(self.errors)):
+            values = np.array(self.latencies.get(op, []))
+            row = {'count': int(len(values)), 'errors': int(self.errors.get(op, 0))}
+            if len(values):
+                row.update({
+                    'mean_ms': round(float(values.mean()) * 1000, 1),
+                    'p50_ms': round(float(np.percentile(values, 50)) * 1000, 1),
+                    'p95_ms': round(float(np.percentile(values, 95)) * 1000, 1),
+                    'p99_ms': round(float(np.percentile(values, 99)) * 1000, 1),
+                })
+            result[op] = row
+        return result
+
+
+def _by_label(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"Không thấy widget '{label}'")
+
+
+class SimulatedMember:
+    """1 người dùng: 1 phiên Streamlit (AppTest) đi qua các bước của app."""
+
+    def __init__(self, member, timeout, cache_dir):
+        from streamlit.testing.v1 import AppTest
+        self.member = member
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.at.secrets['admin_password'] = ADMIN_PASSWORD
+        self.at.secrets['storage_backend'] = 'memory'
+        self.at.secrets['memory_backend_key'] = BACKEND_KEY
+        self.at.secrets['data_cache_dir'] = cache_dir
+
+    def _step(self):
+        return self.at.session_state['step'] if 'step' in self.at.session_state else None
+
+    def open_and_search(self):
+        self.at.run()
+        _by_label(self.at.text_input, "Nhập Số định danh cá nhân (12 số):").input(self.member['Số định danh cá nhân *'])
+        _by_label(self.at.button, "Tra cứu ngay").click()
+        self.at.run()
+        return self._step() == 2
+
+    def open_form(self):
+        pick = next(b for b in self.at.button if str(b.key).startswith('btn_'))
+        pick.click()
+        self.at.run()
+        return self._step() == 3
+
+    def save(self):
+        self.at.text_input(key='Tên gọi khác').input(f"Bench {time.time():.6f}")
+        _by_label(self.at.button, "💾 LƯU THÔNG TIN").click()
+        self.at.run()
+        return self._step() == 4
+
+    def open_admin(self):
+        _by_label(self.at.sidebar.radio, "Chọn chức năng:").set_value("📊 Admin Dashboard")
+        self.at.run()
+        _by_label(self.at.sidebar.text_input, "Nhập mật khẩu Admin:").input(ADMIN_PASSWORD)
+        self.at.run()
+        return not self.at.exception and len(self.at.metric) >= 3
+
+
+def run_benchmark(users=10, members=2000, admins=1, latency=0.2, latency_jitter=0.1,
+                  read_quota=None, write_quota=None, error_rate=0.0, timeout=120, seed=0):
+    roster = make_roster(members, seed)
+    workbook = build_memory_workbook(roster, latency=latency, latency_jitter=latency_jitter,
+                                     read_per_minute=read_quota, write_per_minute=write_quota,
+                                     error_rate=error_rate)
+    scheduler = QuotaScheduler(read_per_minute=read_quota or 60, write_per_minute=write_quota or 60,
+                               is_rate_limited=is_rate_limited)
+    register_memory_backend(BACKEND_KEY, workbook, scheduler)
+
+    cache_dir = tempfile.mkdtemp(prefix="benchmark_cache_")
+    os.chdir(APP_DIR)  # app.py mở vietnam_data.json theo đường dẫn tương đối
+    journal = SaveJournal(os.path.join(cache_dir, "save_journal.sqlite3"))
+
+    rng = random.Random(seed + 1)
+    picks = rng.sample(roster, users)
+    recorder = Recorder()
+    phases = {}
+    marks = {}
+
+    def mark(name):
+        marks[name] = (time.perf_counter(), Counter(workbook.calls), workbook.rate_limited,
+                       workbook.cells_written)
+
+    def wait_for_flush(deadline=300):
+        started = time.perf_counter()
+        while journal.stats()['pending'] and time.perf_counter() - started < deadline:
+            time.sleep(0.2)
+        return time.perf_counter() - started
+
+    def close_phase(name, start_mark, ops):
+        started, calls_before, limited_before, cells_before = marks[start_mark]
+        calls = Counter(workbook.calls)
+        calls.subtract(calls_before)
+        calls = {k: v for k, v in calls.items() if v}
+        api_calls = sum(v for k, v in calls.items() if k != 'get_lastUpdateTime')
+        wall = time.perf_counter() - started
+        phases[name] = {
+            'wall_seconds': round(wall, 2),
+            'operations': ops,
+            'throughput_ops_per_s': round(ops / wall, 2) if wall else None,
+            'api_calls': calls,
+            'api_calls_per_op': round(api_calls / ops, 3) if ops else None,
+            'rate_limited_429': workbook.rate_limited - limited_before,
+            'cells_written': workbook.cells_written - cells_before,
+        }
+
+    # Các pha chạy nối tiếp: mọi người dùng xong pha trước rồi mới sang pha sau
+    sessions = [SimulatedMember(member, timeout, cache_dir) for member in picks]
+
+    mark('search')
+    found = [recorder.timed('search', session.open_and_search) for session in sessions]
+    close_phase('search', 'search', len(recorder.latencies['search']))
+
+    mark('save')
+    for session, ok in zip(sessions, found):
+        if ok and recorder.timed('open_form', session.open_form):
+            recorder.timed('save', session.save)
+    flush_seconds = wait_for_flush()
+    close_phase('save', 'save', len(recorder.latencies['save']))
+    phases['save']['flush_wait_seconds'] = round(flush_seconds, 2)
+
+    mark('admin')
+    for session in sessions[:admins]:
+        recorder.timed('admin_dashboard', session.open_admin)
+    close_phase('admin', 'admin', len(recorder.latencies['admin_dashboard']))
+
+    total_calls = Counter(workbook.calls)
+    data_ops = sum(len(v) for v in recorder.latencies.values()) + users  # + lần mở app
+    full_loads = total_calls['get_all_records']
+    checks = total_calls['get_lastUpdateTime']
+    return {
+        'config': {
+            'users': users, 'members': members, 'admins': admins, 'latency': latency,
+            'latency_jitter': latency_jitter, 'read_quota': read_quota, 'write_quota': write_quota,
+            'error_rate': error_rate, 'seed': seed,
+        },
+        'operations': recorder.summary(),
+        'phases': phases,
+        'cache': {
+            'data_accesses': data_ops,
+            'full_sheet_loads': full_loads,
+            'snapshot_hit_rate': round(1 - full_loads / data_ops, 4) if data_ops else None,
+            'change_checks': checks,
+            'change_check_skip_rate': round(1 - max(full_loads - 1, 0) / checks, 4) if checks else None,
+        },
+        'api_calls_total': dict(total_calls),
+        'rate_limited_429': workbook.rate_limited,
+        'scheduler': {k: round(v, 3) if isinstance(v, float) else v for k, v in scheduler.stats.items()},
+        'journal_left': journal.stats(),
+    }
+
+
+def legacy_normalize_records(records):
+    """Bước chuẩn hóa trước đây (apply zfill từng dòng, mọi cột là chuỗi) - làm mốc so sánh."""
+    df = pd.DataFrame(records)
+    for col in COLS_NEED_ZERO:
+        if col in df.columns:
+            df[col] = df[col].astype(str).replace(r'\.0$', '', regex=True).replace(['nan', 'None', ''], '')
+            df[col] = df[col].apply(lambda x: x.zfill(12) if x.strip() != '' and x.isdigit() else x)
+    df[COL_ID] = df[COL_ID].astype(str).replace(r'\.0$', '', regex=True)
+    return df
+
+
+def run_normalize_benchmark(members=2000, seed=0, repeat=5):
+    """Thời gian (trung vị) và bộ nhớ DataFrame của bước chuẩn hóa, cách cũ và cách mới."""
+    roster = make_roster(members, seed)
+
+    def measure(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+        df = result[0] if isinstance(result, tuple) else result
+        return result, {
+            'seconds': round(float(np.median(timings)), 4),
+            'memory_mb': round(df.memory_usage(deep=True).sum() / 2 ** 20, 2),
+        }
+
+    _, frame = measure(lambda: pd.DataFrame(roster))  # Phần chung của 2 cách: dựng DataFrame từ records
+    legacy_df, legacy = measure(lambda: legacy_normalize_records(roster))
+    new_df, vectorized = measure(lambda: normalize_records(roster))
+    # Parse ngày không nằm trong bước tải: DataSnapshot.dates parse lần đầu trang kiểm tra dữ liệu cần đến
+    dates, parsed = measure(lambda: parse_date_columns(new_df))
+    vectorized['dates_seconds'] = parsed['seconds']
+    vectorized['dates_memory_mb'] = parsed['memory_mb']
+    # Cùng kết quả dạng chuỗi (category chỉ khác kiểu lưu)
+    same = legacy_df.astype(str).equals(new_df.astype(str))
+    return {
+        'members': members, 'repeat': repeat, 'frame_seconds': frame['seconds'],
+        'legacy': legacy, 'vectorized': vectorized,
+        'speedup': round(legacy['seconds'] / max(vectorized['seconds'], 1e-9), 2),
+        # Chỉ phần chuẩn hóa (trừ thời gian dựng DataFrame chung của 2 cách)
+        'stage_speedup': round((legacy['seconds'] - frame['seconds'])
+                               / max(vectorized['seconds'] - frame['seconds'], 1e-9), 2),
+        'memory_ratio': round(vectorized['memory_mb'] / max(legacy['memory_mb'], 1e-9), 3),
+        'same_values': bool(same),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=10, help="Số người dùng đồng thời")
+    parser.add_argument('--members', type=int, default=2000, help="Số dòng Sheet1 giả")
+    parser.add_argument('--admins', type=int, default=1, help="Số người mở Admin Dashboard")
+    parser.add_argument('--latency', type=float, default=0.2, help="Độ trễ mỗi lời gọi API (giây)")
+    parser.add_argument('--latency-jitter', type=float, default=0.1)
+    parser.add_argument('--read-quota', type=int, default=None, help="Quota đọc/phút (mặc định không giới hạn)")
+    parser.add_argument('--write-quota', type=int, default=None, help="Quota ghi/phút")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Xác suất lỗi 429 ngẫu nhiên")
+    parser.add_argument('--timeout', type=float, default=120, help="Timeout mỗi lần chạy script (giây)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--normalize', action='store_true',
+                        help="Chỉ đo bước chuẩn hóa dữ liệu khi tải (không chạy app)")
+    parser.add_argument('--out', help="Ghi kết quả JSON ra file (mặc định in ra màn hình)")
+    args = parser.parse_args(argv)
+
+    if args.normalize:
+        result = run_normalize_benchmark(members=args.members, seed=args.seed)
+    else:
+        result = run_benchmark(users=args.users, members=args.members, admins=min(args.admins, args.users),
+                               latency=args.latency, latency_jitter=args.latency_jitter,
+                               read_quota=args.read_quota, write_quota=args.write_quota,
+                               error_rate=args.error_rate, timeout=args.timeout, seed=args.seed)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Sửa dữ liệu hàng loạt từ trang Admin.
+
+- Nhập file (Excel / CSV có cột ID + một số cột bất kỳ của ALL_COLUMNS).
+- Gửi cùng 1 "Ghi chú" của Chi ủy cho nhiều Đảng viên đã lọc.
+
+So sánh với dữ liệu đang có bằng pandas (theo từng cột, không lặp từng ô),
+chỉ giữ các ô thực sự thay đổi. Việc ghi do app.py thực hiện qua nhật ký lưu
+(Sheet1 ghi theo lô bằng batch_update). Sửa từ file có 1 dòng Backup delta mỗi người;
+Ghi chú không ghi Backup (Backup dùng để tính ai đã tự cập nhật).
+"""
+import io
+import re
+
+import pandas as pd
+
+from columns import ALL_COLUMNS, COL_ID, COL_NAME, COL_NOTE, DATE_COLS
+from data_store import normalize_column
+
+# Cột khóa: không sửa qua file
+PROTECTED_COLS = ['STT', COL_ID]
+
+PREVIEW_COLUMNS = ['ID', 'Họ và tên', 'Cột', 'Giá trị cũ', 'Giá trị mới']
+
+# Ô ngày / ô số trong Excel được đọc thành "yyyy-mm-dd 00:00:00" / "123.0"
+_EXCEL_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?: 00:00:00)?$')
+_EXCEL_NUMBER = re.compile(r'^(\d+)\.0$')
+
+
+class ImportPlan:
+    def __init__(self, changes, preview, columns, unknown_ids, duplicate_ids, ignored_columns, n_rows):
+        self.changes = changes                  # dict ID -> {cột: giá trị mới}
+        self.preview = preview                  # DataFrame theo PREVIEW_COLUMNS (mỗi dòng 1 ô đổi)
+        self.columns = columns                  # Các cột được so sánh
+        self.unknown_ids = unknown_ids          # ID trong file không có trong dữ liệu
+        self.duplicate_ids = duplicate_ids      # ID xuất hiện nhiều lần (lấy dòng cuối)
+        self.ignored_columns = ignored_columns  # Cột trong file không thuộc ALL_COLUMNS / cột khóa
+        self.n_rows = n_rows
+
+    @property
+    def cell_count(self):
+        return len(self.preview)
+
+
+def read_import_file(data, filename):
+    """bytes của file .xlsx / .csv -> DataFrame toàn chuỗi (giữ số 0 ở đầu, ô trống = '')."""
+    ext = filename.rsplit('.', 1)[-1].lower()
+    if ext in ('xlsx', 'xlsm'):
+        df = pd.read_excel(io.BytesIO(data), dtype=str)
+    elif ext == 'csv':
+        df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    else:
+        raise ValueError(f"Chỉ hỗ trợ file .xlsx hoặc .csv (nhận được: {filename})")
+    df.columns = [str(col).strip() for col in df.columns]
+    df = df.fillna('').astype(str)
+    for col in df.columns:
+        # Đưa về dạng như trên sheet: "123.0" -> "123", ngày -> dd/mm/yyyy
+        text = df[col].str.strip().str.replace(_EXCEL_NUMBER, r'\1', regex=True)
+        if col in DATE_COLS:
+            text = text.str.replace(_EXCEL_DATE, lambda m: f"{m[3]}/{m[2]}/{m[1]}", regex=True)
+        df[col] = text
+    return df
+
+
+def _normalize(series, col):
+    """Chuỗi đã strip (trống / nan -> '') rồi chuẩn hóa như dữ liệu trên sheet (data_store.normalize_column)."""
+    return normalize_column(series.astype(str).str.strip().replace({'nan': '', 'None': ''}), col)
+
+
+def plan_import(df_main, upload, clear_blank=False):
+    """So sánh file nhập với dữ liệu đang có.
+    clear_blank: True = ô trống trong file sẽ xóa giá trị hiện tại; False = bỏ qua ô trống."""
+    if COL_ID not in upload.columns:
+        raise ValueError("File phải có cột 'ID'.")
+    columns = [col for col in upload.columns if col in ALL_COLUMNS and col not in PROTECTED_COLS]
+    ignored = [col for col in upload.columns if col not in columns and col != COL_ID]
+    if not columns:
+        raise ValueError("File không có cột nào trùng tên với dữ liệu (ngoài ID).")
+
+    upload = upload.assign(**{COL_ID: _normalize(upload[COL_ID], COL_ID)})
+    upload = upload[upload[COL_ID] != '']
+    duplicate_ids = sorted(set(upload.loc[upload[COL_ID].duplicated(), COL_ID]))
+    upload = upload.drop_duplicates(COL_ID, keep='last').set_index(COL_ID)
+
+    main_ids = df_main[COL_ID].astype(str)
+    main = df_main.loc[~main_ids.duplicated(keep=False).to_numpy()]  # ID trùng trên sheet: không sửa qua file
+    main = main.set_index(main[COL_ID].astype(str))
+    known = upload.index.isin(main.index)
+    unknown_ids = upload.index[~known].tolist()
+    upload = upload[known]
+    main = main.loc[upload.index]
+
+    frames = []
+    for col in columns:
+        new = _normalize(upload[col], col)
+        old = _normalize(main[col], col)
+        changed = new != old
+        if not clear_blank:
+            changed &= new != ''
+        if changed.any():
+            frames.append(pd.DataFrame({
+                'ID': upload.index[changed.to_numpy()],
+                'Họ và tên': main.loc[changed, COL_NAME].astype(str).to_numpy(),
+                'Cột': col,
+                'Giá trị cũ': old[changed].to_numpy(),
+                'Giá trị mới': new[changed].to_numpy(),
+            }))
+    preview = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PREVIEW_COLUMNS)
+
+    changes = {}
+    for record_id, col, value in zip(preview['ID'], preview['Cột'], preview['Giá trị mới']):
+        changes.setdefault(record_id, {})[col] = value
+    # Xem trước theo thứ tự người rồi thứ tự cột trên sheet
+    if not preview.empty:
+        order = {col: i for i, col in enumerate(ALL_COLUMNS)}
+        preview = preview.assign(_pos=preview['Cột'].map(order)).sort_values(['ID', '_pos'], kind='stable')
+        preview = preview.drop(columns='_pos').reset_index(drop=True)
+    return ImportPlan(changes, preview, columns, unknown_ids, duplicate_ids, ignored, len(upload) + len(unknown_ids))
+
+
+def plan_note_broadcast(df_main, ids, note):
+    """Ghi chú gửi cho các ID đã lọc: dict ID -> {COL_NOTE: note}, bỏ qua người đã có đúng ghi chú này
+    và ID trùng trên sheet (không xác định được dòng)."""
+    note = str(note).strip()
+    main_ids = df_main[COL_ID].astype(str)
+    unique = ~main_ids.duplicated(keep=False)
+    current = _normalize(df_main[COL_NOTE], COL_NOTE) if COL_NOTE in df_main.columns else ''
+    target = unique & main_ids.isin(pd.Index(ids, dtype=object).astype(str)) & (current != note)
+    return {record_id: {COL_NOTE: note} for record_id in main_ids[target]}
@@ -0,0 +1,82 @@
+"""Định nghĩa cột của Sheet1 - dùng chung cho app.py và các module xử lý dữ liệu."""
+
+# Danh sách cột CHÍNH XÁC (33 cột)
+ALL_COLUMNS = [
+    'STT', 
+    'ID', 
+    'Họ và tên *', 
+    'Tên gọi khác', 
+    'Giới tính *', 
+    'Sinh ngày * (dd/mm/yyyy)',
+    'Dân tộc *', 
+    'Tôn giáo *', 
+    'Số định danh cá nhân *', 
+    'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)',
+    'Nơi cấp thẻ Đảng', 
+    'Ngày cấp thẻ Đảng (dd/mm/yyyy)', 
+    'Số thẻ theo Đảng quyết định 85',
+    'Tổ chức Đảng đang sinh hoạt * (không sửa)', 
+    'Nơi đăng ký khai sinh - Quốc gia *',
+    'Nơi đăng ký khai sinh - Tỉnh *', 
+    'Nơi đăng ký khai sinh - Địa chỉ chi tiết *',
+    'Quê quán (theo mô hình 2 cấp) - Quốc gia *', 
+    'Quê quán (theo mô hình 2 cấp) - Tỉnh *',
+    'Quê quán (theo mô hình 2 cấp) - Địa chỉ chi tiết *', 
+    'Thường trú (theo mô hình 2 cấp) - Quốc gia *',
+    'Thường trú (theo mô hình 2 cấp) - Tỉnh *', 
+    'Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *',
+    'Ngày vào Đảng* (dd/mm/yyyy)', 
+    'Ngày vào Đảng chính thức* (dd/mm/yyyy)', 
+    'Số CMND cũ (nếu có)',
+    'Trạng thái hoạt động', 
+    'Ngày rời khỏi/ Ngày mất/ Ngày miễn sinh hoạt Đảng (dd/mm/yyyy)',
+    
+    # --- CỘT NÀY QUAN TRỌNG: Cần giữ lại để giữ chỗ, dù không dùng ---
+    'Đề nghị xóa (do đang viên không thuộc chi bộ)/ (Nếu muốn xóa chọn "có", còn không bỏ qua)',
+    
+    # --- 4 CỘT PHỤ MỚI THÊM ---
+    'Temp_XaPhuong_KhaiSinh', 
+    'Temp_ThonTo_KhaiSinh', 
+    'Temp_XaPhuong_ThuongTru', 
+    'Temp_ThonTo_ThuongTru',
+    'Ghi chú'
+]
+
+# Danh sách cột phụ
+TEMP_COLS = ['Temp_XaPhuong_KhaiSinh', 'Temp_ThonTo_KhaiSinh', 'Temp_XaPhuong_ThuongTru', 'Temp_ThonTo_ThuongTru', 'Ghi chú', 'Đề nghị xóa (do đang viên không thuộc chi bộ)/ (Nếu muốn xóa chọn "có", còn không bỏ qua)']
+
+# Cột này chỉ đọc, không cho sửa
+READ_ONLY_COLS = [
+    'STT', 'ID', 'Họ và tên *', 'Sinh ngày * (dd/mm/yyyy)', 
+    'Tổ chức Đảng đang sinh hoạt * (không sửa)'
+]
+
+# Cột cần ép kiểu Text khi ghi lên Google Sheet (thêm dấu ' để giữ số 0 ở đầu / định dạng ngày)
+COLS_FORCE_TEXT = [
+    'ID', 'Số định danh cá nhân *', 'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)',
+    'Số thẻ theo Đảng quyết định 85', 'Số CMND cũ (nếu có)', 'Sinh ngày * (dd/mm/yyyy)',
+    'Ngày cấp thẻ Đảng (dd/mm/yyyy)', 'Ngày vào Đảng* (dd/mm/yyyy)', 
+    'Ngày vào Đảng chính thức* (dd/mm/yyyy)',
+    'Ngày rời khỏi/ Ngày mất/ Ngày miễn sinh hoạt Đảng (dd/mm/yyyy)'
+]
+
+# Các cột hay dùng trong code xử lý dữ liệu
+COL_ID = 'ID'
+COL_NAME = 'Họ và tên *'
+COL_DOB = 'Sinh ngày * (dd/mm/yyyy)'
+COL_CCCD = 'Số định danh cá nhân *'
+COL_PARTY_CARD = 'Số thẻ Đảng* (12 số theo HD38-HD/BTCTW)'
+COL_ORG = 'Tổ chức Đảng đang sinh hoạt * (không sửa)'
+COL_NOTE = 'Ghi chú'
+
+# Cột ngày (dd/mm/yyyy): giữ nguyên chuỗi gốc trong DataFrame, bản đã parse nằm ở snapshot.dates
+DATE_COLS = [col for col in ALL_COLUMNS if '(dd/mm/yyyy)' in col]
+
+# Cột ít giá trị khác nhau -> lưu dạng category (tiết kiệm bộ nhớ, so sánh / groupby nhanh)
+CATEGORY_COLS = [
+    'Giới tính *', 'Dân tộc *', 'Tôn giáo *', COL_ORG,
+    'Nơi đăng ký khai sinh - Quốc gia *', 'Nơi đăng ký khai sinh - Tỉnh *',
+    'Quê quán (theo mô hình 2 cấp) - Quốc gia *', 'Quê quán (theo mô hình 2 cấp) - Tỉnh *',
+    'Thường trú (theo mô hình 2 cấp) - Quốc gia *', 'Thường trú (theo mô hình 2 cấp) - Tỉnh *',
+    'Trạng thái hoạt động',
+]
@@ -0,0 +1,563 @@
+"""Kho dữ liệu Sheet1 dùng chung cho mọi phiên (session) trong cùng tiến trình.
+
+- Tải toàn bộ Sheet1 1 lần, chuẩn hóa và dựng index tra cứu.
+- Sau mỗi lần lưu: vá (patch) đúng dòng vừa lưu vào bản sao mới của DataFrame
+  + index, tăng số phiên bản (version). Các phiên khác thấy ngay dữ liệu mới mà
+  không phải tải lại cả sheet.
+- Chỉ tải lại toàn bộ khi hết TTL hoặc Admin bấm làm mới.
+
+app.py giữ 1 instance qua st.cache_resource.
+"""
+import os
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+from columns import CATEGORY_COLS, COL_CCCD, COL_DOB, COL_ID, COL_NAME, COL_PARTY_CARD, DATE_COLS
+from search_index import NameSearchIndex
+
+# Các cột số cần giữ số 0 ở đầu (đệm đủ 12 chữ số)
+COLS_NEED_ZERO = [COL_CCCD, COL_PARTY_CARD]
+TWELVE_DIGITS = 12
+
+# Tăng số này khi đổi cách chuẩn hóa dữ liệu -> file snapshot cũ trên đĩa bị bỏ qua
+SNAPSHOT_SCHEMA_VERSION = 3
+
+DATE_FORMAT = '%d/%m/%Y'
+
+# Vá hàng loạt đổi tên / ngày sinh của hơn ngần này người thì dựng lại index tên
+NAME_INDEX_REBUILD_AT = 30
+
+
+def restore_leading_zero(text):
+    """Số 11 chữ số -> thêm lại 1 số 0 đầu (ô lưu dạng số trên sheet làm mất số 0 của CCCD / thẻ Đảng).
+    Chỉ đệm đúng 1 số 0: số ngắn hơn giữ nguyên để kiểm tra dữ liệu báo sai độ dài."""
+    return '0' + text if len(text) == TWELVE_DIGITS - 1 and text.isdigit() else text
+
+
+def restore_leading_zeros(series):
+    """Như restore_leading_zero cho cả cột (Series chuỗi)."""
+    return series.mask(series.str.fullmatch(r'\d{%d}' % (TWELVE_DIGITS - 1)), '0' + series)
+
+
+def normalize_cccd(value):
+    """Chuẩn hóa số định danh để so khớp: bỏ khoảng trắng, bỏ '.0', đệm đủ 12 số
+    (chỉ dùng làm khóa tìm kiếm, không sửa giá trị trong dữ liệu)"""
+    text = str(value).strip().replace(' ', '')
+    if text.endswith('.0'):
+        text = text[:-2]
+    if text.lower() in ('nan', 'none'):
+        return ''
+    return text.zfill(12) if text.isdigit() else text
+
+
+def build_key_index(series, normalizer=None):
+    """Tạo dict: giá trị khóa (đã chuẩn hóa) -> danh sách nhãn dòng trong DataFrame"""
+    index = {}
+    for label, value in series.items():
+        key = normalizer(value) if normalizer else str(value).strip()
+        if key:
+            index.setdefault(key, []).append(label)
+    return index
+
+
+def build_sheet_row_map(df):
+    """ID -> số dòng A1 trên Sheet1. ID bị trùng thì không đưa vào map (phải dùng find)."""
+    row_map = {}
+    duplicated = set()
+    for position, record_id in enumerate(df[COL_ID]):
+        key = str(record_id).strip()
+        if not key:
+            continue
+        if key in row_map:
+            duplicated.add(key)
+        row_map[key] = position + 2
+    for key in duplicated:
+        del row_map[key]
+    return row_map
+
+
+def normalize_column(series, col):
+    """Quy tắc của normalize_row_values cho cả 1 cột (Series, vector hóa): ID / CCCD / số thẻ Đảng
+    bỏ '.0'; CCCD / số thẻ Đảng thêm lại số 0 đầu bị mất (ô trống / nan -> ''). Cột khác chỉ đổi sang chuỗi."""
+    text = series.astype(str)
+    if col != COL_ID and col not in COLS_NEED_ZERO:
+        return text
+    text = text.str.replace(r'\.0$', '', regex=True)
+    if col == COL_ID:
+        return text
+    return restore_leading_zeros(text.mask(text.isin(['nan', 'None']), ''))
+
+
+def normalize_sheet_records(records):
+    """Chuyển kết quả get_all_records thành DataFrame đã chuẩn hóa (vector hóa, không lặp từng dòng):
+    - CCCD / số thẻ Đảng: bỏ '.0', thêm lại số 0 đầu cho số 11 chữ số (restore_leading_zeros).
+    - Cột ít giá trị khác nhau (giới tính, tỉnh, tổ chức...): kiểu category.
+    Trả về (df, repairs): repairs là dict ID -> [cột] mà ô trên sheet khác giá trị đã chuẩn hóa
+    (vd CCCD đang lưu dạng số nên mất số 0 đầu) - lần lưu sau phải ghi lại ô đó dạng Text.
+    """
+    df = pd.DataFrame(records)
+    ids = normalize_column(df[COL_ID], COL_ID)
+    repairs = {}
+
+    for col in COLS_NEED_ZERO + [COL_ID]:
+        if col not in df.columns:
+            continue
+        raw = df[col].astype(str)
+        normalized = ids if col == COL_ID else normalize_column(raw, col)
+        for record_id in ids[(raw != normalized) & (normalized != '')]:
+            repairs.setdefault(record_id, []).append(col)
+        df[col] = normalized
+
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype('category')
+    return df, repairs
+
+
+def normalize_records(records):
+    """Như normalize_sheet_records, chỉ trả về DataFrame."""
+    return normalize_sheet_records(records)[0]
+
+
+def parse_date_columns(df):
+    """Parse các cột ngày dd/mm/yyyy 1 lần (sai định dạng / trống -> NaT). Chuỗi gốc vẫn giữ trong df."""
+    parsed = {}
+    for col in DATE_COLS:
+        if col in df.columns:
+            # Ngày lặp lại nhiều (vd cùng năm sinh): chỉ parse mỗi giá trị khác nhau 1 lần
+            codes, uniques = pd.factorize(df[col].astype(str).str.strip())
+            dates = pd.to_datetime(pd.Index(uniques, dtype=object), format=DATE_FORMAT, errors='coerce')
+            parsed[col] = dates.take(codes).values
+    return pd.DataFrame(parsed, index=df.index)
+
+
+def normalize_row_values(values):
+    """Áp dụng cùng quy tắc của normalize_records cho 1 dòng (dict cột -> giá trị)."""
+    values = {col: ('' if val is None else str(val)) for col, val in values.items()}
+    for col in COLS_NEED_ZERO + [COL_ID]:
+        if col in values:
+            text = values[col]
+            if text.endswith('.0'):
+                text = text[:-2]
+            if col != COL_ID:
+                text = restore_leading_zero(text)
+            values[col] = text
+    return values
+
+
+def diff_row_values(row, values, repairs=()):
+    """Các cột trong `values` khác với dòng hiện tại `row` (so sánh sau khi chuẩn hóa).
+    repairs: các cột mà ô trên sheet đang sai dạng (DataSnapshot.text_repairs) - luôn ghi lại.
+    Trả về dict cột -> giá trị mới (giữ nguyên giá trị người dùng nhập)."""
+    new = normalize_row_values(values)
+    old = normalize_row_values({col: row.get(col, '') for col in values})
+    return {col: values[col] for col in values if new[col] != old[col] or col in repairs}
+
+
+def build_indexes(df):
+    """Dựng các index tra cứu cho 1 DataFrame:
+    - 'cccd': CCCD -> nhãn dòng, 'id': ID -> nhãn dòng (khớp chính xác, O(1))
+    - 'name': Họ tên + Ngày sinh (không dấu, gần đúng)
+    - 'sheet_row': ID -> số dòng trên Sheet (dòng 1 là tiêu đề nên dòng thứ i của df là dòng i + 2)
+    """
+    return {
+        'cccd': build_key_index(df[COL_CCCD], normalize_cccd),
+        'id': build_key_index(df[COL_ID]),
+        'name': NameSearchIndex(df[COL_NAME], df[COL_DOB]),
+        'sheet_row': build_sheet_row_map(df),
+    }
+
+
+def save_snapshot_file(path, df, change_token, saved_at, text_repairs=None):
+    """Ghi DataFrame đã chuẩn hóa xuống đĩa (ghi file tạm rồi đổi tên - không bao giờ để file dở dang)."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pd.to_pickle({
+        'schema': SNAPSHOT_SCHEMA_VERSION,
+        'columns': list(df.columns),
+        'change_token': change_token,
+        'saved_at': saved_at,
+        'df': df,
+        'text_repairs': text_repairs or {},
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot_file(path):
+    """Đọc snapshot trên đĩa. Trả về (df, change_token, saved_at, text_repairs) hoặc None nếu
+    không có file / khác phiên bản schema / file hỏng."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        payload = pd.read_pickle(path)
+    except Exception:
+        return None
+    if not isinstance(payload, dict) or payload.get('schema') != SNAPSHOT_SCHEMA_VERSION:
+        return None
+    df = payload['df']
+    if list(df.columns) != payload['columns']:
+        return None
+    return df, payload['change_token'], payload['saved_at'], payload.get('text_repairs', {})
+
+
+class DataSnapshot:
+    """1 phiên bản dữ liệu, CHỈ ĐỌC. Lưu mới luôn tạo snapshot mới (copy-on-write)
+    nên các phiên đang giữ snapshot cũ không bị đổi dữ liệu giữa chừng."""
+
+    def __init__(self, version, df, indexes, loaded_at, change_token=None, verified_at=None, source='sheet',
+                 dates=None, text_repairs=None):
+        self.version = version
+        self.source = source  # 'sheet': tải từ Google Sheet, 'disk': khôi phục từ file snapshot
+        self.df = df
+        self.indexes = indexes
+        self._dates = dates  # Các cột ngày đã parse - None: parse lần đầu cần đến (xem dates)
+        self.text_repairs = text_repairs or {}  # ID -> [cột] đang lưu sai dạng trên sheet (xem normalize_sheet_records)
+        self.loaded_at = loaded_at  # Thời điểm tải toàn bộ gần nhất (không tính các lần vá)
+        self.change_token = change_token  # Dấu hiệu thay đổi của file lúc tải (vd modifiedTime)
+        # Lần gần nhất xác nhận sheet không đổi (kiểm tra nhẹ, không tải lại) - không phải dữ liệu
+        self.verified_at = loaded_at if verified_at is None else verified_at
+
+    @property
+    def dates(self):
+        """Các cột ngày đã parse (parse_date_columns). Chỉ trang kiểm tra dữ liệu cần đến nên không parse
+        lúc tải; 2 phiên cùng gọi lần đầu thì parse 2 lần, cùng kết quả."""
+        if self._dates is None:
+            self._dates = parse_date_columns(self.df)
+        return self._dates
+
+    def find_rows(self, key_name, value):
+        """Tra cứu chính xác qua index. key_name: 'cccd' hoặc 'id'."""
+        key = normalize_cccd(value) if key_name == 'cccd' else str(value).strip()
+        return self.df.loc[self.indexes[key_name].get(key, [])]
+
+    def rows_for_ids(self, ids):
+        """Các dòng theo danh sách ID (giữ thứ tự; ID không còn trong dữ liệu thì bỏ qua).
+        Phiên người dùng chỉ giữ ID, mỗi lần hiển thị đọc lại từ snapshot hiện tại."""
+        id_index = self.indexes['id']
+        labels = [id_index[key][0] for key in (str(i).strip() for i in ids) if key in id_index]
+        return self.df.loc[labels]
+
+    def age(self):
+        """Số giây kể từ lần đồng bộ gần nhất với Google Sheet (tải toàn bộ hoặc kiểm tra nhẹ)."""
+        return time.time() - self.verified_at
+
+
+class SharedDataStore:
+    """Giữ snapshot hiện tại, tải lại khi hết TTL và vá dòng sau mỗi lần lưu.
+
+    loader: hàm không tham số trả về list records (get_all_records của Sheet1).
+    overlay: (tùy chọn) hàm trả về [(ID, dict cột -> giá trị)] đã lưu nhưng chưa ghi
+        lên sheet; được phủ lên mỗi lần tải lại để không "mất" các lần lưu đang chờ.
+    background_refresh: True = stale-while-revalidate: hết TTL vẫn trả snapshot cũ
+        ngay lập tức và tải lại ở luồng nền; chỉ lần tải đầu tiên phải chờ.
+    change_token: (tùy chọn) hàm rẻ trả về dấu hiệu thay đổi của file (vd modifiedTime
+        trên Drive). Hết TTL mà dấu hiệu không đổi thì không tải lại cả sheet.
+    max_age: dù dấu hiệu không đổi, vẫn tải lại toàn bộ sau số giây này (phòng hờ).
+    snapshot_path: (tùy chọn) file lưu dữ liệu đã chuẩn hóa sau mỗi lần tải toàn bộ.
+        Khởi động lại sẽ đọc file này ngay (vài ms) rồi đối chiếu với sheet ở nền;
+        Google lỗi thì vẫn tra cứu được (chỉ đọc) từ dữ liệu trên đĩa.
+    """
+
+    def __init__(self, loader, ttl, overlay=None, background_refresh=False,
+                 change_token=None, max_age=600, snapshot_path=None):
+        self._loader = loader
+        self._ttl = ttl
+        self._overlay = overlay
+        self._background_refresh = background_refresh
+        self._change_token = change_token
+        self._max_age = max_age
+        self._snapshot_path = snapshot_path
+        self._disk_checked = False
+        self._lock = threading.Lock()       # Bảo vệ _snapshot
+        self._load_lock = threading.Lock()  # Chỉ 1 luồng tải sheet tại 1 thời điểm
+        self._snapshot = None
+        self._live = weakref.WeakSet()  # Các snapshot còn được tham chiếu (để theo dõi bộ nhớ)
+        self._version = 0
+        self._loading = False
+        self._refresh_scheduled = False
+        self._last_attempt_at = 0.0
+        self._patches_during_load = []
+        # Thông tin cho Admin
+        self.last_refresh_duration = None
+        self.last_refresh_error = None
+        self.skipped_reloads = 0  # Số lần hết TTL nhưng sheet không đổi nên không tải lại
+
+    def get(self):
+        """Lấy snapshot hiện tại. Tải lại nếu chưa có hoặc hết TTL.
+        Khi đang có luồng khác tải lại, trả luôn snapshot cũ thay vì chờ."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._restore_from_disk()
+        if snapshot is None:
+            return self.refresh(force=False)
+        if snapshot.age() < self._ttl or self._loading:
+            return snapshot
+        if self._background_refresh:
+            self.refresh_async()
+            return snapshot
+        try:
+            return self.refresh(force=False)
+        except Exception:
+            return snapshot  # Google lỗi: tiếp tục phục vụ dữ liệu cũ
+
+    def is_read_only(self):
+        """True khi chỉ có dữ liệu từ đĩa và chưa đối chiếu được với Google Sheet
+        (không nên cho lưu vì số dòng trên sheet có thể đã khác)."""
+        snapshot = self._snapshot
+        return snapshot is not None and snapshot.source == 'disk'
+
+    def _restore_from_disk(self):
+        """Lần đầu trong tiến trình: khôi phục snapshot từ file (nếu có)."""
+        with self._load_lock:
+            if self._disk_checked or self._snapshot is not None:
+                return self._snapshot
+            self._disk_checked = True
+            restored = load_snapshot_file(self._snapshot_path)
+            if restored is None:
+                return None
+            df, token, saved_at, text_repairs = restored
+            indexes = build_indexes(df)
+            pending = self._overlay() if self._overlay else []
+            with self._lock:
+                self._version += 1
+                # verified_at=0: coi như đã hết hạn để đối chiếu với sheet ngay
+                snapshot = DataSnapshot(self._version, df, indexes, saved_at,
+                                        change_token=token, verified_at=0.0, source='disk',
+                                        text_repairs=text_repairs)
+                for record_id, values in pending:
+                    snapshot = self._patch(snapshot, record_id, values) or snapshot
+                self._publish(snapshot)
+                return snapshot
+
+    def refresh_async(self, force=False):
+        """Tải lại ở luồng nền (nếu chưa có luồng nào đang tải). Sau lần lỗi,
+        chờ ít nhất 1 TTL mới thử lại để không dồn lời gọi khi Google đang lỗi
+        (force=True: Admin yêu cầu, bỏ qua cả TTL lẫn thời gian chờ này)."""
+        with self._lock:
+            if self._loading or self._refresh_scheduled:
+                return False
+            if not force and self.last_refresh_error and time.time() - self._last_attempt_at < self._ttl:
+                return False
+            self._refresh_scheduled = True
+        threading.Thread(target=self._refresh_in_background, args=(force,),
+                         name="data-store-refresh", daemon=True).start()
+        return True
+
+    def is_refreshing(self):
+        return self._loading or self._refresh_scheduled
+
+    def _refresh_in_background(self, force):
+        try:
+            self.refresh(force=force)
+        except Exception:
+            pass  # Lỗi đã được ghi vào last_refresh_error, tiếp tục phục vụ snapshot cũ
+        finally:
+            with self._lock:
+                self._refresh_scheduled = False
+
+    def refresh(self, force=True):
+        """Tải lại toàn bộ Sheet1. force=False: bỏ qua nếu luồng khác vừa tải xong."""
+        with self._load_lock:
+            current = self._snapshot
+            if not force and current is not None and current.age() < self._ttl:
+                return current
+            with self._lock:
+                self._loading = True
+                self._patches_during_load = []
+            started = time.time()
+            self._last_attempt_at = started
+            try:
+                token = self._fetch_change_token()
+                if not force and self._is_unchanged(current, token):
+                    with self._lock:
+                        self._loading = False
+                        self._snapshot.verified_at = time.time()
+                        self._snapshot.source = 'sheet'  # Dữ liệu trên đĩa khớp với sheet
+                        self.skipped_reloads += 1
+                        self.last_refresh_error = None
+                        # Các lần lưu trong lúc kiểm tra đã được vá trực tiếp vào snapshot
+                        self._patches_during_load = []
+                        return self._snapshot
+                # Đọc nhật ký TRƯỚC khi tải: bản ghi được đẩy xong trong lúc tải có thể
+                # chưa có trong dữ liệu vừa tải nhưng đã biến mất khỏi nhật ký đọc sau đó
+                pending_before = self._overlay() if self._overlay else []
+                df, text_repairs = normalize_sheet_records(self._loader())
+                indexes = build_indexes(df)
+                pending = pending_before + (self._overlay() if self._overlay else [])
+            except Exception as e:
+                with self._lock:
+                    self._loading = False
+                    self._patches_during_load = []
+                    self.last_refresh_error = str(e)
+                raise
+            with self._lock:
+                self._loading = False
+                self._version += 1
+                snapshot = DataSnapshot(self._version, df, indexes, time.time(), change_token=token,
+                                        text_repairs=text_repairs)
+                # Các lần lưu chưa ghi lên sheet / xảy ra trong lúc đang tải
+                # có thể chưa có trong dữ liệu vừa tải
+                for record_id, values in pending + self._patches_during_load:
+                    snapshot = self._patch(snapshot, record_id, values) or snapshot
+                self._patches_during_load = []
+                # Thay snapshot nguyên khối (atomic) - người đọc thấy bản cũ hoặc bản mới
+                self._publish(snapshot)
+                self.last_refresh_duration = time.time() - started
+                self.last_refresh_error = None
+            if self._snapshot_path:
+                try:
+                    save_snapshot_file(self._snapshot_path, df, token, snapshot.loaded_at, text_repairs)
+                except OSError:
+                    pass  # Không ghi được đĩa thì chỉ mất khả năng khởi động nhanh
+            return snapshot
+
+    def _fetch_change_token(self):
+        """Lấy dấu hiệu thay đổi; lỗi thì trả None (coi như có thay đổi)."""
+        if self._change_token is None:
+            return None
+        try:
+            return self._change_token()
+        except Exception:
+            return None
+
+    def _is_unchanged(self, current, token):
+        return (current is not None and token is not None
+                and token == current.change_token
+                and time.time() - current.loaded_at < self._max_age)
+
+    def apply_update(self, record_id, values):
+        """Vá 1 dòng (theo ID) vào bản sao mới của DataFrame + index, tăng version.
+        Trả về snapshot mới, hoặc None nếu chưa có dữ liệu / không xác định được dòng
+        (khi đó lần tải lại tiếp theo sẽ đồng bộ)."""
+        record_id = str(record_id).strip()
+        with self._lock:
+            if self._loading:
+                self._patches_during_load.append((record_id, values))
+            if self._snapshot is None:
+                return None
+            snapshot = self._patch(self._snapshot, record_id, values)
+            if snapshot is not None:
+                self._publish(snapshot)
+            return snapshot
+
+    def _publish(self, snapshot):
+        """Đặt snapshot hiện tại (gọi khi đang giữ _lock). Bản cũ không còn ai giữ sẽ được giải phóng."""
+        self._snapshot = snapshot
+        self._live.add(snapshot)
+
+    @property
+    def live_versions(self):
+        """Các phiên bản dữ liệu còn trong bộ nhớ (bản hiện tại + bản cũ còn phiên nào đang giữ)."""
+        return sorted(snapshot.version for snapshot in list(self._live))
+
+    def apply_updates(self, updates):
+        """Vá nhiều dòng cùng lúc [(ID, dict cột -> giá trị)] vào 1 bản sao duy nhất
+        (vd nhập file sửa hàng loạt) - tăng version 1 lần. Trả về (snapshot mới, list ID không vá được)."""
+        updates = [(str(record_id).strip(), values) for record_id, values in updates]
+        with self._lock:
+            if self._loading:
+                self._patches_during_load.extend(updates)
+            if self._snapshot is None:
+                return None, [record_id for record_id, _ in updates]
+            snapshot, skipped = self._patch_many(self._snapshot, updates)
+            if snapshot is not None:
+                self._publish(snapshot)
+            return snapshot, skipped
+
+    def _patch(self, old, record_id, values):
+        """Tạo snapshot mới từ `old` với 1 dòng được cập nhật (gọi khi đang giữ _lock)."""
+        snapshot, _ = self._patch_many(old, [(record_id, values)])
+        return snapshot
+
+    def _patch_many(self, old, updates):
+        """Tạo snapshot mới từ `old` với các dòng được cập nhật (gọi khi đang giữ _lock).
+        Trả về (snapshot mới hoặc None nếu không vá được dòng nào, list ID bỏ qua)."""
+        rows = {}  # nhãn dòng -> giá trị mới (lần sau ghi đè lần trước)
+        skipped = []
+        text_repairs = old.text_repairs
+        for record_id, values in updates:
+            labels = old.indexes['id'].get(record_id, [])
+            if len(labels) != 1:
+                skipped.append(record_id)
+                continue
+            values = normalize_row_values({c: v for c, v in values.items() if c in old.df.columns})
+            rows.setdefault(labels[0], {}).update(values)
+            if record_id in text_repairs:
+                # Ô vừa ghi (kèm dấu ') đã đúng dạng Text trên sheet
+                if text_repairs is old.text_repairs:
+                    text_repairs = dict(text_repairs)
+                left = [col for col in text_repairs[record_id] if col not in values]
+                if left:
+                    text_repairs[record_id] = left
+                else:
+                    del text_repairs[record_id]
+        if not rows:
+            return None, skipped
+
+        by_column = {}
+        for label, values in rows.items():
+            for col, value in values.items():
+                by_column.setdefault(col, ([], []))
+                by_column[col][0].append(label)
+                by_column[col][1].append(value)
+
+        df = old.df.copy()
+        for col, (labels, col_values) in by_column.items():
+            dtype = df[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                # Giá trị mới chưa có trong danh mục (vd tỉnh mới) phải thêm vào trước khi gán
+                new_categories = [v for v in dict.fromkeys(col_values) if v not in dtype.categories]
+                if new_categories:
+                    df[col] = df[col].cat.add_categories(new_categories)
+            elif not pd.api.types.is_string_dtype(dtype) and not pd.api.types.is_object_dtype(dtype):
+                # Cột toàn số (vd STT) được pandas đọc thành int64, không nhận giá trị chuỗi
+                df[col] = df[col].astype(object)
+            df.loc[labels, col] = col_values
+
+        # Snapshot cũ chưa parse ngày thì snapshot mới cũng parse sau, từ df đã vá
+        dates = old._dates
+        changed_dates = [col for col in by_column if dates is not None and col in dates.columns]
+        if changed_dates:
+            dates = dates.copy()
+            for col in changed_dates:
+                labels, col_values = by_column[col]
+                dates.loc[labels, col] = pd.to_datetime(pd.Series(col_values, dtype=object).str.strip(),
+                                                        format=DATE_FORMAT, errors='coerce').to_numpy()
+
+        indexes = dict(old.indexes)
+        cccd_index = None
+        renamed = []
+        old_rows = old.df.loc[list(rows), [COL_CCCD, COL_NAME, COL_DOB]].astype(object).to_dict('index')
+        for label, values in rows.items():
+            old_row = old_rows[label]
+            old_key = normalize_cccd(old_row[COL_CCCD])
+            new_key = normalize_cccd(values.get(COL_CCCD, old_row[COL_CCCD]))
+            if new_key != old_key:
+                if cccd_index is None:
+                    cccd_index = dict(old.indexes['cccd'])
+                if old_key in cccd_index:
+                    cccd_index[old_key] = [l for l in cccd_index[old_key] if l != label]
+                if new_key:
+                    cccd_index[new_key] = cccd_index.get(new_key, []) + [label]
+            new_name = values.get(COL_NAME, old_row[COL_NAME])
+            new_dob = values.get(COL_DOB, old_row[COL_DOB])
+            if new_name != old_row[COL_NAME] or new_dob != old_row[COL_DOB]:
+                renamed.append((label, new_name, new_dob))
+        if cccd_index is not None:
+            indexes['cccd'] = cccd_index
+        if len(renamed) > NAME_INDEX_REBUILD_AT:
+            # Sửa nhiều tên cùng lúc: dựng lại cả index nhanh hơn sao chép từng dòng
+            indexes['name'] = NameSearchIndex(df[COL_NAME], df[COL_DOB])
+        else:
+            for label, new_name, new_dob in renamed:
+                indexes['name'] = indexes['name'].with_row(label, new_name, new_dob)
+
+        self._version += 1
+        return DataSnapshot(self._version, df, indexes, old.loaded_at,
+                            change_token=old.change_token, verified_at=old.verified_at, source=old.source,
+                            dates=dates, text_repairs=text_repairs), skipped
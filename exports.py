@@ -0,0 +1,88 @@
+"""Tạo file xuất (Excel / CSV / Parquet) cho Admin Dashboard.
+
+- Excel dùng openpyxl chế độ write_only: ghi lần lượt từng dòng, không giữ cả bảng ô
+  trong bộ nhớ như pd.ExcelWriter.
+- ExportCache giữ các file đã tạo theo khóa phiên bản dữ liệu, bấm tải lại không phải tạo lại.
+"""
+import importlib.util
+import io
+import threading
+from collections import OrderedDict
+
+from openpyxl import Workbook
+
+# Parquet cần pyarrow (tùy chọn - không có thì chỉ ẩn lựa chọn này)
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+FORMATS = {
+    'xlsx': ('Excel (.xlsx)', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV (.csv)', 'text/csv'),
+    'parquet': ('Parquet (.parquet)', 'application/vnd.apache.parquet'),
+}
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != 'parquet' or PARQUET_AVAILABLE]
+
+
+def mask_month_date(val):
+    """Che tháng sinh: dd/mm/yyyy -> dd/**/yyyy"""
+    val = str(val).strip()
+    parts = val.split('/')
+    if len(parts) == 3:
+        return f"{parts[0]}/**/{parts[2]}"
+    return val
+
+
+def to_xlsx_bytes(df, sheet_name):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append([str(col) for col in df.columns])
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def to_csv_bytes(df):
+    # utf-8-sig: Excel mở đúng tiếng Việt
+    return df.to_csv(index=False).encode('utf-8-sig')
+
+
+def to_parquet_bytes(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def export_bytes(df, fmt, sheet_name='Sheet1'):
+    if fmt == 'xlsx':
+        return to_xlsx_bytes(df, sheet_name)
+    if fmt == 'csv':
+        return to_csv_bytes(df)
+    if fmt == 'parquet':
+        return to_parquet_bytes(df)
+    raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+
+
+class ExportCache:
+    """Cache LRU các file đã tạo (khóa gồm tên, định dạng, phiên bản dữ liệu). Thread-safe."""
+
+    def __init__(self, max_entries=6):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        data = build()
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return data
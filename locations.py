@@ -0,0 +1,133 @@
+"""Index đơn vị hành chính (tỉnh -> xã/phường) dựng 1 lần từ vietnam_data.json.
+
+Mỗi ô chọn Tỉnh / Xã trên form chỉ cần tra dict (O(1)) để tìm giá trị mặc định,
+không chuẩn hóa lại cả danh sách ở mỗi lần chạy lại script.
+So khớp không phân biệt dấu / hoa thường, bỏ tiền tố "Tỉnh", "Thành phố", "TP.",
+và hiểu tên tỉnh cũ trước khi sáp nhập (vd "Hà Giang" -> Tỉnh Tuyên Quang).
+match_commune còn so khớp gần đúng (gõ sai / thiếu chữ) trong danh sách xã của 1 tỉnh.
+"""
+import difflib
+import json
+import re
+
+from search_index import fold_text
+
+_PROVINCE_PREFIX = re.compile(r'^(thanh pho|tinh|tp)\b\.?\s*')
+_COMMUNE_PREFIX = re.compile(r'^(phuong|xa|dac khu|thi tran|thi xa)\b\.?\s*')
+
+# Tỉ lệ giống nhau tối thiểu (difflib) để nhận tên xã gõ gần đúng
+FUZZY_COMMUNE_CUTOFF = 0.85
+
+# Tỉnh / thành phố cũ (trước sáp nhập 2025) -> tỉnh / thành phố hiện tại, kèm vài cách viết tắt thường gặp
+PROVINCE_ALIASES = {
+    'Hà Giang': 'Tuyên Quang', 'Yên Bái': 'Lào Cai', 'Bắc Kạn': 'Thái Nguyên',
+    'Vĩnh Phúc': 'Phú Thọ', 'Hòa Bình': 'Phú Thọ', 'Bắc Giang': 'Bắc Ninh',
+    'Thái Bình': 'Hưng Yên', 'Hải Dương': 'Hải Phòng', 'Hà Nam': 'Ninh Bình', 'Nam Định': 'Ninh Bình',
+    'Quảng Bình': 'Quảng Trị', 'Thừa Thiên Huế': 'Huế', 'Quảng Nam': 'Đà Nẵng', 'Kon Tum': 'Quảng Ngãi',
+    'Bình Định': 'Gia Lai', 'Ninh Thuận': 'Khánh Hòa', 'Phú Yên': 'Đắk Lắk',
+    'Đắk Nông': 'Lâm Đồng', 'Bình Thuận': 'Lâm Đồng', 'Bình Phước': 'Đồng Nai',
+    'Bình Dương': 'Hồ Chí Minh', 'Bà Rịa - Vũng Tàu': 'Hồ Chí Minh', 'Bà Rịa Vũng Tàu': 'Hồ Chí Minh',
+    'Long An': 'Tây Ninh', 'Tiền Giang': 'Đồng Tháp', 'Bến Tre': 'Vĩnh Long', 'Trà Vinh': 'Vĩnh Long',
+    'Sóc Trăng': 'Cần Thơ', 'Hậu Giang': 'Cần Thơ', 'Bạc Liêu': 'Cà Mau', 'Kiên Giang': 'An Giang',
+    'HCM': 'Hồ Chí Minh', 'TPHCM': 'Hồ Chí Minh', 'Sài Gòn': 'Hồ Chí Minh', 'HN': 'Hà Nội',
+}
+
+
+def province_key(name):
+    """Khóa so khớp tên tỉnh: "Thành phố Hải Phòng" / "TP. Hải Phòng" / "hai phong" -> "hai phong"."""
+    return _PROVINCE_PREFIX.sub('', fold_text(name)).strip()
+
+
+def commune_key(name, strip_prefix=False):
+    """Khóa so khớp tên xã: không dấu, chữ thường; strip_prefix bỏ cả "Phường" / "Xã"..."""
+    key = fold_text(name)
+    return _COMMUNE_PREFIX.sub('', key).strip() if strip_prefix else key
+
+
+class LocationIndex:
+    """provinces: list tên tỉnh (đúng thứ tự trong file JSON, dùng cho selectbox);
+    communes: dict tỉnh -> list xã/phường."""
+
+    def __init__(self, data):
+        self.provinces = list(data)
+        self.communes = {province: list(items) for province, items in data.items()}
+
+        self._province_index = {}
+        for i, province in enumerate(self.provinces):
+            self._province_index[province] = i
+            self._province_index.setdefault(province_key(province), i)
+        for old_name, new_name in PROVINCE_ALIASES.items():
+            target = self._province_index.get(province_key(new_name))
+            if target is not None:
+                self._province_index.setdefault(province_key(old_name), target)
+
+        self._commune_index = {}
+        self._commune_short = {}  # tỉnh -> {tên xã bỏ tiền tố, không trùng: vị trí} cho so khớp gần đúng
+        for province, items in self.communes.items():
+            index = {}
+            short_names = {}
+            for i, commune in enumerate(items):
+                index.setdefault(commune, i)
+                index.setdefault(commune_key(commune), i)
+                short_names.setdefault(commune_key(commune, strip_prefix=True), []).append(i)
+            # Tên bỏ "Phường" / "Xã" chỉ dùng khi không trùng (vd có cả Phường An Bình và Xã An Bình)
+            unique_shorts = {short: positions[0] for short, positions in short_names.items() if len(positions) == 1}
+            for short, position in unique_shorts.items():
+                index.setdefault(short, position)
+            self._commune_index[province] = index
+            self._commune_short[province] = unique_shorts
+
+    def province_index(self, name, default=None):
+        """Vị trí của tỉnh trong self.provinces (nhận tên có / không tiền tố, không dấu, tên cũ)."""
+        if not isinstance(name, str) or not name.strip():
+            return default
+        index = self._province_index.get(name)
+        if index is None:
+            index = self._province_index.get(province_key(name))
+        return default if index is None else index
+
+    def resolve_province(self, name):
+        """Tên tỉnh chuẩn (như trong JSON) hoặc None nếu không nhận ra."""
+        index = self.province_index(name)
+        return None if index is None else self.provinces[index]
+
+    def commune_index(self, province, name, default=None):
+        """Vị trí của xã/phường trong self.communes[province]."""
+        index = self._commune_index.get(province)
+        if index is None or not isinstance(name, str) or not name.strip():
+            return default
+        position = index.get(name.strip())
+        if position is None:
+            position = index.get(commune_key(name))
+        if position is None:
+            position = index.get(commune_key(name, strip_prefix=True))
+        return default if position is None else position
+
+    def resolve_commune(self, province, name):
+        """Tên xã/phường chuẩn trong tỉnh hoặc None nếu không nhận ra."""
+        index = self.commune_index(province, name)
+        return None if index is None else self.communes[province][index]
+
+    def match_commune(self, province, name, cutoff=FUZZY_COMMUNE_CUTOFF):
+        """Như resolve_commune, thêm so khớp gần đúng (vd "Phường Nghĩa Đo" -> Phường Nghĩa Đô).
+        Chỉ nhận khi có đúng 1 tên đủ giống - không đoán khi có nhiều khả năng."""
+        exact = self.resolve_commune(province, name)
+        if exact is not None or not isinstance(name, str):
+            return exact
+        shorts = self._commune_short.get(province)
+        key = commune_key(name, strip_prefix=True)
+        if not shorts or not key:
+            return None
+        close = difflib.get_close_matches(key, shorts, n=2, cutoff=cutoff)
+        if len(close) != 1:
+            return None
+        return self.communes[province][shorts[close[0]]]
+
+
+def load_location_index(path='vietnam_data.json'):
+    """Đọc file JSON (1 lần / tiến trình - app.py cache kết quả). Không có file -> index rỗng."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return LocationIndex(json.load(f))
+    except FileNotFoundError:
+        return LocationIndex({})
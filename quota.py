@@ -0,0 +1,149 @@
+"""Bộ điều phối quota dùng chung cho mọi lời gọi Google Sheets API trong tiến trình.
+
+Thay vì để từng phiên tự gọi rồi tự ngủ khi gặp 429 (dễ gây "thundering herd"),
+mọi lời gọi xếp hàng qua 2 token bucket (đọc / ghi) được đặt dưới quota/phút:
+- Lời gọi có độ ưu tiên cao hơn (số nhỏ hơn) được cấp token trước.
+- Khi vẫn gặp 429: tạm dừng cả bucket cho mọi người gọi, chờ lũy thừa có jitter
+  rồi thử lại.
+
+clock / sleep / rand có thể truyền vào để kiểm thử bằng đồng hồ giả, ví dụ
+sleep=lambda s: fake.advance(s) và clock=fake.now.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Độ ưu tiên (số nhỏ = ưu tiên cao)
+PRIORITY_USER_WRITE = 0
+PRIORITY_USER_READ = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_ADMIN_READ = 3
+
+READ = 'read'
+WRITE = 'write'
+
+
+class QuotaExceeded(Exception):
+    """Đã thử lại hết số lần mà vẫn bị giới hạn quota."""
+
+
+class TokenBucket:
+    """Bucket nạp đều `rate` token/giây, chứa tối đa `capacity` token."""
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+        self.paused_until = now
+
+    def _refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, now):
+        """Số giây phải chờ trước khi lấy được 1 token (0 nếu lấy được ngay)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1 - 1e-9:  # Dung sai làm tròn số thực
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now, seconds):
+        """Dừng cấp token (sau khi gặp 429) và xả hết token còn lại."""
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated_at = max(self.updated_at, self.paused_until)
+
+
+class QuotaScheduler:
+    """Xếp hàng và điều tốc các lời gọi API theo quota đọc / ghi mỗi phút.
+
+    burst: số lời gọi được phép dồn liền nhau; headroom: chỉ dùng tới tỉ lệ này của
+    quota. Với burst=5, headroom=0.9, quota 60/phút: tối đa 5 + 54 = 59 lời gọi
+    trong bất kỳ 60 giây nào.
+    is_rate_limited(exc): True nếu exception là lỗi 429.
+    """
+
+    def __init__(self, read_per_minute=60, write_per_minute=60, burst=5, headroom=0.9,
+                 is_rate_limited=None, max_retries=5, base_backoff=2.0, max_backoff=64.0,
+                 clock=time.monotonic, sleep=time.sleep, rand=random.random):
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+        self._is_rate_limited = is_rate_limited or (lambda exc: False)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        now = clock()
+        self._buckets = {
+            READ: TokenBucket(read_per_minute * headroom / 60.0, burst, now),
+            WRITE: TokenBucket(write_per_minute * headroom / 60.0, burst, now),
+        }
+        self._waiters = {READ: [], WRITE: []}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {'calls': 0, 'rate_limited': 0, 'waited_seconds': 0.0}
+
+    def acquire(self, kind, priority=PRIORITY_USER_READ):
+        """Chờ tới lượt và lấy 1 token của loại `kind` ('read' / 'write')."""
+        bucket = self._buckets[kind]
+        waiters = self._waiters[kind]
+        started = self._clock()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(waiters, ticket)
+            try:
+                while True:
+                    if waiters[0] != ticket:
+                        # Chưa tới lượt: chờ người đứng trước lấy token xong
+                        self._cond.wait(timeout=1.0)
+                        continue
+                    now = self._clock()
+                    wait = bucket.wait_time(now)
+                    if wait <= 0:
+                        bucket.take(now)
+                        break
+                    # Nhả khóa trong lúc ngủ để người có ưu tiên cao hơn có thể chen lên
+                    self._cond.release()
+                    try:
+                        self._sleep(wait)
+                    finally:
+                        self._cond.acquire()
+            finally:
+                waiters.remove(ticket)
+                heapq.heapify(waiters)
+                self._cond.notify_all()
+            self.stats['waited_seconds'] += self._clock() - started
+
+    def backoff_delay(self, attempt):
+        """Thời gian chờ lũy thừa có jitter: 1 nửa cố định + 1 nửa ngẫu nhiên."""
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return delay / 2 + self._rand() * delay / 2
+
+    def call(self, fn, kind=READ, priority=PRIORITY_USER_READ):
+        """Gọi fn() khi tới lượt; gặp 429 thì dừng cả bucket rồi thử lại."""
+        for attempt in range(self.max_retries):
+            self.acquire(kind, priority)
+            self.stats['calls'] += 1
+            try:
+                return fn()
+            except Exception as exc:
+                if not self._is_rate_limited(exc):
+                    raise
+                self.stats['rate_limited'] += 1
+                if attempt == self.max_retries - 1:
+                    raise QuotaExceeded(str(exc)) from exc
+                with self._cond:
+                    self._buckets[kind].pause(self._clock(), self.backoff_delay(attempt))
+                    self._cond.notify_all()
+        raise QuotaExceeded("Hết số lần thử lại")
@@ -0,0 +1,189 @@
+"""Index tìm kiếm Họ tên + Ngày sinh (không phân biệt dấu, có tìm gần đúng).
+
+Dựng 1 lần khi load dữ liệu, mỗi lần tra cứu chỉ là vài phép tra dict.
+"""
+import copy
+import re
+import unicodedata
+from collections import Counter
+
+# Ngưỡng điểm (hệ số Dice trên trigram) để coi là "gần đúng"
+FUZZY_MIN_SCORE = 0.6
+
+_DATE_PATTERNS = [
+    # dd/mm/yyyy, d-m-yyyy, dd.mm.yyyy, dd mm yyyy
+    (re.compile(r'^(\d{1,2})[/\-. ]+(\d{1,2})[/\-. ]+(\d{4})$'), ('d', 'm', 'y')),
+    # yyyy-mm-dd (định dạng ISO)
+    (re.compile(r'^(\d{4})[/\-. ]+(\d{1,2})[/\-. ]+(\d{1,2})$'), ('y', 'm', 'd')),
+    # ddmmyyyy (gõ liền không dấu phân cách)
+    (re.compile(r'^(\d{2})(\d{2})(\d{4})$'), ('d', 'm', 'y')),
+]
+
+
+def fold_text(text):
+    """Bỏ dấu tiếng Việt, chữ thường, gộp khoảng trắng.
+    Ví dụ: "  Nguyễn  Văn Đức " -> "nguyen van duc"
+    """
+    if not isinstance(text, str):
+        text = '' if text is None else str(text)
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return ' '.join(text.lower().split())
+
+
+def parse_dob_key(text):
+    """Chuyển chuỗi ngày sinh về khóa 'yyyymmdd'. Không hợp lệ -> ''."""
+    text = str(text or '').strip()
+    for pattern, order in _DATE_PATTERNS:
+        m = pattern.match(text)
+        if not m:
+            continue
+        parts = dict(zip(order, (int(g) for g in m.groups())))
+        d, mth, y = parts['d'], parts['m'], parts['y']
+        if 1 <= d <= 31 and 1 <= mth <= 12:
+            return f"{y:04d}{mth:02d}{d:02d}"
+    return ''
+
+
+def _swapped_dob_key(key):
+    """Khóa ngày sinh khi người dùng gõ nhầm thứ tự ngày/tháng (mm/dd)."""
+    if not key:
+        return ''
+    y, mth, d = key[:4], key[4:6], key[6:]
+    if int(d) <= 12 and d != mth:
+        return f"{y}{d}{mth}"
+    return ''
+
+
+def trigrams(folded):
+    """Tập trigram của chuỗi đã fold (có đệm khoảng trắng 2 đầu)."""
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameSearchIndex:
+    """Index Họ tên + Ngày sinh.
+
+    - by_name_dob: (tên đã fold, khóa ngày sinh) -> nhãn dòng (khớp chính xác)
+    - by_dob: khóa ngày sinh -> nhãn dòng
+    - postings: trigram -> nhãn dòng (inverted index cho tìm gần đúng)
+    """
+
+    def __init__(self, names, dobs):
+        """names, dobs: pandas Series cùng index (nhãn dòng của DataFrame)."""
+        self.folded = {}
+        self.token_keys = {}
+        self.dob_keys = {}
+        self.grams = {}
+        self.by_name_dob = {}
+        self.by_dob = {}
+        self.postings = {}
+
+        for label, name, dob in zip(names.index, names.values, dobs.values):
+            self.add(label, name, dob)
+
+    def add(self, label, name, dob):
+        """Thêm (hoặc ghi đè) 1 dòng vào index."""
+        if label in self.folded:
+            self.remove(label)
+        folded = fold_text(name)
+        dob_key = parse_dob_key(dob)
+        grams = trigrams(folded) if folded else set()
+
+        self.folded[label] = folded
+        self.token_keys[label] = ' '.join(sorted(folded.split()))
+        self.dob_keys[label] = dob_key
+        self.grams[label] = grams
+        self.by_name_dob.setdefault((folded, dob_key), []).append(label)
+        self.by_dob.setdefault(dob_key, []).append(label)
+        for g in grams:
+            self.postings.setdefault(g, set()).add(label)
+
+    def remove(self, label):
+        """Xóa 1 dòng khỏi index (dùng khi dữ liệu dòng đó thay đổi)."""
+        folded = self.folded.pop(label, None)
+        if folded is None:
+            return
+        dob_key = self.dob_keys.pop(label)
+        self.token_keys.pop(label, None)
+        self.by_name_dob.get((folded, dob_key), []).remove(label)
+        self.by_dob.get(dob_key, []).remove(label)
+        for g in self.grams.pop(label, ()):
+            self.postings.get(g, set()).discard(label)
+
+    def with_row(self, label, name, dob):
+        """Bản sao index có cập nhật 1 dòng; index hiện tại giữ nguyên (copy-on-write).
+        Chỉ các danh sách/tập hợp bị sửa mới được sao chép, phần còn lại dùng chung."""
+        clone = copy.copy(self)
+        for attr in ('folded', 'token_keys', 'dob_keys', 'grams', 'by_name_dob', 'by_dob', 'postings'):
+            setattr(clone, attr, dict(getattr(self, attr)))
+        if label in self.folded:
+            name_key = (self.folded[label], self.dob_keys[label])
+            clone.by_name_dob[name_key] = list(self.by_name_dob[name_key])
+            clone.by_dob[self.dob_keys[label]] = list(self.by_dob[self.dob_keys[label]])
+            for g in self.grams[label]:
+                clone.postings[g] = set(self.postings[g])
+        new_folded = fold_text(name)
+        new_name_key = (new_folded, parse_dob_key(dob))
+        if new_name_key in clone.by_name_dob:
+            clone.by_name_dob[new_name_key] = list(clone.by_name_dob[new_name_key])
+        if new_name_key[1] in clone.by_dob:
+            clone.by_dob[new_name_key[1]] = list(clone.by_dob[new_name_key[1]])
+        for g in trigrams(new_folded) if new_folded else ():
+            if g in clone.postings:
+                clone.postings[g] = set(clone.postings[g])
+        clone.add(label, name, dob)
+        return clone
+
+    def search(self, name, dob, limit=10):
+        """Tìm theo Họ tên + Ngày sinh.
+
+        Trả về list [(nhãn dòng, điểm)] sắp xếp giảm dần theo điểm:
+        - 1.0: khớp chính xác (không phân biệt dấu / hoa thường / định dạng ngày)
+        - < 1.0: khớp gần đúng theo trigram, ngày sinh vẫn phải khớp
+          (cho phép nhầm thứ tự ngày/tháng).
+        """
+        q_name = fold_text(name)
+        q_dob = parse_dob_key(dob)
+        if not q_name or not q_dob:
+            return []
+
+        exact = self.by_name_dob.get((q_name, q_dob), [])
+        if exact:
+            return [(label, 1.0) for label in exact[:limit]]
+
+        dob_keys = {q_dob, _swapped_dob_key(q_dob)} - {''}
+        q_tokens = ' '.join(sorted(q_name.split()))
+        q_grams = trigrams(q_name)
+
+        # Đếm số trigram chung: duyệt nhóm cùng ngày sinh nếu nhóm này nhỏ,
+        # ngược lại duyệt qua inverted index (chọn đường rẻ hơn)
+        bucket = [label for key in dob_keys for label in self.by_dob.get(key, ())]
+        postings_cost = sum(len(self.postings.get(g, ())) for g in q_grams)
+        shared = Counter()
+        if len(bucket) * len(q_grams) <= postings_cost:
+            for label in bucket:
+                common = len(q_grams & self.grams[label])
+                if common:
+                    shared[label] = common
+        else:
+            for g in q_grams:
+                for label in self.postings.get(g, ()):
+                    if self.dob_keys[label] in dob_keys:
+                        shared[label] += 1
+
+        scored = []
+        for label, common in shared.items():
+            if self.token_keys[label] == q_tokens:
+                # Đúng tên nhưng khác thứ tự từ / sai thứ tự ngày-tháng
+                score = 0.99 if self.dob_keys[label] == q_dob else 0.95
+            else:
+                score = 2.0 * common / (len(q_grams) + len(self.grams[label]))
+                if self.dob_keys[label] != q_dob:
+                    score *= 0.9
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((label, round(score, 3)))
+
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
@@ -0,0 +1,567 @@
+"""Lớp lưu trữ có thể thay thế cho app.py.
+
+Mọi thao tác đọc/ghi dữ liệu Đảng viên đi qua 1 StorageBackend:
+- GoogleSheetsBackend: Google Sheet thật (gspread), mọi lời gọi qua QuotaScheduler.
+- SQLiteBackend: file SQLite cục bộ, cột ID / CCCD có index - chạy offline, danh sách lớn.
+- MemoryWorkbook: bản giả lập gspread trong bộ nhớ (độ trễ, quota, lỗi 429 giả lập),
+  dùng với GoogleSheetsBackend để chạy thử / đo tải mà không đụng sheet thật.
+
+Quy ước số dòng giống Google Sheet: dòng 1 là tiêu đề, dữ liệu bắt đầu từ dòng 2.
+Quy ước số cột: 0 = cột A.
+"""
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import gspread
+import requests
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+from columns import ALL_COLUMNS, COL_ID
+from quota import (QuotaScheduler, READ, WRITE,
+                   PRIORITY_USER_WRITE, PRIORITY_USER_READ, PRIORITY_ADMIN_READ)
+
+# Tiêu đề sheet Backup: thời điểm lưu + toàn bộ cột
+BACKUP_HEADER = ['Thời gian'] + ALL_COLUMNS
+
+
+class MissingWorksheet(Exception):
+    """Không có sheet / bảng cần dùng (vd chưa tạo sheet Backup)."""
+
+
+def is_rate_limited(exc):
+    """True nếu exception là lỗi 429 của Google Sheets API."""
+    return isinstance(exc, gspread.exceptions.APIError) and exc.response.status_code == 429
+
+
+class StorageBackend:
+    """Các thao tác app cần. Lớp con cài đặt; priority chỉ có ý nghĩa với backend có quota."""
+
+    name = 'base'
+
+    def read_main_records(self, priority=PRIORITY_USER_READ):
+        """Toàn bộ Sheet1 dạng list dict (giống get_all_records)."""
+        raise NotImplementedError
+
+    def change_token(self):
+        """Dấu hiệu thay đổi rẻ (đổi mỗi khi dữ liệu đổi). None = không hỗ trợ."""
+        return None
+
+    def find_row(self, record_id, priority=PRIORITY_USER_READ):
+        """Số dòng của ID trên Sheet1, None nếu không có."""
+        raise NotImplementedError
+
+    def read_ids(self, row_numbers, priority=PRIORITY_USER_READ):
+        """Giá trị ô ID hiện tại trên Sheet1 của nhiều dòng trong 1 lần đọc: dict số dòng -> ID."""
+        raise NotImplementedError
+
+    def update_cells(self, updates, priority=PRIORITY_USER_WRITE):
+        """Ghi nhiều đoạn ô trong 1 lần. updates: [(số dòng, cột bắt đầu, [giá trị...])]"""
+        raise NotImplementedError
+
+    def append_backup_rows(self, rows, priority=PRIORITY_USER_WRITE):
+        """Thêm nhiều dòng vào Backup trong 1 lần."""
+        raise NotImplementedError
+
+    def read_backup_values(self, priority=PRIORITY_ADMIN_READ):
+        """Toàn bộ Backup (kể cả dòng tiêu đề) dạng list các list chuỗi."""
+        raise NotImplementedError
+
+    def read_backup_range(self, start_row, end_row, priority=PRIORITY_ADMIN_READ):
+        """Các dòng start_row..end_row của Backup (dòng 1 là tiêu đề); hết dữ liệu thì trả ít dòng hơn."""
+        raise NotImplementedError
+
+    def rewrite_backup_values(self, values, width=None, priority=PRIORITY_ADMIN_READ):
+        """Thay toàn bộ Backup bằng values (kể cả tiêu đề), ghi nguyên dạng chuỗi.
+        width: số cột cũ lớn nhất (để xóa phần thừa của các dòng cũ dài hơn)."""
+        raise NotImplementedError
+
+
+# =====================================================================
+# GOOGLE SHEETS
+# =====================================================================
+
+class GoogleSheetsBackend(StorageBackend):
+    """Google Sheet qua gspread. Worksheet được cache (không gọi lấy metadata mỗi lần)."""
+
+    name = 'gsheets'
+
+    def __init__(self, workbook, scheduler, main_sheet_name='Sheet1', backup_sheet_name='Backup'):
+        self.workbook = workbook
+        self.scheduler = scheduler
+        self.main_sheet_name = main_sheet_name
+        self.backup_sheet_name = backup_sheet_name
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def _worksheet(self, name):
+        with self._lock:
+            if name not in self._worksheets:
+                try:
+                    self._worksheets[name] = self.scheduler.call(
+                        lambda: self.workbook.worksheet(name), READ, PRIORITY_USER_READ)
+                except gspread.exceptions.WorksheetNotFound:
+                    raise MissingWorksheet(name)
+            return self._worksheets[name]
+
+    def _call(self, fn, kind, priority):
+        return self.scheduler.call(fn, kind, priority)
+
+    def read_main_records(self, priority=PRIORITY_USER_READ):
+        sheet = self._worksheet(self.main_sheet_name)
+        # Giữ nguyên chuỗi hiển thị trên sheet (không đổi "012..." thành số) để biết ô nào đang lưu dạng số
+        return self._call(lambda: sheet.get_all_records(expected_headers=ALL_COLUMNS, numericise_ignore=['all']),
+                          READ, priority)
+
+    def change_token(self):
+        # Drive API (không tính vào quota đọc của Sheets)
+        return self.workbook.get_lastUpdateTime()
+
+    def find_row(self, record_id, priority=PRIORITY_USER_READ):
+        sheet = self._worksheet(self.main_sheet_name)
+        cell = self._call(lambda: sheet.find(str(record_id), in_column=2), READ, priority)
+        return cell.row if cell else None
+
+    def read_ids(self, row_numbers, priority=PRIORITY_USER_READ):
+        rows = sorted(set(row_numbers))
+        if not rows:
+            return {}
+        sheet = self._worksheet(self.main_sheet_name)
+        id_col = rowcol_to_a1(1, ALL_COLUMNS.index(COL_ID) + 1).rstrip('1')
+        ranges = self._call(lambda: sheet.batch_get([f"{id_col}{row}" for row in rows]), READ, priority)
+        return {row: str(values[0][0]).strip() if values and values[0] else '' for row, values in zip(rows, ranges)}
+
+    def update_cells(self, updates, priority=PRIORITY_USER_WRITE):
+        if not updates:
+            return None
+        sheet = self._worksheet(self.main_sheet_name)
+        data = []
+        for row_number, start_col, values in updates:
+            start = rowcol_to_a1(row_number, start_col + 1)
+            end = rowcol_to_a1(row_number, start_col + len(values))
+            data.append({'range': f"{start}:{end}", 'values': [list(values)]})
+        return self._call(lambda: sheet.batch_update(data, value_input_option='USER_ENTERED'), WRITE, priority)
+
+    def append_backup_rows(self, rows, priority=PRIORITY_USER_WRITE):
+        if not rows:
+            return None
+        sheet = self._worksheet(self.backup_sheet_name)
+        return self._call(lambda: sheet.append_rows(rows, value_input_option='USER_ENTERED'), WRITE, priority)
+
+    def read_backup_values(self, priority=PRIORITY_ADMIN_READ):
+        sheet = self._worksheet(self.backup_sheet_name)
+        return self._call(lambda: sheet.get_all_values(), READ, priority)
+
+    def read_backup_range(self, start_row, end_row, priority=PRIORITY_ADMIN_READ):
+        sheet = self._worksheet(self.backup_sheet_name)
+        last_col = rowcol_to_a1(1, len(BACKUP_HEADER)).rstrip('1')
+        rows = self._call(lambda: sheet.get(f"A{start_row}:{last_col}{end_row}"), READ, priority)
+        return [list(row) for row in rows]
+
+    def rewrite_backup_values(self, values, width=None, priority=PRIORITY_ADMIN_READ):
+        # Ghi đè từ A1 trước (lỗi giữa chừng thì dữ liệu cũ vẫn còn), sau đó mới cắt bớt số dòng
+        sheet = self._worksheet(self.backup_sheet_name)
+        width = max([width or 0] + [len(row) for row in values])
+        padded = [list(row) + [''] * (width - len(row)) for row in values]
+        self._call(lambda: sheet.update(values=padded, range_name='A1', value_input_option='RAW'), WRITE, priority)
+        self._call(lambda: sheet.resize(rows=len(padded)), WRITE, priority)
+
+
+# =====================================================================
+# GIẢ LẬP GSPREAD TRONG BỘ NHỚ
+# =====================================================================
+
+_INT_RE = re.compile(r'^-?\d+$')
+_FLOAT_RE = re.compile(r'^-?\d+\.\d+$')
+
+
+def parse_user_entered(value):
+    """Giả lập USER_ENTERED: "'0123" -> chuỗi "0123", "0123" -> số 123."""
+    if not isinstance(value, str):
+        return value
+    if value.startswith("'"):
+        return value[1:]
+    if _INT_RE.match(value):
+        return int(value)
+    if _FLOAT_RE.match(value):
+        return float(value)
+    return value
+
+
+def _rate_limit_error(message):
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({'error': {
+        'code': 429, 'message': message, 'status': 'RESOURCE_EXHAUSTED'}}).encode()
+    return gspread.exceptions.APIError(response)
+
+
+class MemoryWorkbook:
+    """Spreadsheet giả: cùng tên hàm như gspread.Spreadsheet / Worksheet mà app dùng.
+
+    latency: số giây mỗi lời gọi API (cộng thêm tối đa latency_jitter ngẫu nhiên).
+    read_per_minute / write_per_minute: quota giả lập, vượt quá thì ném APIError 429
+        giống Google (None = không giới hạn).
+    error_rate: xác suất 1 lời gọi bất kỳ bị 429 ngẫu nhiên.
+    """
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, read_per_minute=None,
+                 write_per_minute=None, error_rate=0.0, clock=time.monotonic, sleep=time.sleep):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.quota = {READ: read_per_minute, WRITE: write_per_minute}
+        self.error_rate = error_rate
+        self._clock = clock
+        self._sleep = sleep
+        self._sheets = {}
+        self._history = {READ: [], WRITE: []}
+        self._lock = threading.Lock()
+        self.revision = 0
+        self.calls = Counter()  # Số lời gọi API theo tên hàm (kể cả lời gọi bị 429)
+        self.rate_limited = 0
+        self.cells_written = 0
+
+    def add_worksheet(self, title, rows=None):
+        """Tạo sheet với dữ liệu ban đầu (list các list, dòng đầu là tiêu đề)."""
+        sheet = MemoryWorksheet(self, title, rows or [])
+        self._sheets[title] = sheet
+        return sheet
+
+    def worksheet(self, title):
+        self._api_call('worksheet', READ)
+        if title not in self._sheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._sheets[title]
+
+    def get_lastUpdateTime(self):
+        # Drive API: chỉ đếm số lời gọi, không tính quota Sheets
+        with self._lock:
+            self.calls['get_lastUpdateTime'] += 1
+            return str(self.revision)
+
+    def _api_call(self, method, kind):
+        """Đếm lời gọi, giả lập độ trễ và quota / lỗi 429."""
+        with self._lock:
+            self.calls[method] += 1
+            now = self._clock()
+            history = self._history[kind]
+            while history and history[0] <= now - 60:
+                history.pop(0)
+            limit = self.quota[kind]
+            over_quota = limit is not None and len(history) >= limit
+            if not over_quota:
+                history.append(now)
+            random_error = self.error_rate and random.random() < self.error_rate
+            if over_quota or random_error:
+                self.rate_limited += 1
+        delay = self.latency + (random.random() * self.latency_jitter if self.latency_jitter else 0)
+        if delay:
+            self._sleep(delay)
+        if over_quota or random_error:
+            raise _rate_limit_error(f"Quota exceeded for '{kind}' requests (giả lập)")
+
+    def _touch(self, cells=0):
+        with self._lock:
+            self.revision += 1
+            self.cells_written += cells
+
+
+class MemoryWorksheet:
+    def __init__(self, workbook, title, rows):
+        self._wb = workbook
+        self.title = title
+        self._rows = [list(r) for r in rows]
+        self._lock = threading.Lock()
+
+    # --- Đọc ---
+    def get_all_values(self):
+        self._wb._api_call('get_all_values', READ)
+        with self._lock:
+            width = max((len(r) for r in self._rows), default=0)
+            return [[str(v) for v in r] + [''] * (width - len(r)) for r in self._rows]
+
+    def get_all_records(self, expected_headers=None, head=1, numericise_ignore=None):
+        self._wb._api_call('get_all_records', READ)
+        as_text = numericise_ignore == ['all']  # Như API thật: ô số trả về dạng chuỗi hiển thị
+        with self._lock:
+            if not self._rows:
+                return []
+            header = self._rows[head - 1]
+            records = []
+            for row in self._rows[head:]:
+                padded = list(row) + [''] * (len(header) - len(row))
+                records.append(dict(zip(header, [str(v) for v in padded] if as_text else padded)))
+            return records
+
+    def get(self, range_name):
+        self._wb._api_call('get', READ)
+        (r1, c1), (r2, c2) = _parse_range(range_name)
+        with self._lock:
+            rows = self._rows[r1 - 1:(r2 or len(self._rows))]
+            return [[str(v) for v in row[c1 - 1:(c2 or len(row))]] for row in rows]
+
+    def batch_get(self, ranges, **kwargs):
+        self._wb._api_call('batch_get', READ)
+        result = []
+        with self._lock:
+            for range_name in ranges:
+                (r1, c1), (r2, c2) = _parse_range(range_name)
+                rows = self._rows[r1 - 1:(r2 or len(self._rows))]
+                result.append([[str(v) for v in row[c1 - 1:(c2 or len(row))]] for row in rows])
+        return result
+
+    def find(self, query, in_column=None):
+        self._wb._api_call('find', READ)
+        with self._lock:
+            for r, row in enumerate(self._rows, start=1):
+                cells = [(in_column, row[in_column - 1] if len(row) >= in_column else '')] if in_column \
+                    else list(enumerate(row, start=1))
+                for c, value in cells:
+                    if str(value) == str(query):
+                        return gspread.cell.Cell(r, c, str(value))
+        return None
+
+    # --- Ghi ---
+    def update(self, range_name=None, values=None, value_input_option='RAW', **kwargs):
+        self._wb._api_call('update', WRITE)
+        self._write(range_name, values, value_input_option)
+        return {'updatedRange': f"{self.title}!{range_name}"}
+
+    def batch_update(self, data, value_input_option='RAW', **kwargs):
+        self._wb._api_call('batch_update', WRITE)
+        for item in data:
+            self._write(item['range'], item['values'], value_input_option)
+        return {'totalUpdatedCells': sum(len(r) for item in data for r in item['values'])}
+
+    def resize(self, rows=None, cols=None):
+        self._wb._api_call('resize', WRITE)
+        with self._lock:
+            if rows is not None:
+                del self._rows[rows:]
+        self._wb._touch()
+
+    def append_row(self, values, value_input_option='RAW', **kwargs):
+        self._wb._api_call('append_row', WRITE)
+        self._append([values], value_input_option)
+
+    def append_rows(self, values, value_input_option='RAW', **kwargs):
+        self._wb._api_call('append_rows', WRITE)
+        self._append(values, value_input_option)
+
+    def _convert(self, value, option):
+        return parse_user_entered(value) if str(option).upper().endswith('USER_ENTERED') else value
+
+    def _write(self, range_name, values, option):
+        (r1, c1), _ = _parse_range(range_name)
+        with self._lock:
+            for dr, row_values in enumerate(values):
+                r = r1 + dr
+                while len(self._rows) < r:
+                    self._rows.append([])
+                row = self._rows[r - 1]
+                for dc, value in enumerate(row_values):
+                    c = c1 + dc
+                    if len(row) < c:
+                        row.extend([''] * (c - len(row)))
+                    row[c - 1] = self._convert(value, option)
+        self._wb._touch(sum(len(r) for r in values))
+
+    def _append(self, rows, option):
+        with self._lock:
+            for row in rows:
+                self._rows.append([self._convert(v, option) for v in row])
+        self._wb._touch(sum(len(r) for r in rows))
+
+
+def _parse_range(range_name):
+    """'A5' / 'A5:AH5' / 'A2:C' -> ((dòng, cột), (dòng, cột)); 0 = đến hết."""
+    range_name = range_name.split('!')[-1]
+    start, _, end = range_name.partition(':')
+    r1, c1 = a1_to_rowcol(start)
+    if not end:
+        return (r1, c1), (r1, c1)
+    m = re.match(r'^([A-Z]*)(\d*)$', end.upper())
+    col_letters, row_digits = m.group(1), m.group(2)
+    r2 = int(row_digits) if row_digits else 0
+    c2 = a1_to_rowcol(f"{col_letters}1")[1] if col_letters else 0
+    return (r1, c1), (r2, c2)
+
+
+def build_memory_workbook(records, backup_rows=None, **options):
+    """Tạo MemoryWorkbook có Sheet1 (từ list dict theo ALL_COLUMNS) và Backup."""
+    workbook = MemoryWorkbook(**options)
+    workbook.add_worksheet('Sheet1', [ALL_COLUMNS] + [[r.get(c, '') for c in ALL_COLUMNS] for r in records])
+    workbook.add_worksheet('Backup', [BACKUP_HEADER] + list(backup_rows or []))
+    return workbook
+
+
+# Các backend bộ nhớ đã đăng ký theo tên (để công cụ đo tải dùng chung với app trong cùng tiến trình)
+MEMORY_BACKENDS = {}
+
+
+def get_memory_backend(key='default'):
+    """Backend bộ nhớ theo tên; chưa có thì tạo mới (sheet rỗng, không giới hạn quota)."""
+    if key not in MEMORY_BACKENDS:
+        register_memory_backend(key, build_memory_workbook([]))
+    return MEMORY_BACKENDS[key]
+
+
+def register_memory_backend(key, workbook, scheduler=None):
+    backend = GoogleSheetsBackend(workbook, scheduler or QuotaScheduler(is_rate_limited=is_rate_limited))
+    backend.name = 'memory'
+    MEMORY_BACKENDS[key] = backend
+    return backend
+
+
+# =====================================================================
+# SQLITE
+# =====================================================================
+
+class SQLiteBackend(StorageBackend):
+    """Lưu trữ cục bộ bằng SQLite. Mỗi dòng Sheet1 là 1 bản ghi JSON (theo thứ tự
+    ALL_COLUMNS) kèm cột id có index để tìm số dòng (tra cứu CCCD dùng index trong bộ nhớ
+    của data_store)."""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS members (
+                    row_number INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL,
+                    cells TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_members_id ON members(id);
+                CREATE TABLE IF NOT EXISTS backup (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cells TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', '0');
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _clean(value):
+        # Dấu ' chỉ là cách ép kiểu Text của Google Sheet, không lưu vào DB
+        value = '' if value is None else str(value)
+        return value[1:] if value.startswith("'") else value
+
+    def _bump_revision(self, conn):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision'")
+
+    def import_records(self, records):
+        """Thay toàn bộ dữ liệu bằng records (list dict theo ALL_COLUMNS), dòng 2..n+1."""
+        id_pos = ALL_COLUMNS.index(COL_ID)
+        rows = []
+        for i, record in enumerate(records):
+            cells = [self._clean(record.get(c, '')) for c in ALL_COLUMNS]
+            rows.append((i + 2, cells[id_pos], json.dumps(cells, ensure_ascii=False)))
+        with self._connect() as conn:
+            conn.execute("DELETE FROM members")
+            conn.executemany("INSERT INTO members (row_number, id, cells) VALUES (?, ?, ?)", rows)
+            self._bump_revision(conn)
+
+    def read_main_records(self, priority=PRIORITY_USER_READ):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT cells FROM members ORDER BY row_number").fetchall()
+        return [dict(zip(ALL_COLUMNS, json.loads(r[0]))) for r in rows]
+
+    def change_token(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def find_row(self, record_id, priority=PRIORITY_USER_READ):
+        with self._connect() as conn:
+            row = conn.execute("SELECT row_number FROM members WHERE id = ? ORDER BY row_number LIMIT 1",
+                               (str(record_id),)).fetchone()
+        return row[0] if row else None
+
+    def read_ids(self, row_numbers, priority=PRIORITY_USER_READ):
+        rows = sorted(set(row_numbers))
+        if not rows:
+            return {}
+        with self._connect() as conn:
+            found = conn.execute(
+                f"SELECT row_number, id FROM members WHERE row_number IN ({','.join('?' * len(rows))})",
+                rows).fetchall()
+        found = dict(found)
+        return {row: found.get(row, '') for row in rows}  # Dòng không có: '' như ô trống trên sheet
+
+    def update_cells(self, updates, priority=PRIORITY_USER_WRITE):
+        if not updates:
+            return None
+        id_pos = ALL_COLUMNS.index(COL_ID)
+        with self._connect() as conn:
+            for row_number, start_col, values in updates:
+                found = conn.execute("SELECT cells FROM members WHERE row_number = ?", (row_number,)).fetchone()
+                cells = json.loads(found[0]) if found else [''] * len(ALL_COLUMNS)
+                for offset, value in enumerate(values):
+                    cells[start_col + offset] = self._clean(value)
+                conn.execute(
+                    "INSERT OR REPLACE INTO members (row_number, id, cells) VALUES (?, ?, ?)",
+                    (row_number, cells[id_pos], json.dumps(cells, ensure_ascii=False)))
+            self._bump_revision(conn)
+
+    def append_backup_rows(self, rows, priority=PRIORITY_USER_WRITE):
+        if not rows:
+            return None
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO backup (cells) VALUES (?)",
+                             [(json.dumps([self._clean(v) for v in row], ensure_ascii=False),) for row in rows])
+
+    def read_backup_values(self, priority=PRIORITY_ADMIN_READ):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT cells FROM backup ORDER BY seq").fetchall()
+        return [BACKUP_HEADER] + [json.loads(r[0]) for r in rows]
+
+    def read_backup_range(self, start_row, end_row, priority=PRIORITY_ADMIN_READ):
+        # Dòng 1 là tiêu đề (không lưu trong bảng), dòng k >= 2 là bản ghi thứ k - 1
+        header = [BACKUP_HEADER] if start_row <= 1 else []
+        first = max(start_row, 2)
+        with self._connect() as conn:
+            rows = conn.execute("SELECT cells FROM backup ORDER BY seq LIMIT ? OFFSET ?",
+                                (max(end_row - first + 1, 0), first - 2)).fetchall()
+        return header + [json.loads(r[0]) for r in rows]
+
+    def rewrite_backup_values(self, values, width=None, priority=PRIORITY_ADMIN_READ):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM backup")
+            conn.executemany("INSERT INTO backup (cells) VALUES (?)",
+                             [(json.dumps([str(v) for v in row], ensure_ascii=False),) for row in values[1:]])
+
+
+def main(argv=None):
+    """Nạp file Excel "Tải trọn bộ dữ liệu" của Admin vào SQLite để chạy offline:
+        python storage.py TongHop_DangVien.xlsx data_cache/members.sqlite3"""
+    import argparse
+    import logging
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Nạp file Excel tổng hợp Đảng viên vào SQLite (storage_backend = sqlite)")
+    parser.add_argument('source', help="File .xlsx tải từ Admin Dashboard")
+    parser.add_argument('target', help="File SQLite đích (sqlite_path)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    frame = pd.read_excel(args.source, dtype=str).fillna('')
+    SQLiteBackend(args.target).import_records(frame.to_dict('records'))
+    logging.getLogger(__name__).info("Đã nạp %d dòng vào %s", len(frame), args.target)
+
+
+if __name__ == '__main__':
+    main()
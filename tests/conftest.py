@@ -0,0 +1,57 @@
+"""Dữ liệu giả dùng chung cho các test (không cần Google Sheets / Streamlit)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columns import ALL_COLUMNS  # noqa: E402
+
+LOCATIONS = {
+    'Thành phố Hà Nội': ['Phường Ba Đình', 'Phường Nghĩa Đô', 'Xã Sóc Sơn'],
+    'Tỉnh Nghệ An': ['Phường Vinh Phú', 'Xã Nghi Lộc'],
+}
+
+
+class FakeClock:
+    """Đồng hồ giả: sleep chỉ cộng thời gian, không chờ thật."""
+
+    def __init__(self, now=0.0):
+        self.now_value = now
+
+    def now(self):
+        return self.now_value
+
+    def sleep(self, seconds):
+        self.now_value += max(seconds, 0)
+
+
+def make_record(record_id, **values):
+    """1 dòng Sheet1 (dict theo ALL_COLUMNS); values theo tên cột."""
+    record = {col: '' for col in ALL_COLUMNS}
+    record.update({
+        'STT': int(record_id),
+        'ID': str(record_id),
+        'Họ và tên *': f"Nguyễn Văn {record_id}",
+        'Giới tính *': 'Nam',
+        'Sinh ngày * (dd/mm/yyyy)': '01/02/2000',
+        'Số định danh cá nhân *': f"0010{int(record_id):08d}",
+        'Tổ chức Đảng đang sinh hoạt * (không sửa)': 'Chi bộ 1',
+        'Thường trú (theo mô hình 2 cấp) - Quốc gia *': 'Việt Nam',
+        'Thường trú (theo mô hình 2 cấp) - Tỉnh *': 'Thành phố Hà Nội',
+        'Temp_XaPhuong_ThuongTru': 'Phường Ba Đình',
+    })
+    record.update(values)
+    return record
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def locations():
+    from locations import LocationIndex
+    return LocationIndex(LOCATIONS)
@@ -0,0 +1,55 @@
+from address_backfill import plan_backfill, split_address
+from data_store import normalize_records
+from tests.conftest import make_record
+
+COL_COUNTRY = 'Thường trú (theo mô hình 2 cấp) - Quốc gia *'
+COL_PROVINCE = 'Thường trú (theo mô hình 2 cấp) - Tỉnh *'
+COL_TEXT = 'Thường trú (theo mô hình 2 cấp) - Địa chỉ chi tiết *'
+COL_XA = 'Temp_XaPhuong_ThuongTru'
+COL_THON = 'Temp_ThonTo_ThuongTru'
+
+
+def legacy(record_id, text, **values):
+    """Dòng chỉ có chuỗi địa chỉ cũ, các ô Temp còn trống."""
+    return make_record(record_id, **{COL_TEXT: text, COL_XA: '', **values})
+
+
+def test_split_address_reads_parts_from_the_right(locations):
+    province = 'Thành phố Hà Nội'
+    assert split_address(locations, province, 'Số 1, Thôn A, Phường Ba Đình, Quận Cũ') == \
+        ('Phường Ba Đình', 'Số 1, Thôn A')
+    assert split_address(locations, province, 'Ngõ 2, nghia do') == ('Phường Nghĩa Đô', 'Ngõ 2')
+    assert split_address(locations, province, 'Ngõ 2, Phường Nghĩa Đo') == ('Phường Nghĩa Đô', 'Ngõ 2')
+    assert split_address(locations, province, 'Ngõ 2, Cầu Giấy') == (None, None)
+
+
+def test_plan_backfill_fills_only_blank_temp_cells(locations):
+    df = normalize_records([
+        legacy(1, 'Số 1, Thôn A, Phường Ba Đình'),
+        legacy(2, 'Số 2, Xã Sóc Sơn', **{COL_THON: 'Đã có'}),
+        legacy(3, 'Số 3, Phường Vinh Phú', **{COL_PROVINCE: 'Nghệ An'}),
+        make_record(4, **{COL_TEXT: 'Số 4, Xã Sóc Sơn', COL_XA: 'Phường Ba Đình'}),
+        legacy(5, 'Viêng Chăn', **{COL_COUNTRY: 'Lào'}),
+    ])
+    changes, unmatched = plan_backfill(df, locations)
+    assert changes == {
+        '1': {COL_XA: 'Phường Ba Đình', COL_THON: 'Số 1, Thôn A'},
+        '2': {COL_XA: 'Xã Sóc Sơn'},
+        '3': {COL_XA: 'Phường Vinh Phú', COL_THON: 'Số 3'},
+    }
+    assert unmatched.empty
+
+
+def test_plan_backfill_lists_unmatched_rows_and_skips_duplicate_ids(locations):
+    df = normalize_records([
+        legacy(1, 'Số 1, Cầu Giấy'),
+        legacy(2, 'Số 2, Phường Ba Đình', **{COL_PROVINCE: 'Tỉnh Không Có'}),
+        legacy(3, 'Số 3, Phường Ba Đình'),
+        legacy(3, 'Số 3, Phường Ba Đình'),
+    ])
+    changes, unmatched = plan_backfill(df, locations)
+    assert changes == {}
+    assert unmatched[['ID', 'Khối', 'Lý do']].values.tolist() == [
+        ['1', 'Thường trú', "Không tìm thấy Xã/Phường thuộc tỉnh"],
+        ['2', 'Thường trú', "Tỉnh không có trong danh mục"],
+    ]
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from analytics import org_progress, parse_backup_times, save_histogram
+from columns import COL_ORG
+from data_store import normalize_records
+from tests.conftest import make_record
+
+
+def test_parse_backup_times_reads_both_formats():
+    times = parse_backup_times(['2025-01-02 08:00:00', '03/01/2025 9:30:00', 'hỏng'])
+    assert times.tolist()[:2] == [pd.Timestamp(2025, 1, 2, 8), pd.Timestamp(2025, 1, 3, 9, 30)]
+    assert pd.isna(times.iloc[2])
+
+
+def test_org_progress_sorts_lowest_rate_first():
+    df = normalize_records([
+        make_record(1), make_record(2), make_record(3, **{COL_ORG: 'Chi bộ 2'}),
+        make_record(4, **{COL_ORG: ''}),
+    ])
+    progress = org_progress(df, {'1', '3'}, {'1': '2025-01-02 08:00:00', '3': '03/01/2025 09:00:00',
+                                              '9': '2025-01-05 08:00:00'})
+    assert progress['Tổ chức Đảng'].tolist() == ['(Chưa có)', 'Chi bộ 1', 'Chi bộ 2']
+    assert progress['Đã cập nhật'].tolist() == [0, 1, 1]
+    assert progress['Tỉ lệ (%)'].tolist() == [0.0, 50.0, 100.0]
+    assert progress['Lần lưu gần nhất'].tolist()[1:] == [pd.Timestamp(2025, 1, 2, 8), pd.Timestamp(2025, 1, 3, 9)]
+
+
+def test_org_progress_without_backup_rows():
+    progress = org_progress(normalize_records([make_record(1)]), set(), {})
+    assert progress['Đã cập nhật'].tolist() == [0]
+
+
+def test_save_histogram_counts_checkpoint_weights_and_fills_gaps():
+    histogram = save_histogram(['2025-01-01 08:00:00', '2025-01-01 20:00:00', '2025-01-03 08:00:00', 'x'],
+                               [1, 3, 2, 5])
+    assert histogram.tolist() == [4, 0, 2]
+    assert histogram.index[0] == pd.Timestamp(2025, 1, 1)
+    assert save_histogram([], []).empty
@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip('streamlit.testing.v1')
+
+from benchmark import APP_DIR, BACKEND_KEY, SimulatedMember, make_roster  # noqa: E402
+from quota import QuotaScheduler  # noqa: E402
+from storage import build_memory_workbook, is_rate_limited, register_memory_backend  # noqa: E402
+
+
+def render_rows(at):
+    """Tên các phần trong bảng thời gian xử lý Bước 3 ở Admin Dashboard."""
+    for frame in at.dataframe:
+        if 'Phần chạy lại' in frame.value.columns:
+            return set(frame.value['Phần chạy lại'])
+    return set()
+
+
+def test_full_runs_record_no_fragment_reruns(tmp_path, monkeypatch):
+    roster = make_roster(20)
+    register_memory_backend(BACKEND_KEY, build_memory_workbook(roster),
+                            QuotaScheduler(read_per_minute=600, write_per_minute=600,
+                                           is_rate_limited=is_rate_limited))
+    monkeypatch.chdir(APP_DIR)
+    session = SimulatedMember(roster[0], timeout=60, cache_dir=str(tmp_path))
+    assert session.open_and_search()
+    assert session.open_form()
+    session.at.run()  # Chạy lại cả trang ở Bước 3 lần nữa
+    assert not session.at.exception
+    assert session.open_admin()
+
+    rows = render_rows(session.at)
+    assert "Bước 3 - chạy lại cả trang" in rows
+    assert not [name for name in rows if name.startswith('Khối')]
@@ -0,0 +1,142 @@
+import json
+
+from backup_log import BackupTail, KIND_CHECKPOINT, compact, history, make_delta_row, parse_row
+from columns import ALL_COLUMNS
+
+HEADER = ['Thời gian', 'Loại', 'ID', 'Dữ liệu']
+
+
+def full_row(timestamp, record_id, **values):
+    fields = {col: '' for col in ALL_COLUMNS}
+    fields.update({'ID': record_id, **values})
+    return [timestamp] + [fields[col] for col in ALL_COLUMNS]
+
+
+def delta_row(timestamp, record_id, changes):
+    """Dòng delta như trên sheet (ghi USER_ENTERED nên dấu ' không còn trong ô)."""
+    row = make_delta_row(timestamp, record_id, changes)
+    row[0], row[2] = row[0].lstrip("'"), row[2].lstrip("'")
+    return row
+
+
+def sample_values():
+    return [
+        HEADER,
+        full_row('2025-01-01 08:00:00', '1', **{'Ghi chú': 'cũ', 'Dân tộc *': 'Kinh'}),
+        delta_row('2025-01-02 08:00:00', '1', {'Ghi chú': 'mới'}),
+        delta_row('2025-01-02 09:00:00', '2', {'Dân tộc *': 'Tày'}),
+        delta_row('2025-01-03 08:00:00', '1', {}),
+    ]
+
+
+def test_delta_row_keeps_time_and_id_as_text():
+    row = make_delta_row('2025-01-01 00:00:00', '007', {'A': 'x'})
+    assert row[0] == "'2025-01-01 00:00:00"
+    assert row[2] == "'007"
+    assert json.loads(row[3]) == {'A': 'x'}
+
+
+def test_parse_row_reads_legacy_full_rows_and_skips_broken_rows():
+    entry = parse_row(full_row('2025-01-01 08:00:00', '12.0', **{'Ghi chú': 'a'}))
+    assert entry.record_id == '12' and entry.kind == 'full'
+    assert entry.fields['Ghi chú'] == 'a'
+    assert parse_row(['2025-01-01', 'delta', '1', '{hỏng']) is None
+    assert parse_row(['', '', '']) is None
+
+
+def test_history_accumulates_state():
+    events = history(sample_values(), '1')
+    assert [e['kind'] for e in events] == ['full', 'delta', 'delta']
+    assert events[1]['changes'] == {'Ghi chú': 'mới'}
+    assert events[1]['state']['Ghi chú'] == 'mới'
+    assert events[1]['state']['Dân tộc *'] == 'Kinh'
+    assert events[2]['changes'] == {}
+
+
+def test_compact_folds_old_rows_into_one_checkpoint_per_id():
+    values = sample_values()
+    compacted, folded = compact(values, cutoff='2025-01-02 23:59:59')
+    assert folded == 3
+    assert compacted[0] == HEADER
+    kinds = [row[1] for row in compacted[1:]]
+    assert kinds == [KIND_CHECKPOINT, KIND_CHECKPOINT, 'delta']
+
+    # Lịch sử sau khi thu gọn vẫn ra cùng trạng thái cuối, số lần lưu được giữ
+    assert history(compacted, '1')[-1]['state'] == history(values, '1')[-1]['state']
+    checkpoint = parse_row(compacted[1])
+    assert checkpoint.record_id == '1' and checkpoint.saves == 2
+    assert checkpoint.first == '2025-01-01 08:00:00'
+    assert {parse_row(row).record_id for row in compacted[1:]} == {'1', '2'}
+
+
+def test_compact_reads_times_redisplayed_by_the_sheet():
+    # Dòng cũ ghi không có dấu ': Google Sheet đổi thành ngày và hiển thị lại dd/mm/yyyy
+    values = [
+        HEADER,
+        delta_row('2025-01-01 08:00:00', '1', {'Ghi chú': 'a'}),
+        delta_row('02/01/2025 08:00:00', '1', {'Ghi chú': 'b'}),
+        delta_row('03/01/2025 8:00:00', '1', {'Ghi chú': 'c'}),
+    ]
+    compacted, folded = compact(values, cutoff='2025-01-02 23:59:59')
+    assert folded == 2
+    checkpoint = parse_row(compacted[1])
+    assert checkpoint.timestamp == '2025-01-02 08:00:00'
+    assert checkpoint.first == '2025-01-01 08:00:00'
+    assert checkpoint.fields == {'Ghi chú': 'b'}
+    assert compacted[2] == values[3]
+
+
+def test_compact_keeps_unreadable_rows():
+    values = sample_values() + [['2025-01-01', 'delta', '3', '{hỏng']]
+    compacted, _ = compact(values)
+    assert ['2025-01-01', 'delta', '3', '{hỏng'] in compacted
+
+
+class FakeSheet:
+    def __init__(self, values):
+        self.values = values
+        self.reads = []
+
+    def read_range(self, start, end):
+        self.reads.append((start, end))
+        return self.values[start - 1:end]
+
+
+def test_backup_tail_reads_only_new_rows(clock):
+    sheet = FakeSheet(sample_values())
+    tail = BackupTail(sheet.read_range, chunk_size=2, min_interval=10, clock=clock.now)
+    assert tail.refresh() == 5
+    assert tail.updated_ids == {'1', '2'}
+    assert tail.row_count == 4
+    assert tail.last_saved['1'] == '2025-01-03 08:00:00'
+
+    sheet.values.append(delta_row('2025-01-04 08:00:00', '3', {}))
+    assert tail.refresh() == 0  # Chưa hết min_interval
+    clock.sleep(11)
+    sheet.reads.clear()
+    assert tail.refresh() == 1
+    assert sheet.reads == [(6, 7)]
+    assert tail.updated_ids == {'1', '2', '3'}
+
+
+def test_backup_tail_counts_checkpoint_saves_and_resyncs(clock):
+    compacted, _ = compact(sample_values())
+    sheet = FakeSheet(compacted)
+    tail = BackupTail(sheet.read_range, min_interval=0, resync_every=100, clock=clock.now)
+    tail.refresh()
+    _, weights = tail.save_events
+    assert sum(weights) == 4
+    generation = tail.generation
+
+    clock.sleep(101)
+    tail.refresh()
+    assert tail.generation == generation + 1
+    assert tail.row_count == 2
+
+
+def test_backup_tail_normalizes_redisplayed_times(clock):
+    sheet = FakeSheet([HEADER, delta_row('2025-01-03 08:00:00', '1', {}), delta_row('02/01/2025 9:30:00', '1', {})])
+    tail = BackupTail(sheet.read_range, min_interval=0, clock=clock.now)
+    tail.refresh()
+    assert tail.last_saved == {'1': '2025-01-03 08:00:00'}
+    assert tail.save_events[0] == ['2025-01-03 08:00:00', '2025-01-02 09:30:00']
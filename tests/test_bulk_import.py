@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from bulk_import import plan_import, plan_note_broadcast, read_import_file
+from columns import COL_CCCD, COL_DOB, COL_NOTE
+from data_store import normalize_records
+from tests.conftest import make_record
+
+COL_ETHNICITY = 'Dân tộc *'
+
+
+@pytest.fixture
+def df_main():
+    return normalize_records([make_record(1, **{COL_ETHNICITY: 'Kinh'}), make_record(2), make_record(3)])
+
+
+def upload(rows):
+    return pd.DataFrame(rows).fillna('').astype(str)
+
+
+def test_only_changed_cells_are_kept(df_main):
+    plan = plan_import(df_main, upload([
+        {'ID': '1', COL_ETHNICITY: 'Tày', COL_NOTE: ''},
+        {'ID': '2', COL_ETHNICITY: '', COL_NOTE: 'ghi chú'},
+    ]))
+    assert plan.changes == {'1': {COL_ETHNICITY: 'Tày'}, '2': {COL_NOTE: 'ghi chú'}}
+    assert plan.cell_count == 2
+    assert plan.preview.iloc[0].to_dict() == {'ID': '1', 'Họ và tên': 'Nguyễn Văn 1', 'Cột': COL_ETHNICITY,
+                                              'Giá trị cũ': 'Kinh', 'Giá trị mới': 'Tày'}
+
+
+def test_clear_blank_empties_cells(df_main):
+    plan = plan_import(df_main, upload([{'ID': '1', COL_ETHNICITY: ''}]), clear_blank=True)
+    assert plan.changes == {'1': {COL_ETHNICITY: ''}}
+
+
+def test_excel_values_are_normalized_before_comparing(df_main):
+    df_main.loc[0, COL_CCCD] = '012345678901'
+    data = f"ID,{COL_CCCD},{COL_DOB}\n1.0,12345678901.0,2000-02-01 00:00:00\n".encode('utf-8-sig')
+    upload_df = read_import_file(data, 'sua.csv')
+    assert upload_df.iloc[0].tolist() == ['1', '12345678901', '01/02/2000']
+    assert plan_import(df_main, upload_df).changes == {}
+
+
+def test_unknown_duplicate_and_ignored(df_main):
+    plan = plan_import(df_main, upload([
+        {'ID': '9', COL_NOTE: 'a', 'STT': '5', 'Cột lạ': 'x'},
+        {'ID': '2', COL_NOTE: 'lần 1', 'STT': '5', 'Cột lạ': 'x'},
+        {'ID': '2', COL_NOTE: 'lần 2', 'STT': '5', 'Cột lạ': 'x'},
+    ]))
+    assert plan.unknown_ids == ['9']
+    assert plan.duplicate_ids == ['2']
+    assert plan.ignored_columns == ['STT', 'Cột lạ']
+    assert plan.changes == {'2': {COL_NOTE: 'lần 2'}}
+    assert plan.n_rows == 2
+
+
+def test_duplicate_ids_on_sheet_are_not_touched():
+    df_main = normalize_records([make_record(1), make_record(1), make_record(2)])
+    plan = plan_import(df_main, upload([{'ID': '1', COL_NOTE: 'a'}, {'ID': '2', COL_NOTE: 'b'}]))
+    assert plan.unknown_ids == ['1']
+    assert plan.changes == {'2': {COL_NOTE: 'b'}}
+
+
+def test_file_without_usable_columns_is_rejected(df_main):
+    with pytest.raises(ValueError):
+        plan_import(df_main, upload([{COL_NOTE: 'a'}]))
+    with pytest.raises(ValueError):
+        plan_import(df_main, upload([{'ID': '1', 'STT': '1'}]))
+
+
+def test_read_csv_keeps_leading_zeros():
+    data = f"ID,{COL_CCCD}\n1,001099000001\n2,\n".encode('utf-8-sig')
+    df = read_import_file(data, 'sua.csv')
+    assert df[COL_CCCD].tolist() == ['001099000001', '']
+    with pytest.raises(ValueError):
+        read_import_file(data, 'sua.txt')
+
+
+def test_note_broadcast_skips_people_who_already_have_it(df_main):
+    df_main.loc[df_main['ID'] == '2', COL_NOTE] = 'Nộp ảnh'
+    assert plan_note_broadcast(df_main, ['1', '2', '9'], ' Nộp ảnh ') == {'1': {COL_NOTE: 'Nộp ảnh'}}
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from columns import COL_CCCD, COL_DOB, COL_NAME
+from data_store import SharedDataStore, diff_row_values, normalize_sheet_records
+from tests.conftest import make_record
+
+COL_PROVINCE = 'Thường trú (theo mô hình 2 cấp) - Tỉnh *'
+COL_STATUS = 'Trạng thái hoạt động'
+
+
+@pytest.fixture
+def store():
+    records = [make_record(i) for i in (1, 2, 3)]
+    return SharedDataStore(lambda: records, ttl=300)
+
+
+def test_category_columns_are_categorical(store):
+    df = store.get().df
+    assert isinstance(df[COL_PROVINCE].dtype, pd.CategoricalDtype)
+
+
+def test_apply_updates_before_first_load_skips_everything(store):
+    assert store.apply_updates([('1', {COL_NAME: 'X'})]) == (None, ['1'])
+
+
+def test_patch_many_adds_new_category_value(store):
+    old = store.get()
+    new, skipped = store.apply_updates([('1', {COL_PROVINCE: 'Tỉnh Nghệ An'}), ('2', {COL_STATUS: 'Đã chuyển'})])
+    assert skipped == []
+    assert isinstance(new.df[COL_PROVINCE].dtype, pd.CategoricalDtype)
+    assert new.find_rows('id', '1').iloc[0][COL_PROVINCE] == 'Tỉnh Nghệ An'
+    assert new.find_rows('id', '2').iloc[0][COL_STATUS] == 'Đã chuyển'
+    # Snapshot cũ không bị đổi (copy-on-write)
+    assert old.find_rows('id', '1').iloc[0][COL_PROVINCE] == 'Thành phố Hà Nội'
+    assert new.version > old.version
+
+
+def test_patch_many_skips_unknown_ids_and_updates_indexes(store):
+    store.get()
+    new, skipped = store.apply_updates([('9', {COL_NAME: 'X'}), ('3', {COL_CCCD: '012345678999'})])
+    assert skipped == ['9']
+    assert new.find_rows('cccd', '012345678999')[COL_NAME].tolist() == ['Nguyễn Văn 3']
+    assert new.find_rows('cccd', make_record(3)[COL_CCCD]).empty
+
+
+def test_patch_many_keeps_parsed_dates_in_sync(store):
+    old = store.get()
+    assert old.dates[COL_DOB].iloc[0] == pd.Timestamp(2000, 2, 1)
+    new = store.apply_update('1', {COL_DOB: '05/06/2001'})
+    assert new.dates[COL_DOB].iloc[0] == pd.Timestamp(2001, 6, 5)
+    assert old.dates[COL_DOB].iloc[0] == pd.Timestamp(2000, 2, 1)
+
+
+def test_numeric_cells_are_restored_and_flagged_for_repair():
+    records = [make_record(1, **{COL_CCCD: '12345678901'}), make_record(2, **{COL_CCCD: '123'})]
+    df, repairs = normalize_sheet_records(records)
+    assert df[COL_CCCD].tolist() == ['012345678901', '123']
+    assert repairs == {'1': [COL_CCCD]}
+
+    row = df.iloc[0]
+    unchanged = {col: str(row[col]) for col in df.columns}
+    assert diff_row_values(row, unchanged) == {}
+    assert diff_row_values(row, unchanged, repairs['1']) == {COL_CCCD: '012345678901'}
@@ -0,0 +1,53 @@
+import io
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from exports import ExportCache, export_bytes, mask_month_date
+
+
+def counting_build(calls, data):
+    def build():
+        calls.append(data)
+        return data
+    return build
+
+
+def test_cache_reuses_file_until_data_version_changes():
+    cache = ExportCache()
+    calls = []
+    assert cache.get_or_build(('full', 'csv', 1), counting_build(calls, b'v1')) == b'v1'
+    assert cache.get_or_build(('full', 'csv', 1), counting_build(calls, b'other')) == b'v1'
+    assert cache.get_or_build(('full', 'csv', 2), counting_build(calls, b'v2')) == b'v2'
+    assert calls == [b'v1', b'v2']
+
+
+def test_cache_drops_least_recently_used_file():
+    cache = ExportCache(max_entries=2)
+    calls = []
+    cache.get_or_build('a', counting_build(calls, b'a'))
+    cache.get_or_build('b', counting_build(calls, b'b'))
+    cache.get_or_build('a', counting_build(calls, b'a'))
+    cache.get_or_build('c', counting_build(calls, b'c'))
+    cache.get_or_build('a', counting_build(calls, b'a'))
+    cache.get_or_build('b', counting_build(calls, b'b'))
+    assert calls == [b'a', b'b', b'c', b'b']
+
+
+def test_export_formats_keep_vietnamese_text_and_leading_zeros():
+    df = pd.DataFrame({'Họ và tên': ['Nguyễn Văn A', None], 'CCCD': ['001099000001', '']})
+    assert export_bytes(df, 'csv').decode('utf-8-sig').splitlines()[1] == 'Nguyễn Văn A,001099000001'
+
+    sheet = load_workbook(io.BytesIO(export_bytes(df, 'xlsx', sheet_name='DS'))).active
+    assert sheet.title == 'DS'
+    assert [list(row) for row in sheet.iter_rows(values_only=True)] == [
+        ['Họ và tên', 'CCCD'], ['Nguyễn Văn A', '001099000001'], [None, None],
+    ]
+    with pytest.raises(ValueError):
+        export_bytes(df, 'pdf')
+
+
+def test_mask_month_date():
+    assert mask_month_date(' 05/06/2001 ') == '05/**/2001'
+    assert mask_month_date('2001') == '2001'
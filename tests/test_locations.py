@@ -0,0 +1,47 @@
+from locations import LocationIndex, province_key
+
+DATA = {
+    'Thành phố Hà Nội': ['Phường Ba Đình', 'Xã An Bình', 'Phường An Bình'],
+    'Tỉnh Tuyên Quang': ['Phường Hà Giang 1', 'Xã Bạch Đích'],
+    'Thành phố Hồ Chí Minh': ['Phường Sài Gòn', 'Phường Thủ Dầu Một'],
+}
+
+
+def test_province_key_drops_prefixes_and_accents():
+    assert province_key('Thành phố Hải Phòng') == province_key('TP. Hải Phòng') == province_key('hai phong')
+
+
+def test_province_names_with_prefixes_and_old_names_resolve():
+    index = LocationIndex(DATA)
+    assert index.resolve_province('ha noi') == 'Thành phố Hà Nội'
+    assert index.resolve_province('TP Hồ Chí Minh') == 'Thành phố Hồ Chí Minh'
+    assert index.province_index('Tỉnh Tuyên Quang') == 1
+
+
+def test_province_aliases_map_old_provinces_and_abbreviations():
+    index = LocationIndex(DATA)
+    assert index.resolve_province('Tỉnh Hà Giang') == 'Tỉnh Tuyên Quang'
+    assert index.resolve_province('Bình Dương') == 'Thành phố Hồ Chí Minh'
+    assert index.resolve_province('TPHCM') == index.resolve_province('Sài Gòn') == 'Thành phố Hồ Chí Minh'
+    assert index.resolve_province('HN') == 'Thành phố Hà Nội'
+    # Tỉnh mới không có trong danh mục thì tên cũ cũng không được nhận
+    assert index.resolve_province('Yên Bái') is None
+
+
+def test_commune_lookup_without_prefix_only_when_unambiguous(locations):
+    index = LocationIndex(DATA)
+    assert index.resolve_commune('Thành phố Hà Nội', 'ba dinh') == 'Phường Ba Đình'
+    assert index.resolve_commune('Thành phố Hà Nội', 'xa an binh') == 'Xã An Bình'
+    assert index.resolve_commune('Thành phố Hà Nội', 'An Bình') is None
+    assert index.commune_index('Tỉnh Không Có', 'Phường Ba Đình', default=-1) == -1
+    assert locations.resolve_commune('Tỉnh Nghệ An', 'Phường Ba Đình') is None
+
+
+def test_match_commune_accepts_one_close_name(locations):
+    assert locations.match_commune('Thành phố Hà Nội', 'Phường Nghĩa Đo') == 'Phường Nghĩa Đô'
+    assert locations.match_commune('Thành phố Hà Nội', 'soc sonn') == 'Xã Sóc Sơn'
+    assert locations.match_commune('Thành phố Hà Nội', 'Cầu Giấy') is None
+    # Nhiều tên gần giống nhau: không đoán
+    index = LocationIndex({'Tỉnh A': ['Xã Long Hòa', 'Xã Long Hòe']})
+    assert index.match_commune('Tỉnh A', 'Long Hòx') is None
+    assert index.match_commune('Tỉnh A', 'Long Hòaa') == 'Xã Long Hòa'
@@ -0,0 +1,85 @@
+import pytest
+
+from quota import READ, WRITE, QuotaExceeded, QuotaScheduler
+
+
+class RateLimited(Exception):
+    pass
+
+
+def limited():
+    raise RateLimited()
+
+
+def make_scheduler(clock, **options):
+    options.setdefault('read_per_minute', 60)
+    options.setdefault('write_per_minute', 60)
+    options.setdefault('headroom', 1.0)
+    return QuotaScheduler(is_rate_limited=lambda exc: isinstance(exc, RateLimited),
+                          clock=clock.now, sleep=clock.sleep, rand=lambda: 0.0, **options)
+
+
+def test_burst_then_refill_rate(clock):
+    scheduler = make_scheduler(clock, burst=3)
+    for _ in range(3):
+        scheduler.acquire(READ)
+    assert clock.now() == 0.0
+
+    # 60/phút = 1 token/giây sau khi dùng hết burst
+    scheduler.acquire(READ)
+    assert clock.now() == pytest.approx(1.0)
+    scheduler.acquire(READ)
+    assert clock.now() == pytest.approx(2.0)
+    assert scheduler.stats['waited_seconds'] == pytest.approx(2.0)
+
+
+def test_read_and_write_buckets_are_separate(clock):
+    scheduler = make_scheduler(clock, burst=1)
+    scheduler.acquire(READ)
+    scheduler.acquire(WRITE)
+    assert clock.now() == 0.0
+
+
+def test_rate_limited_call_pauses_bucket_and_retries(clock):
+    scheduler = make_scheduler(clock, burst=5, base_backoff=2.0)
+    calls = []
+
+    def flaky():
+        calls.append(clock.now())
+        if len(calls) < 3:
+            raise RateLimited()
+        return 'ok'
+
+    assert scheduler.call(flaky) == 'ok'
+    # rand=0: dừng 1 nửa cố định của 2s rồi 4s; bucket bị xả hết nên chờ thêm 1s để có token
+    assert calls == [0.0, pytest.approx(2.0), pytest.approx(5.0)]
+    assert scheduler.stats['rate_limited'] == 2
+    assert scheduler.stats['calls'] == 3
+
+
+def test_gives_up_after_max_retries(clock):
+    scheduler = make_scheduler(clock, max_retries=3)
+    with pytest.raises(QuotaExceeded):
+        scheduler.call(limited)
+    assert scheduler.stats['rate_limited'] == 3
+
+
+def test_other_errors_are_not_retried(clock):
+    scheduler = make_scheduler(clock)
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("sai")
+
+    with pytest.raises(ValueError):
+        scheduler.call(broken)
+    assert len(calls) == 1
+    assert scheduler.stats['rate_limited'] == 0
+
+
+def test_backoff_delay_is_capped(clock):
+    scheduler = QuotaScheduler(base_backoff=2.0, max_backoff=8.0, clock=clock.now, sleep=clock.sleep,
+                               rand=lambda: 1.0)
+    assert scheduler.backoff_delay(0) == pytest.approx(2.0)
+    assert scheduler.backoff_delay(10) == pytest.approx(8.0)
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from search_index import NameSearchIndex, fold_text, parse_dob_key
+
+NAMES = ['Nguyễn Văn Đức', 'Trần Thị Hạnh', 'Nguyễn Văn Dũng', 'Lê Minh Khánh']
+DOBS = ['05/06/2001', '01/02/2000', '05/06/2001', '12/03/2002']
+
+
+def make_index():
+    return NameSearchIndex(pd.Series(NAMES, index=[10, 11, 12, 13]), pd.Series(DOBS, index=[10, 11, 12, 13]))
+
+
+def test_fold_text_and_dob_formats():
+    assert fold_text('  Nguyễn  Văn ĐỨC ') == 'nguyen van duc'
+    assert parse_dob_key('5-6-2001') == parse_dob_key('2001-06-05') == parse_dob_key('05062001') == '20010605'
+    assert parse_dob_key('31/13/2001') == ''
+
+
+def test_exact_match_ignores_accents_and_date_format():
+    assert make_index().search('nguyen van duc', '2001-06-05') == [(10, 1.0)]
+
+
+def test_fuzzy_fallback_tolerates_typos_word_order_and_swapped_dates():
+    index = make_index()
+    typo = index.search('Nguyen Van Duk', '05/06/2001')
+    assert typo[0][0] == 10 and 0.6 <= typo[0][1] < 1.0
+    assert index.search('Hạnh Trần Thị', '01/02/2000') == [(11, 0.99)]
+    assert index.search('Tran Thi Hanh', '02/01/2000') == [(11, 0.95)]
+
+
+def test_fuzzy_fallback_requires_matching_dob_and_min_score():
+    index = make_index()
+    assert index.search('Nguyen Van Duk', '06/07/2001') == []
+    assert index.search('Phạm Quang Huy', '05/06/2001') == []
+    assert index.search('', '05/06/2001') == index.search('Lê Minh Khánh', 'x') == []
+
+
+def test_with_row_leaves_the_original_index_untouched():
+    index = make_index()
+    updated = index.with_row(11, 'Trần Thị Hà', '01/02/2000')
+    assert updated.search('Tran Thi Ha', '01/02/2000') == [(11, 1.0)]
+    assert index.search('Tran Thi Hanh', '01/02/2000') == [(11, 1.0)]
+    assert index.search('Tran Thi Ha', '01/02/2000') != [(11, 1.0)]
@@ -0,0 +1,93 @@
+import gspread
+import pytest
+
+from columns import ALL_COLUMNS, COL_CCCD, COL_ID, COL_NOTE
+from quota import QuotaScheduler
+from storage import (BACKUP_HEADER, GoogleSheetsBackend, MemoryWorkbook, SQLiteBackend, build_memory_workbook,
+                     is_rate_limited, parse_user_entered)
+from tests.conftest import make_record
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'members.sqlite3'))
+    backend.import_records([make_record(1), make_record(2), make_record(3)])
+    return backend
+
+
+def test_parse_user_entered_mimics_google_sheets():
+    assert parse_user_entered("'0123") == '0123'
+    assert parse_user_entered('0123') == 123
+    assert parse_user_entered('1.5') == 1.5
+    assert parse_user_entered('12/03/2001') == '12/03/2001'
+
+
+def test_memory_workbook_raises_429_over_quota(clock):
+    workbook = MemoryWorkbook(read_per_minute=2, clock=clock.now, sleep=clock.sleep)
+    workbook.add_worksheet('Sheet1', [['ID'], ['1']])
+    sheet = workbook.worksheet('Sheet1')
+    sheet.get_all_values()
+    with pytest.raises(gspread.exceptions.APIError) as error:
+        sheet.get_all_values()
+    assert is_rate_limited(error.value)
+    assert workbook.rate_limited == 1
+    assert workbook.calls == {'worksheet': 1, 'get_all_values': 2}
+
+    clock.sleep(60)
+    assert sheet.get_all_values() == [['ID'], ['1']]
+
+
+def test_scheduler_retries_simulated_429(clock):
+    workbook = build_memory_workbook([make_record(1)], read_per_minute=1, clock=clock.now, sleep=clock.sleep)
+    scheduler = QuotaScheduler(read_per_minute=600, is_rate_limited=is_rate_limited, max_retries=6,
+                               clock=clock.now, sleep=clock.sleep, rand=lambda: 1.0)
+    backend = GoogleSheetsBackend(workbook, scheduler)
+    assert backend.find_row('1') == 2  # Lời gọi worksheet() đã dùng hết quota phút này
+    assert workbook.rate_limited >= 1
+    assert clock.now() >= 60
+
+
+def test_memory_backend_writes_user_entered_values():
+    workbook = build_memory_workbook([make_record(1)])
+    backend = GoogleSheetsBackend(workbook, QuotaScheduler(is_rate_limited=is_rate_limited))
+    cccd_col = ALL_COLUMNS.index(COL_CCCD)
+    backend.update_cells([(2, cccd_col, ["'012345678901"])])
+    backend.append_backup_rows([["'2025-01-01 08:00:00", 'delta', "'1", '{}']])
+    assert backend.read_main_records()[0][COL_CCCD] == '012345678901'
+    assert backend.read_backup_values()[1][:4] == ['2025-01-01 08:00:00', 'delta', '1', '{}']
+
+
+def test_sqlite_backend_round_trip(sqlite_backend):
+    token = sqlite_backend.change_token()
+    records = sqlite_backend.read_main_records()
+    assert [r[COL_ID] for r in records] == ['1', '2', '3']
+    assert records[0] == {col: str(value) for col, value in make_record(1).items()}
+    assert sqlite_backend.find_row('3') == 4
+    assert sqlite_backend.find_row('9') is None
+
+    note_col = ALL_COLUMNS.index(COL_NOTE)
+    sqlite_backend.update_cells([(3, note_col, ["'007"])])
+    assert sqlite_backend.read_main_records()[1][COL_NOTE] == '007'
+    assert sqlite_backend.change_token() != token
+
+
+def test_sqlite_backend_backup_ranges(sqlite_backend):
+    rows = [[f"'2025-01-0{i} 08:00:00", 'delta', f"'{i}", '{}'] for i in (1, 2, 3)]
+    sqlite_backend.append_backup_rows(rows)
+    values = sqlite_backend.read_backup_values()
+    assert values[0] == BACKUP_HEADER
+    assert values[1] == ['2025-01-01 08:00:00', 'delta', '1', '{}']
+    assert sqlite_backend.read_backup_range(3, 10) == values[2:]
+    assert sqlite_backend.read_backup_range(1, 2) == values[:2]
+
+    sqlite_backend.rewrite_backup_values(values[:2])
+    assert sqlite_backend.read_backup_values() == values[:2]
+
+
+def test_read_ids_returns_live_ids_per_row(sqlite_backend):
+    workbook = build_memory_workbook([make_record(1), make_record(2), make_record(3)])
+    sheets = GoogleSheetsBackend(workbook, QuotaScheduler(is_rate_limited=is_rate_limited))
+    for backend in (sheets, sqlite_backend):
+        assert backend.read_ids([]) == {}
+        assert backend.read_ids([4, 2, 2, 9]) == {2: '1', 4: '3', 9: ''}
+    assert workbook.calls['batch_get'] == 1  # Nhiều dòng chỉ tốn 1 lời gọi
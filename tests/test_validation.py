@@ -0,0 +1,75 @@
+from columns import COL_CCCD, COL_DOB, COL_PARTY_CARD
+from data_store import normalize_records, parse_date_columns
+from tests.conftest import make_record
+from validation import COL_JOINED, COL_OFFICIAL, summarize_issues, validate_roster
+
+TODAY = '2025-06-01'
+
+
+def issues_for(records, locations):
+    df = normalize_records(records)
+    return validate_roster(df, parse_date_columns(df), locations, today=TODAY)
+
+
+def errors(issues, record_id):
+    return sorted(issues.loc[issues['ID'] == record_id, 'Lỗi'])
+
+
+def test_clean_roster_has_no_issues(locations):
+    issues = issues_for([make_record(1), make_record(2)], locations)
+    assert issues.empty
+
+
+def test_twelve_digit_checks_use_the_stored_value(locations):
+    issues = issues_for([
+        make_record(1, **{COL_CCCD: '12345678901'}),  # Mất 1 số 0 đầu: tự thêm lại, hợp lệ
+        make_record(2, **{COL_CCCD: '123'}),
+        make_record(3, **{COL_CCCD: '0123ABC'}),
+        make_record(4, **{COL_PARTY_CARD: '12345'}),
+    ], locations)
+    assert errors(issues, '1') == []
+    assert len(errors(issues, '2')) == 1 and 'thiếu số' in errors(issues, '2')[0]
+    assert errors(issues, '3') == ["CCCD phải gồm đúng 12 chữ số"]
+    assert len(errors(issues, '4')) == 1 and errors(issues, '4')[0].startswith("Số thẻ Đảng")
+
+
+def test_duplicate_cccd_is_reported_for_both_people(locations):
+    same = {COL_CCCD: '001099000001'}
+    issues = issues_for([make_record(1, **same), make_record(2, **same)], locations)
+    assert errors(issues, '1') == errors(issues, '2') == ["Trùng CCCD với người khác"]
+
+
+def test_date_checks(locations):
+    issues = issues_for([
+        make_record(1, **{COL_DOB: '31/02/2000'}),
+        make_record(2, **{COL_JOINED: '01/01/2030'}),
+        make_record(3, **{COL_JOINED: '01/01/2020', COL_OFFICIAL: '01/01/2019'}),
+        make_record(4, **{COL_JOINED: '01/01/1999'}),
+    ], locations)
+    assert errors(issues, '1') == ["Ngày không đúng định dạng dd/mm/yyyy"]
+    assert errors(issues, '2') == ["Ngày ở tương lai"]
+    assert errors(issues, '3') == ["Ngày vào Đảng chính thức phải sau ngày vào Đảng"]
+    assert errors(issues, '4') == ["Ngày vào Đảng phải sau ngày sinh"]
+
+
+def test_address_checks(locations):
+    province = 'Thường trú (theo mô hình 2 cấp) - Tỉnh *'
+    issues = issues_for([
+        make_record(1, **{'Temp_XaPhuong_ThuongTru': 'ba dinh'}),  # Không dấu, thiếu "Phường": vẫn nhận
+        make_record(2, **{'Temp_XaPhuong_ThuongTru': 'Phường Vinh Phú'}),
+        make_record(3, **{province: 'Tỉnh Không Có'}),
+        make_record(4, **{'Thường trú (theo mô hình 2 cấp) - Quốc gia *': 'Lào', province: 'Viêng Chăn'}),
+    ], locations)
+    assert errors(issues, '1') == []
+    assert errors(issues, '2') == ["Thường trú: Xã/Phường không thuộc tỉnh đã chọn"]
+    assert errors(issues, '3') == ["Thường trú: Tỉnh không có trong danh mục"]
+    assert errors(issues, '4') == []
+
+
+def test_summarize_issues_counts_people(locations):
+    same = {COL_CCCD: '001099000001'}
+    issues = issues_for([make_record(1, **same), make_record(2, **same), make_record(3, **{COL_DOB: 'x'})],
+                        locations)
+    summary = summarize_issues(issues).set_index('Lỗi')
+    assert summary.loc["Trùng CCCD với người khác", 'Số người'] == 2
+    assert summary.iloc[0]['Số lỗi'] == 2
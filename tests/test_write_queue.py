@@ -0,0 +1,134 @@
+import pytest
+
+from write_queue import JournalEntry, SaveJournal, WriteBehindFlusher, coalesce_changes
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return SaveJournal(str(tmp_path / 'journal.db'))
+
+
+def test_journal_keeps_entries_until_both_parts_are_written(journal):
+    entry_id = journal.enqueue('1', {'Ghi chú': 'a'}, backup_row=['t', 'delta', "'1", '{}'])
+    assert journal.pending_changes() == [('1', {'Ghi chú': 'a'})]
+    assert journal.pending_backup_ids() == {'1'}
+
+    journal.mark_main_done([entry_id])
+    assert journal.pending_changes() == []
+    assert [e.id for e in journal.pending()] == [entry_id]
+
+    journal.mark_backup_done([entry_id])
+    assert journal.pending() == []
+    assert journal.stats() == {'pending': 0, 'failed': 0}
+
+
+def test_entry_without_backup_row_only_waits_for_sheet1(journal):
+    journal.enqueue('1', {'Ghi chú': 'a'})
+    assert journal.pending_backup_ids() == set()
+    [entry] = journal.pending()
+    assert entry.backup_done and entry.backup_row is None
+
+
+def test_journal_survives_reopen(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    SaveJournal(path).enqueue_many([('1', {'A': 'x'}, None), ('2', {'A': 'y'}, None)])
+    assert SaveJournal(path).pending_changes() == [('1', {'A': 'x'}), ('2', {'A': 'y'})]
+
+
+def test_coalesce_changes_later_save_wins_per_column():
+    entries = [
+        JournalEntry(1, '1', {'A': 'old', 'B': 'b'}, None, 1, 0),
+        JournalEntry(2, '2', {'A': 'x'}, None, 1, 0),
+        JournalEntry(3, '1', {'A': 'new'}, None, 1, 0),
+    ]
+    merged, entry_ids = coalesce_changes(entries)
+    assert merged == {'1': {'A': 'new', 'B': 'b'}, '2': {'A': 'x'}}
+    assert entry_ids == {'1': [1, 3], '2': [2]}
+
+
+def make_flusher(journal, backup=None, main=None, **options):
+    return WriteBehindFlusher(journal, backup or (lambda rows: None), main or (lambda changes: set()), **options)
+
+
+def test_flush_writes_backup_and_main_in_one_batch(journal):
+    backup_calls, main_calls = [], []
+    journal.enqueue('1', {'A': 'x'}, backup_row=['r1'])
+    journal.enqueue('1', {'A': 'y'}, backup_row=['r2'])
+    flusher = make_flusher(journal, backup_calls.append, lambda changes: main_calls.append(changes) or set())
+
+    assert flusher.flush_once() == 2
+    assert backup_calls == [[['r1'], ['r2']]]
+    assert main_calls == [{'1': {'A': 'y'}}]
+    assert journal.pending() == []
+
+
+def test_backup_failure_does_not_block_sheet1(journal):
+    journal.enqueue('1', {'A': 'x'}, backup_row=['r1'])
+    broken = [True]
+
+    def backup(rows):
+        if broken:
+            raise RuntimeError("Backup lỗi")
+
+    flusher = make_flusher(journal, backup)
+    with pytest.raises(RuntimeError):
+        flusher.flush_once()
+    assert journal.pending_changes() == []  # Sheet1 đã ghi xong
+    assert journal.pending_backup_ids() == {'1'}  # Backup giữ lại để ghi lần sau
+
+    broken.clear()
+    flusher.flush_once()
+    assert journal.pending() == []
+
+
+def test_sheet1_failure_does_not_block_backup(journal):
+    journal.enqueue('1', {'A': 'x'}, backup_row=['r1'])
+
+    def broken_main(changes):
+        raise RuntimeError("Sheet1 lỗi")
+
+    flusher = make_flusher(journal, main=broken_main)
+    with pytest.raises(RuntimeError):
+        flusher.flush_once()
+    assert journal.pending_backup_ids() == set()
+    assert journal.pending_changes() == [('1', {'A': 'x'})]
+
+
+def test_missing_ids_are_kept_as_failed(journal):
+    journal.enqueue('1', {'A': 'x'})
+    journal.enqueue('2', {'A': 'y'})
+    flusher = make_flusher(journal, main=lambda changes: {'2'})
+    flusher.flush_once()
+    assert journal.stats() == {'pending': 0, 'failed': 1}
+    assert journal.pending() == []
+
+
+def test_sheet1_is_held_until_main_ready(journal):
+    ready = []
+    main_calls = []
+    journal.enqueue('1', {'A': 'x'}, backup_row=['r1'])
+    flusher = make_flusher(journal, main=lambda changes: main_calls.append(changes) or set(),
+                           main_ready=lambda: bool(ready))
+
+    assert flusher.flush_once() == 1
+    assert main_calls == []
+    assert journal.pending_changes() == [('1', {'A': 'x'})]
+
+    ready.append(True)
+    flusher.flush_once()
+    assert main_calls == [{'1': {'A': 'x'}}]
+    assert journal.pending() == []
+
+
+
+def test_held_sheet1_entries_do_not_block_newer_backup_rows(journal):
+    backup_calls = []
+    journal.enqueue_many([(str(i), {'A': 'x'}, ['r%d' % i]) for i in range(3)])
+    flusher = make_flusher(journal, backup=backup_calls.append, batch_limit=2, main_ready=lambda: False)
+    flusher.flush_once()
+    flusher.flush_once()
+    journal.enqueue('9', {'A': 'y'}, backup_row=['r9'])
+    assert flusher.flush_once() == 1
+    assert backup_calls == [[['r0'], ['r1']], [['r2']], [['r9']]]
+    assert journal.pending_backup_ids() == set()
+    assert len(journal.pending_changes()) == 4
@@ -0,0 +1,38 @@
+"""Thống kê thời gian xử lý phía máy chủ theo tên (vd mỗi lần chạy lại 1 khối của form).
+
+Dùng chung cả tiến trình, thread-safe; chỉ giữ `max_samples` mẫu gần nhất mỗi tên.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class TimingStats:
+    def __init__(self, max_samples=500):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.max_samples)
+                self._counts[name] = 0
+            self._samples[name].append(seconds)
+            self._counts[name] += 1
+
+    def summary(self):
+        """list dict {name, count, mean_ms, p50_ms, p95_ms} theo thứ tự ghi lần đầu."""
+        with self._lock:
+            items = [(name, list(samples), self._counts[name]) for name, samples in self._samples.items()]
+        result = []
+        for name, samples, count in items:
+            ms = np.array(samples) * 1000
+            result.append({
+                'name': name, 'count': count, 'mean_ms': round(float(ms.mean()), 1),
+                'p50_ms': round(float(np.percentile(ms, 50)), 1),
+                'p95_ms': round(float(np.percentile(ms, 95)), 1),
+            })
+        return result
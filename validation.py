@@ -0,0 +1,149 @@
+"""Kiểm tra chất lượng dữ liệu cho cả danh sách (vector hóa bằng pandas, không lặp từng dòng).
+
+Các lỗi được kiểm tra:
+- Số định danh (CCCD) phải gồm đúng 12 chữ số; số thẻ Đảng (HD38) phải gồm 12 chữ số.
+- Ngày dd/mm/yyyy phải đọc được, không ở tương lai, đúng thứ tự
+  Sinh ngày < Ngày vào Đảng < Ngày vào Đảng chính thức.
+- Tỉnh phải có trong danh mục, Xã/Phường phải thuộc Tỉnh đã chọn (vietnam_data.json).
+- CCCD / số thẻ Đảng bị trùng giữa nhiều người.
+
+Kết quả là bảng lỗi (mỗi dòng 1 lỗi của 1 người). app.py cache theo phiên bản dữ liệu.
+"""
+import numpy as np
+import pandas as pd
+
+from columns import COL_CCCD, COL_DOB, COL_ID, COL_NAME, COL_ORG, COL_PARTY_CARD, DATE_COLS
+
+COL_JOINED = 'Ngày vào Đảng* (dd/mm/yyyy)'
+COL_OFFICIAL = 'Ngày vào Đảng chính thức* (dd/mm/yyyy)'
+
+# (tên khối, cột Quốc gia, cột Tỉnh, [các cột chứa Xã/Phường theo thứ tự ưu tiên])
+ADDRESS_BLOCKS = [
+    ('Khai sinh', 'Nơi đăng ký khai sinh - Quốc gia *', 'Nơi đăng ký khai sinh - Tỉnh *',
+     ['Temp_XaPhuong_KhaiSinh', 'Nơi đăng ký khai sinh - Địa chỉ chi tiết *']),
+    ('Quê quán', 'Quê quán (theo mô hình 2 cấp) - Quốc gia *', 'Quê quán (theo mô hình 2 cấp) - Tỉnh *',
+     ['Quê quán (theo mô hình 2 cấp) - Địa chỉ chi tiết *']),
+    ('Thường trú', 'Thường trú (theo mô hình 2 cấp) - Quốc gia *', 'Thường trú (theo mô hình 2 cấp) - Tỉnh *',
+     ['Temp_XaPhuong_ThuongTru']),
+]
+
+ISSUE_COLUMNS = ['ID', 'Họ và tên', 'Tổ chức Đảng', 'Trường', 'Lỗi', 'Giá trị']
+
+_TWELVE_DIGITS = r'^\d{12}$'
+
+
+def _text(df, col):
+    """Cột dạng chuỗi đã strip (trống / nan -> ''). Cột category chỉ xử lý danh mục rồi map theo mã."""
+    if col not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    series = df[col]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories.astype(str).str.strip().to_numpy(dtype=object)
+        values = np.append(categories, '')[series.cat.codes.to_numpy()]  # Mã -1 (thiếu) -> ''
+        series = pd.Series(values, index=df.index, dtype=object)
+    else:
+        series = series.astype(str).str.strip()
+    return series.replace({'nan': '', 'None': ''})
+
+
+def _collect(frames, df, mask, field, message, values):
+    """Thêm các dòng lỗi (mask True) vào frames."""
+    if not mask.any():
+        return
+    frames.append(pd.DataFrame({
+        'label': df.index[mask.to_numpy()],
+        'Trường': field,
+        'Lỗi': message,
+        'Giá trị': values[mask].astype(str).to_numpy(),
+    }))
+
+
+def _check_twelve_digits(frames, df, col, field, message):
+    text = _text(df, col)
+    bad = (text != '') & ~text.str.fullmatch(_TWELVE_DIGITS)
+    # Dữ liệu chỉ thêm lại 1 số 0 đầu bị mất (data_store.restore_leading_zero): số ngắn hơn được giữ nguyên
+    short = bad & text.str.fullmatch(r'\d{1,11}')
+    _collect(frames, df, bad & ~short, field, message, text)
+    _collect(frames, df, short, field, f"{message} (thiếu số, có thể ô lưu dạng số trên sheet đã mất số 0 đầu)", text)
+    # Trùng số giữa nhiều người (chỉ xét giá trị hợp lệ)
+    valid = text.where(~bad & (text != ''))
+    duplicated = valid.notna() & valid.duplicated(keep=False)
+    _collect(frames, df, duplicated, field, f"Trùng {field} với người khác", text)
+
+
+def _check_dates(frames, df, dates, today):
+    for col in DATE_COLS:
+        if col not in df.columns or col not in dates.columns:
+            continue
+        raw = _text(df, col)
+        parsed = dates[col]
+        _collect(frames, df, (raw != '') & parsed.isna(), col, "Ngày không đúng định dạng dd/mm/yyyy", raw)
+        _collect(frames, df, parsed > today, col, "Ngày ở tương lai", raw)
+
+    order = [(COL_DOB, COL_JOINED, "Ngày vào Đảng phải sau ngày sinh"),
+             (COL_JOINED, COL_OFFICIAL, "Ngày vào Đảng chính thức phải sau ngày vào Đảng")]
+    for earlier, later, message in order:
+        if earlier in dates.columns and later in dates.columns:
+            wrong = dates[later] <= dates[earlier]  # NaT so sánh luôn False
+            _collect(frames, df, wrong, later, message, _text(df, later))
+
+
+def _check_addresses(frames, df, locations):
+    # Khóa "tỉnh|xã" của mọi cặp hợp lệ: kiểm tra cả cột bằng 1 lần isin
+    valid_keys = {f"{province}|{commune}" for province, communes in locations.communes.items()
+                  for commune in communes}
+    for block, col_country, col_province, commune_cols in ADDRESS_BLOCKS:
+        if col_province not in df.columns:
+            continue
+        in_vietnam = _text(df, col_country).str.casefold().isin(['việt nam', 'viet nam', ''])
+        province_raw = _text(df, col_province)
+        # Ít giá trị khác nhau: chuẩn hóa từng giá trị 1 lần rồi map lại
+        resolved = province_raw.map({p: locations.resolve_province(p) for p in province_raw.unique()})
+        unknown = in_vietnam & (province_raw != '') & resolved.isna()
+        _collect(frames, df, unknown, col_province, f"{block}: Tỉnh không có trong danh mục", province_raw)
+
+        commune = pd.Series('', index=df.index, dtype=object)
+        for col in reversed(commune_cols):  # Cột đứng trước được ưu tiên
+            value = _text(df, col)
+            commune = commune.mask(value != '', value)
+        checkable = in_vietnam & resolved.notna() & (commune != '')
+        if not checkable.any():
+            continue
+        keys = pd.Series(resolved.fillna('').to_numpy(dtype=object) + '|' + commune.to_numpy(dtype=object),
+                         index=df.index, dtype=object)  # object: isin bằng bảng băm
+        wrong = checkable & ~keys.isin(valid_keys)
+        if wrong.any():
+            # Khớp chính xác thất bại: thử so khớp mềm (không dấu / bỏ "Phường", "Xã") cho riêng các dòng này
+            labels = wrong.index[wrong.to_numpy()]
+            candidates = list(zip(resolved[labels], commune[labels]))
+            soft = {pair: locations.resolve_commune(*pair) is not None for pair in set(candidates)}
+            wrong.loc[labels[[soft[pair] for pair in candidates]]] = False
+        _collect(frames, df, wrong, commune_cols[0], f"{block}: Xã/Phường không thuộc tỉnh đã chọn",
+                 province_raw + ' / ' + commune)
+
+
+def validate_roster(df, dates, locations, today=None):
+    """Kiểm tra cả danh sách. dates: các cột ngày đã parse (DataSnapshot.dates);
+    locations: LocationIndex. Trả về DataFrame lỗi theo ISSUE_COLUMNS."""
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    frames = []
+    _check_twelve_digits(frames, df, COL_CCCD, 'CCCD', "CCCD phải gồm đúng 12 chữ số")
+    _check_twelve_digits(frames, df, COL_PARTY_CARD, 'Số thẻ Đảng', "Số thẻ Đảng phải gồm 12 chữ số (HD38)")
+    _check_dates(frames, df, dates, today)
+    _check_addresses(frames, df, locations)
+
+    if not frames:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    issues = pd.concat(frames, ignore_index=True)
+    labels = issues.pop('label')
+    people = df.loc[labels, [COL_ID, COL_NAME, COL_ORG]].astype(str).to_numpy()
+    issues.insert(0, 'ID', people[:, 0])
+    issues.insert(1, 'Họ và tên', people[:, 1])
+    issues.insert(2, 'Tổ chức Đảng', people[:, 2])
+    return issues.sort_values(['Tổ chức Đảng', 'ID'], kind='stable').reset_index(drop=True)[ISSUE_COLUMNS]
+
+
+def summarize_issues(issues):
+    """Số lỗi theo loại (giảm dần)."""
+    return (issues.groupby('Lỗi').agg(**{'Số lỗi': ('ID', 'size'), 'Số người': ('ID', 'nunique')})
+            .sort_values('Số lỗi', ascending=False).reset_index())
@@ -0,0 +1,264 @@
+"""Hàng đợi ghi (write-behind) có nhật ký bền vững bằng SQLite.
+
+- Lưu của người dùng được ghi vào file SQLite rồi xác nhận ngay (không chờ Google).
+- 1 luồng nền cứ vài giây gom các bản ghi đang chờ và ghi 2 phần song song
+  (mỗi lô chỉ mất khoảng 1 lượt gọi API thay vì 2):
+    + Backup: 1 lệnh append nhiều dòng.
+    + Sheet1: gộp các lần lưu cùng ID (lần sau ghi đè lần trước), 1 lệnh batch_update.
+  Mỗi phần đánh dấu xong riêng: phần này lỗi không làm mất / chặn phần kia.
+- Bản ghi chỉ bị xóa khỏi nhật ký sau khi đã ghi xong cả 2 phần, nên nếu tiến
+  trình khởi động lại giữa chừng thì lần sau sẽ ghi tiếp (không mất dữ liệu;
+  dòng Backup có thể bị lặp lại 1 lần nếu dừng đúng lúc vừa append xong).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Trạng thái phần ghi Sheet1 của 1 bản ghi
+MAIN_PENDING = 0
+MAIN_DONE = 1
+MAIN_FAILED = 2  # Không tìm thấy ID trên Sheet1 - giữ lại để Admin kiểm tra
+
+
+class JournalEntry:
+    def __init__(self, entry_id, record_id, changes, backup_row, backup_done, main_state):
+        self.id = entry_id
+        self.record_id = record_id
+        self.changes = changes        # dict cột -> giá trị (chưa thêm dấu ')
+        self.backup_row = backup_row  # list các ô cần append vào Backup (None nếu không cần)
+        self.backup_done = backup_done
+        self.main_state = main_state
+
+
+class SaveJournal:
+    """Nhật ký các lần lưu chưa ghi xong lên Google Sheet."""
+
+    def __init__(self, path):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    record_id TEXT NOT NULL,
+                    changes TEXT NOT NULL,
+                    backup_row TEXT,
+                    backup_done INTEGER NOT NULL DEFAULT 0,
+                    main_state INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, record_id, changes, backup_row=None):
+        """Ghi 1 lần lưu vào nhật ký (đã commit xuống đĩa khi hàm trả về)."""
+        return self.enqueue_many([(record_id, changes, backup_row)])[0]
+
+    def enqueue_many(self, items):
+        """Ghi nhiều lần lưu trong 1 transaction. items: [(record_id, changes, backup_row)]"""
+        now = time.time()
+        ids = []
+        with self._connect() as conn:
+            for record_id, changes, backup_row in items:
+                cur = conn.execute(
+                    "INSERT INTO entries (record_id, changes, backup_row, backup_done, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (str(record_id), json.dumps(changes, ensure_ascii=False),
+                     None if backup_row is None else json.dumps(backup_row, ensure_ascii=False),
+                     1 if backup_row is None else 0, now),
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    def pending(self, limit=500, backup_only=False):
+        """Các bản ghi chưa ghi xong, theo thứ tự lưu.
+        backup_only=True: chỉ lấy bản ghi chưa ghi Backup (bỏ qua phần Sheet1 đang giữ lại)."""
+        where = "backup_done = 0" if backup_only else f"backup_done = 0 OR main_state = {MAIN_PENDING}"
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, record_id, changes, backup_row, backup_done, main_state FROM entries "
+                f"WHERE {where} ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            JournalEntry(r[0], r[1], json.loads(r[2]), json.loads(r[3]) if r[3] else None, r[4], r[5])
+            for r in rows
+        ]
+
+    def pending_changes(self):
+        """[(record_id, changes)] chưa ghi lên Sheet1 - dùng để phủ lên dữ liệu vừa tải lại."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT record_id, changes FROM entries WHERE main_state = ? ORDER BY id",
+                (MAIN_PENDING,),
+            ).fetchall()
+        return [(r[0], json.loads(r[1])) for r in rows]
+
+    def pending_backup_ids(self):
+        """Tập ID đã lưu nhưng chưa kịp ghi vào Backup."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT DISTINCT record_id FROM entries WHERE backup_done = 0").fetchall()
+        return {r[0] for r in rows}
+
+    def mark_backup_done(self, entry_ids):
+        self._update_many("UPDATE entries SET backup_done = 1 WHERE id = ?", entry_ids)
+
+    def mark_main_done(self, entry_ids, state=MAIN_DONE):
+        self._update_many(f"UPDATE entries SET main_state = {int(state)} WHERE id = ?", entry_ids)
+
+    def record_failure(self, entry_ids, error):
+        self._update_many(
+            "UPDATE entries SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+            entry_ids, prefix=(str(error)[:500],),
+        )
+
+    def _update_many(self, sql, entry_ids, prefix=()):
+        if not entry_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany(sql, [prefix + (entry_id,) for entry_id in entry_ids])
+            conn.execute("DELETE FROM entries WHERE backup_done = 1 AND main_state = ?", (MAIN_DONE,))
+
+    def stats(self):
+        """Số bản ghi đang chờ / lỗi (hiển thị cho Admin)."""
+        with self._connect() as conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE backup_done = 0 OR main_state = ?", (MAIN_PENDING,)
+            ).fetchone()[0]
+            failed = conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE main_state = ?", (MAIN_FAILED,)
+            ).fetchone()[0]
+        return {'pending': pending, 'failed': failed}
+
+
+def coalesce_changes(entries):
+    """Gộp thay đổi theo ID: lần lưu sau ghi đè từng cột của lần trước.
+    Trả về (dict record_id -> changes, dict record_id -> [entry id])"""
+    merged = {}
+    entry_ids = {}
+    for entry in entries:
+        merged.setdefault(entry.record_id, {}).update(entry.changes)
+        entry_ids.setdefault(entry.record_id, []).append(entry.id)
+    return merged, entry_ids
+
+
+class WriteBehindFlusher:
+    """Luồng nền gom và đẩy nhật ký lên Google Sheet.
+
+    append_backup_rows(rows): append nhiều dòng vào Backup (1 lệnh).
+    write_main_changes(changes_by_id): ghi Sheet1 (1 batch_update), trả về tập ID
+        không tìm thấy trên sheet.
+    max_workers: số phần được ghi cùng lúc (1 = tuần tự như trước).
+    main_ready: (tùy chọn) hàm trả về False khi chưa được ghi Sheet1 (vd số dòng chưa
+        đối chiếu với sheet); khi đó chỉ ghi Backup, phần Sheet1 giữ lại trong nhật ký.
+    """
+
+    def __init__(self, journal, append_backup_rows, write_main_changes, interval=3.0, batch_limit=500,
+                 max_workers=2, main_ready=None):
+        self.journal = journal
+        self._append_backup_rows = append_backup_rows
+        self._write_main_changes = write_main_changes
+        self._main_ready = main_ready
+        self.interval = interval
+        self.batch_limit = batch_limit
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="write-behind")
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.last_flush_at = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Yêu cầu đẩy sớm (không chờ hết chu kỳ)."""
+        self._wake.set()
+
+    def _run(self):
+        delay = self.interval
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                while self.flush_once() >= self.batch_limit:
+                    pass
+                delay = self.interval
+                self.last_error = None
+            except Exception as e:
+                # Giữ nguyên nhật ký, thử lại sau (giãn dần tối đa 60s)
+                self.last_error = str(e)
+                delay = min(delay * 2, 60)
+
+    def run_exclusive(self, fn):
+        """Chạy fn() khi không có lô nào đang được đẩy (vd thu gọn sheet Backup)."""
+        with self._flush_lock:
+            return fn()
+
+    def flush_once(self):
+        """Đẩy 1 lô bản ghi. Trả về số bản ghi đã xử lý (không tính phần Sheet1 đang giữ lại)."""
+        with self._flush_lock:
+            entries = self.journal.pending(self.batch_limit)
+            if not entries:
+                return 0
+            main_ready = True
+            if any(e.main_state == MAIN_PENDING for e in entries) and self._main_ready is not None:
+                main_ready = self._main_ready()
+            if not main_ready:
+                # Lấy lại lô chỉ gồm phần Backup, để các lần lưu đang giữ lại phần Sheet1
+                # không chiếm hết lô và chặn các dòng Backup mới hơn
+                entries = self.journal.pending(self.batch_limit, backup_only=True)
+
+            # Backup và Sheet1 ghi song song; chờ cả 2 xong rồi mới báo lỗi (nếu có)
+            # nên Backup vẫn được ghi khi Sheet1 lỗi và ngược lại
+            backup_entries = [e for e in entries if not e.backup_done and e.backup_row]
+            main_entries = [e for e in entries if e.main_state == MAIN_PENDING] if main_ready else []
+            jobs = []
+            if backup_entries:
+                jobs.append(self._pool.submit(self._flush_backup, backup_entries))
+            if main_entries:
+                jobs.append(self._pool.submit(self._flush_main, main_entries))
+            errors = [job.exception() for job in jobs]
+            for error in errors:
+                if error is not None:
+                    raise error
+
+            self.last_flush_at = time.time()
+            return len({e.id for e in backup_entries} | {e.id for e in main_entries})
+
+    def _flush_backup(self, entries):
+        """Backup: 1 lệnh append cho cả lô."""
+        try:
+            self._append_backup_rows([e.backup_row for e in entries])
+        except Exception as e:
+            self.journal.record_failure([x.id for x in entries], e)
+            raise
+        self.journal.mark_backup_done([e.id for e in entries])
+
+    def _flush_main(self, entries):
+        """Sheet1: gộp theo ID, 1 batch_update."""
+        merged, entry_ids = coalesce_changes(entries)
+        try:
+            missing = self._write_main_changes(merged)
+        except Exception as e:
+            self.journal.record_failure([x.id for x in entries], e)
+            raise
+        done = [i for rid, ids in entry_ids.items() if rid not in missing for i in ids]
+        failed = [i for rid, ids in entry_ids.items() if rid in missing for i in ids]
+        self.journal.mark_main_done(done)
+        if failed:
+            self.journal.record_failure(failed, "Không tìm thấy ID trên Sheet1")
+            self.journal.mark_main_done(failed, MAIN_FAILED)